@@ -1,57 +1,265 @@
 import logging
 import os
-import sys
-import io
+import hashlib
+import heapq
+import itertools
+import uuid
+import zipfile
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template, send_file
+import click
+from flask import (
+    Flask, request, jsonify, render_template, send_file, make_response, Response, stream_with_context,
+    g, has_app_context
+)
 from flask_cors import CORS
-
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
+from config import config
+from db import get_repository, run_concurrently
+from cache import SummaryCache
+from name_index import NameIndex
+from write_queue import WriteQueue
+from idempotency import IdempotencyStore
+from metrics import AppMetrics, RequestMetrics
+from logging_setup import set_request_id, reset_request_id, summarize
+from imports import ACTIVITY_CATEGORIES, IMPORT_FORMATS, iter_csv_rows, iter_xlsx_rows, parse_activity_rows, iter_chunks
+from exports import (
+    ACTIVITY_COLUMNS, SUMMARY_COLUMNS, EXPORT_FORMATS,
+    XLSX_MIMETYPE, CSV_MIMETYPE, PARQUET_MIMETYPE,
+    write_xlsx, iter_csv, write_parquet
 )
-logger = logging.getLogger(__name__)
 
-# 在应用初始化后立即添加
-logger.info("=" * 50)
-logger.info("应用初始化")
-logger.info(f"Python版本: {sys.version}")
-logger.info(f"工作目录: {os.getcwd()}")
-logger.info(f"__file__: {__file__}")
-logger.info(f"模块搜索路径: {sys.path}")
-logger.info("=" * 50)
+# 日志由 config 按 LOG_LEVEL 配置
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Supabase配置
-try:
-    from supabase import create_client, Client
+def _current_request_metrics():
+    """当前请求的指标；并行查询的线程中通过复制的上下文访问"""
+    return g.get('request_metrics') if has_app_context() else None
 
-    SUPABASE_URL = os.environ.get('SUPABASE_URL')
-    # 优先使用服务密钥，如果没有则使用匿名密钥
-    SUPABASE_KEY = os.environ.get('SUPABASE_SERVICE_KEY') or os.environ.get('SUPABASE_ANON_KEY')
+# 请求耗时、数据库调用与行数指标，通过 /api/metrics 输出
+app_metrics = AppMetrics(_current_request_metrics)
 
-    if SUPABASE_URL and SUPABASE_KEY:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("Supabase客户端初始化成功")
-        USE_SUPABASE = True
-    else:
-        logger.warning("Supabase环境变量未设置，使用内存存储")
-        USE_SUPABASE = False
-        supabase = None
-except ImportError:
-    logger.warning("Supabase包未安装，使用内存存储")
-    USE_SUPABASE = False
-    supabase = None
-
-# 内存存储（备用）
-volunteer_data = []
-usage_data = []
+# 存储后端：由 DB_MODE 选择 supabase / postgres / sqlite / memory
+try:
+    repository = app_metrics.instrument_repository(get_repository())
+    logger.info(f"存储后端初始化成功: {repository.name}")
+except Exception as e:
+    logger.error(f"存储后端初始化失败: {str(e)}")
+    repository = None
+
+# 批量写入配置：每次多行插入的最大行数
+SUBMIT_BATCH_SIZE = max(1, int(os.environ.get('SUBMIT_BATCH_SIZE', '500')))
+
+# 明细分页接口的默认/最大每页行数
+LEDGER_PAGE_SIZE = max(1, int(os.environ.get('LEDGER_PAGE_SIZE', '100')))
+LEDGER_MAX_PAGE_SIZE = max(LEDGER_PAGE_SIZE, int(os.environ.get('LEDGER_MAX_PAGE_SIZE', '500')))
+
+# 单个志愿者查询返回的最近记录条数
+VOLUNTEER_RECENT_LIMIT = max(1, int(os.environ.get('VOLUNTEER_RECENT_LIMIT', '10')))
+
+# 姓名检索索引：首次检索时构建，提交后增量更新，NAME_INDEX_REFRESH 秒后重建
+name_index = NameIndex(refresh_interval=float(os.environ.get('NAME_INDEX_REFRESH', '300')))
+NAME_SEARCH_MAX_LIMIT = 50
+
+# 导出时每次从数据库读取的行数
+EXPORT_PAGE_SIZE = max(1, int(os.environ.get('EXPORT_PAGE_SIZE', '1000')))
+
+# 导入配置：每次校验并写入的行数，响应中最多列出的错误行数
+IMPORT_CHUNK_ROWS = max(1, int(os.environ.get('IMPORT_CHUNK_ROWS', '1000')))
+IMPORT_MAX_ERRORS = max(0, int(os.environ.get('IMPORT_MAX_ERRORS', '1000')))
+
+# 汇总数据缓存：提交成功后失效，SUMMARY_CACHE_TTL=0 时关闭
+# 缓存只在本进程内失效，其它实例最多在 TTL 秒内返回旧数据；Vercel 会同时运行多个
+# 实例，默认关闭
+summary_cache = SummaryCache(
+    ttl=float(os.environ.get('SUMMARY_CACHE_TTL', '0' if os.environ.get('VERCEL') else '60')),
+    max_entries=int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', '32'))
+)
+
+# 提交请求的幂等键：重复的键直接返回第一次的响应
+idempotency_store = IdempotencyStore(
+    ttl=float(os.environ.get('IDEMPOTENCY_TTL', '86400')),
+    max_keys=int(os.environ.get('IDEMPOTENCY_MAX_KEYS', '10000'))
+)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def _after_commit(records):
+    """数据写入后汇总结果已过期，并把新姓名加入检索索引"""
+    summary_cache.invalidate()
+    name_index.add_many(record['name'] for record in records)
+
+# 后台写入模式：提交先写入本地日志立即返回，由后台线程批量写入数据库
+write_queue = None
+if os.environ.get('WRITE_BEHIND', 'false').lower() == 'true' and repository is not None:
+    write_queue = WriteQueue(
+        os.environ.get('WRITE_QUEUE_PATH', 'write_queue.db'),
+        repository.insert,
+        on_commit=_after_commit,
+        rejected=repository.insert_rejected,
+        batch_rows=max(1, int(os.environ.get('WRITE_QUEUE_BATCH_ROWS', str(SUBMIT_BATCH_SIZE)))),
+        flush_interval=float(os.environ.get('WRITE_QUEUE_FLUSH_INTERVAL', '0.2')),
+        max_attempts=max(1, int(os.environ.get('WRITE_QUEUE_MAX_ATTEMPTS', '5'))),
+        lease_seconds=float(os.environ.get('WRITE_QUEUE_LEASE', '300'))
+    )
+    # 处理上次退出时未完成的提交
+    write_queue.start()
+
+def _to_int(value):
+    """将表格中的数字文本转换为整数，非法值按0处理"""
+    return int(value) if str(value).isdigit() else 0
+
+def _prepare_activity_records(rows):
+    """校验并转换活动数据行，返回 (原始行, 记录) 列表"""
+    records = []
+    for row in rows:
+        if len(row) >= 5:
+            records.append((row, {
+                'activity_type': row[0],
+                'activity_time_name': row[1],
+                'category': row[2],
+                'name': row[3],
+                'score': _to_int(row[4])
+            }))
+    return records
+
+def _prepare_usage_records(rows):
+    """校验并转换积分使用数据行，返回 (原始行, 记录) 列表"""
+    records = []
+    for row in rows:
+        if len(row) >= 3:
+            records.append((row, {
+                'name': row[0],
+                'used_points': _to_int(row[1]),
+                'course_count': _to_int(row[2])
+            }))
+    return records
+
+def _insert_records(table, records, label, errors):
+    """按 SUBMIT_BATCH_SIZE 分块多行插入，返回成功写入的行数
+
+    多行插入是原子的：没有抛出异常即视为整块写入成功（返回的行数可能因行级安全
+    策略而偏少）。数据库明确拒绝整块时逐行重试该分块，以便在 errors 中给出具体出错
+    的行；超时、连接中断等结果未知的错误不重新发送，避免重复写入。
+    """
+    saved = 0
+    for start in range(0, len(records), SUBMIT_BATCH_SIZE):
+        chunk = records[start:start + SUBMIT_BATCH_SIZE]
+        try:
+            inserted = repository.insert(table, [record for _, record in chunk])
+        except Exception as e:
+            if not repository.insert_rejected(e):
+                error_msg = str(e)
+                logger.error(f"批量保存{label}结果未知，不再重试: {error_msg}")
+                errors.append(f"保存{label}第 {start + 1}-{start + len(chunk)} 行时出错，"
+                              f"这些行可能已经写入，请核对后再提交: {error_msg}")
+                continue
+            logger.warning(f"批量保存{label}被拒绝，改为逐行保存: {str(e)}")
+        else:
+            saved += len(chunk)
+            if inserted != len(chunk):
+                logger.warning(f"批量保存{label}只返回 {inserted}/{len(chunk)} 条，按整块写入成功处理")
+            logger.info(f"成功批量保存{label}: {len(chunk)} 条")
+            continue
+
+        for _, record in chunk:
+            try:
+                repository.insert(table, [record])
+                saved += 1
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"保存{label}失败: {error_msg}")
+                errors.append(f"保存{label}失败: {error_msg}")
+    return saved
+
+# 记录导出文件字节数的接口
+EXPORT_ENDPOINTS = ('export_db', 'export_volunteer_summary')
+
+# 调用方传入的请求编号（X-Request-ID）的最大长度，超出或含不可见字符时重新生成
+REQUEST_ID_MAX_LENGTH = 128
+
+@app.before_request
+def _start_request_metrics():
+    g.request_metrics = RequestMetrics()
+
+@app.before_request
+def _assign_request_id():
+    request_id = request.headers.get('X-Request-ID', '')
+    if not request_id or len(request_id) > REQUEST_ID_MAX_LENGTH or not request_id.isprintable():
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+    g.request_id_token = set_request_id(request_id)
+
+@app.after_request
+def _add_request_id_header(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.after_request
+def _record_response_metrics(response):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is None:
+        return response
+    request_metrics.status = response.status_code
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    export_format = None
+    if request.endpoint in EXPORT_ENDPOINTS and response.status_code == 200:
+        export_format = request.args.get('format', 'xlsx').lower()
+    if response.is_streamed and response.content_length is None:
+        # 流式响应发送完毕后才知道耗时和大小，由包装的响应体记录
+        response.response = app_metrics.finish_after_stream(
+            response.response, request_metrics, route, request.method, export_format)
+    elif export_format is not None:
+        app_metrics.export_bytes.observe(response.content_length or 0, route=route, format=export_format)
+    return response
+
+@app.teardown_request
+def _reset_request_id(error):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
+
+@app.teardown_request
+def _finish_request_metrics(error):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is not None and not request_metrics.streaming:
+        g.pop('request_metrics')
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        app_metrics.finish_request(request_metrics, route, request.method)
+
+def _component_metrics():
+    """缓存、幂等键、写入队列与连接池的当前状态，在输出指标时读取"""
+    cache = summary_cache.stats()
+    collected = [
+        ('summary_cache_hits_total', 'counter', '汇总缓存命中次数', [((), cache['hits'])]),
+        ('summary_cache_misses_total', 'counter', '汇总缓存未命中次数', [((), cache['misses'])]),
+        ('summary_cache_hit_ratio', 'gauge', '汇总缓存命中率', [((), cache['hit_rate'])]),
+        ('idempotency_replays_total', 'counter', '幂等键重复请求次数', [((), idempotency_store.replays)])
+    ]
+    if write_queue is not None:
+        queue = write_queue.stats()
+        collected.append(('write_queue_submissions', 'gauge', '写入队列中各状态的提交数', [
+            ((('status', status),), queue[status]) for status in ('queued', 'done', 'failed')
+        ]))
+    pool = repository.pool_stats() if repository else None
+    if pool:
+        collected.append(('db_pool_connections', 'gauge', '连接池中的连接数', [
+            ((('state', 'in_use'),), pool['in_use']), ((('state', 'idle'),), pool['idle'])
+        ]))
+        collected.append(('db_pool_waits_total', 'counter', '等待空闲连接的次数', [((), pool['waits'])]))
+        collected.append(('db_pool_timeouts_total', 'counter', '等待空闲连接超时的次数', [((), pool['timeouts'])]))
+    upstream = repository.upstream_latency() if repository else None
+    if upstream:
+        collected.append(('upstream_requests_total', 'counter', '发往Supabase的请求数', [
+            ((('endpoint', endpoint),), stats['count']) for endpoint, stats in upstream.items()
+        ]))
+        collected.append(('upstream_errors_total', 'counter', '发往Supabase的请求失败数', [
+            ((('endpoint', endpoint),), stats['errors']) for endpoint, stats in upstream.items()
+        ]))
+    return collected
+
+app_metrics.registry.add_collector(_component_metrics)
 
 @app.route('/')
 def index():
@@ -59,7 +267,7 @@ def index():
 
 @app.route('/api/health')
 def health():
-    db_status = "supabase" if USE_SUPABASE else "memory"
+    db_status = repository.name if repository else "unavailable"
     supabase_url = os.environ.get('SUPABASE_URL', 'Not set')
     supabase_key_set = bool(os.environ.get('SUPABASE_SERVICE_KEY') or os.environ.get('SUPABASE_ANON_KEY'))
 
@@ -68,69 +276,110 @@ def health():
         "database": db_status,
         "supabase_url": supabase_url[:50] + "..." if len(supabase_url) > 50 else supabase_url,
         "supabase_key_set": supabase_key_set,
-        "use_supabase": USE_SUPABASE,
-        "supabase_client": supabase is not None
+        "use_supabase": config.DB_MODE == 'supabase',
+        "supabase_client": repository is not None and repository.name == 'supabase',
+        "summary_cache": summary_cache.stats(),
+        "db_pool": repository.pool_stats() if repository else None,
+        "upstream_latency": repository.upstream_latency() if repository else None,
+        "write_queue": write_queue.stats() if write_queue else None,
+        "idempotency": idempotency_store.stats(),
+        "metrics": app_metrics.summary()
     })
 
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus 文本格式的指标"""
+    return Response(app_metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/submit', methods=['POST'])
 def submit():
+    """提交活动数据和积分使用数据
+
+    请求头带 Idempotency-Key 时，同一个键的重复请求（例如重复点击或浏览器重试）
+    返回第一次的响应，数据只写入一次。
+    """
+    key = (request.headers.get('Idempotency-Key') or '').strip()
+    if not key:
+        return _handle_submit()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return jsonify({"success": False, "message": f"Idempotency-Key 不能超过 {IDEMPOTENCY_KEY_MAX_LENGTH} 个字符"}), 400
+
+    fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+    state, stored = idempotency_store.begin(key, fingerprint)
+    if state == 'replay':
+        body, status = stored
+        response = make_response(body, status)
+        response.mimetype = 'application/json'
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    if state == 'mismatch':
+        return jsonify({"success": False, "message": "Idempotency-Key 已用于内容不同的提交"}), 422
+    if state == 'in_progress':
+        return jsonify({"success": False, "message": "相同 Idempotency-Key 的提交仍在处理中，请稍后重试"}), 409
+    if state == 'full':
+        return jsonify({"success": False, "message": "同时处理的提交过多，请稍后重试"}), 503
+
+    try:
+        response = make_response(_handle_submit())
+    except Exception as e:
+        if not g.get('submit_writing'):
+            idempotency_store.abort(key)
+            raise
+        logger.error(f"提交数据失败: {str(e)}")
+        response = make_response(jsonify({"success": False, "message": str(e)}), 500)
+    if response.status_code >= 500 and not g.get('submit_writing'):
+        # 开始写入前出错时没有写入数据，允许用同一个键重试
+        idempotency_store.abort(key)
+    else:
+        # 已经开始写入（包括写入后刷新缓存等步骤出错），重试返回同一个响应，不再写入
+        idempotency_store.complete(key, response.get_data(), response.status_code)
+    return response
+
+def _handle_submit():
     try:
         data = request.get_json()
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({"success": False, "message": "无效的数据格式"}), 400
+        if logger.isEnabledFor(logging.DEBUG):
+            # 大批量提交只记录行数和前几行
+            logger.debug("收到提交", extra={"payload": summarize(data)})
 
-        activity_count = 0
-        usage_count = 0
         errors = []
 
-        # 检查Supabase连接
-        if not USE_SUPABASE or not supabase:
+        # 检查数据库连接
+        if repository is None:
             return jsonify({
                 "success": False,
                 "message": "数据库连接失败，请联系管理员"
             }), 500
 
-        # 处理活动数据
-        if 'activityData' in data and data['activityData']:
-            for row in data['activityData']:
-                if len(row) >= 5:
-                    try:
-                        result = supabase.table('volunteer_points').insert({
-                            'activity_type': row[0],
-                            'activity_time_name': row[1],
-                            'category': row[2],
-                            'name': row[3],
-                            'score': int(row[4]) if str(row[4]).isdigit() else 0
-                        }).execute()
-                        if result.data:
-                            activity_count += 1
-                            logger.info(f"成功保存活动数据: {row}")
-                        else:
-                            errors.append(f"保存活动数据失败: {row}")
-                    except Exception as e:
-                        error_msg = str(e)
-                        logger.error(f"保存活动数据失败: {error_msg}")
-                        errors.append(f"保存活动数据失败: {error_msg}")
-
-        # 处理使用数据
-        if 'usageData' in data and data['usageData']:
-            for row in data['usageData']:
-                if len(row) >= 3:
-                    try:
-                        result = supabase.table('volunteer_usage').insert({
-                            'name': row[0],
-                            'used_points': int(row[1]) if str(row[1]).isdigit() else 0,
-                            'course_count': int(row[2]) if str(row[2]).isdigit() else 0
-                        }).execute()
-                        if result.data:
-                            usage_count += 1
-                            logger.info(f"成功保存使用数据: {row}")
-                        else:
-                            errors.append(f"保存使用数据失败: {row}")
-                    except Exception as e:
-                        error_msg = str(e)
-                        logger.error(f"保存使用数据失败: {error_msg}")
-                        errors.append(f"保存使用数据失败: {error_msg}")
+        # 先校验并转换所有行，再按表批量写入
+        activity_records = _prepare_activity_records(data.get('activityData') or [])
+        usage_records = _prepare_usage_records(data.get('usageData') or [])
+
+        # 此后出错时数据可能已经写入，幂等键不能再用于重新写入
+        g.submit_writing = True
+        if write_queue is not None:
+            submission_id = write_queue.enqueue({
+                'volunteer_points': [record for _, record in activity_records],
+                'volunteer_usage': [record for _, record in usage_records]
+            })
+            return jsonify({
+                "success": True,
+                "queued": True,
+                "message": "数据已接收，正在后台保存",
+                "submission_id": submission_id,
+                "status_url": f"/api/submit/{submission_id}/status",
+                "activity_count": len(activity_records),
+                "usage_count": len(usage_records)
+            }), 202
+
+        activity_count = _insert_records('volunteer_points', activity_records, '活动数据', errors)
+        usage_count = _insert_records('volunteer_usage', usage_records, '使用数据', errors)
+
+        # 有数据写入后汇总结果已过期
+        if activity_count or usage_count:
+            _after_commit([record for _, record in activity_records + usage_records])
 
         if errors:
             return jsonify({
@@ -151,25 +400,96 @@ def submit():
         logger.error(f"提交数据失败: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/api/submit/<submission_id>/status')
+def submit_status(submission_id):
+    """后台写入模式下查询提交的状态：queued（排队或重试中）、done（已写入数据库）、failed"""
+    if write_queue is None:
+        return jsonify({"error": "未启用后台写入模式"}), 404
+    try:
+        status = write_queue.status(submission_id)
+        if status is None:
+            return jsonify({"error": f"未找到提交: {submission_id}"}), 404
+        return jsonify(status)
+    except Exception as e:
+        logger.error(f"查询提交状态失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _fetch_points_summary():
+    """每位志愿者的总积分: [{name, total_score}]"""
+    return summary_cache.get_or_load('points', repository.points_summary)
+
+def _fetch_usage_summary():
+    """每位志愿者的已使用积分与课程数: [{name, used_points, course_count}]"""
+    return summary_cache.get_or_load('usage', repository.usage_summary)
+
+def _fetch_complete_summary():
+    """每位志愿者的总积分、已使用积分、课程数与剩余积分"""
+    return summary_cache.get_or_load('complete', repository.complete_summary)
+
+# 完整汇总可用的排序字段；积分排行榜 by 参数与排序字段的对应关系
+SUMMARY_SORT_COLUMNS = ('name', 'total_score', 'used_points', 'remaining_score', 'course_count')
+LEADERBOARD_COLUMNS = {'total': 'total_score', 'remaining': 'remaining_score', 'used': 'used_points'}
+LEADERBOARD_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
+
+def _summary_sort_key(column, descending):
+    """数值字段相同时按姓名升序，保证分页结果稳定"""
+    if column == 'name':
+        return lambda row: row.get('name') or ''
+    sign = -1 if descending else 1
+    return lambda row: (sign * (row.get(column) or 0), row.get('name') or '')
+
+def _sorted_complete_summary(column, descending):
+    """按字段排序后的完整汇总，与汇总数据一起缓存，翻页时不重复排序"""
+    def load():
+        rows = _fetch_complete_summary()
+        return sorted(rows, key=_summary_sort_key(column, descending),
+                      reverse=descending and column == 'name')
+    return summary_cache.get_or_load(f"complete:{column}:{'desc' if descending else 'asc'}", load)
+
+def _top_summary(column, limit):
+    """按字段取前 limit 位志愿者，用堆选出，不对全部志愿者排序"""
+    return heapq.nsmallest(limit, _fetch_complete_summary(), key=_summary_sort_key(column, True))
+
+def _data_version():
+    """数据版本：各表的最大id与行数，插入或删除记录都会改变它
+
+    结果与汇总数据一起缓存，提交后随缓存一起失效。
+    """
+    return summary_cache.get_or_load('data_version', repository.data_version)
+
+def _data_etag(*extra):
+    """根据请求路径、查询参数和数据版本生成强ETag"""
+    key = '|'.join([request.full_path, _data_version()] + [str(item) for item in extra])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _not_modified(etag):
+    """客户端缓存仍然有效，返回304而不重新生成内容"""
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    # 要求浏览器每次携带 If-None-Match 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/get_summary')
 def get_summary():
     try:
-        if not USE_SUPABASE or not supabase:
+        if repository is None:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        # 从Supabase获取数据
-        result = supabase.table('volunteer_points').select('name, score').execute()
-        logger.info(f"从Supabase获取到 {len(result.data)} 条记录")
+        etag = _data_etag()
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
 
-        summary = {}
-        for record in result.data:
-            name = record['name']
-            score = int(record['score']) if record['score'] is not None else 0
-            summary[name] = summary.get(name, 0) + score
-
-        result_list = [{"name": name, "total_score": score} for name, score in summary.items()]
-        logger.info(f"返回汇总数据: {result_list}")
-        return jsonify(result_list)
+        result_list = _fetch_points_summary()
+        app_metrics.add_rows_returned(len(result_list))
+        logger.info(f"返回汇总数据: {len(result_list)} 条记录")
+        return _with_etag(jsonify(result_list), etag)
     except Exception as e:
         logger.error(f"获取汇总数据失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -177,38 +497,17 @@ def get_summary():
 @app.route('/api/get_usage_summary')
 def get_usage_summary():
     try:
-        if not USE_SUPABASE or not supabase:
+        if repository is None:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        # 从Supabase获取数据
-        result = supabase.table('volunteer_usage').select('name, used_points, course_count').execute()
-        logger.info(f"从Supabase获取到 {len(result.data)} 条使用记录")
-
-        usage_summary = {}
-        for record in result.data:
-            name = record['name']
-            used_points = record['used_points']
-            course_count = record['course_count']
-
-            if name in usage_summary:
-                usage_summary[name]['used_points'] += used_points
-                usage_summary[name]['course_count'] += course_count
-            else:
-                usage_summary[name] = {
-                    'used_points': used_points,
-                    'course_count': course_count
-                }
-
-        result_list = [
-            {
-                "name": name,
-                "used_points": data['used_points'],
-                "course_count": data['course_count']
-            }
-            for name, data in usage_summary.items()
-        ]
-        logger.info(f"返回使用汇总数据: {result_list}")
-        return jsonify(result_list)
+        etag = _data_etag()
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+
+        result_list = _fetch_usage_summary()
+        app_metrics.add_rows_returned(len(result_list))
+        logger.info(f"返回使用汇总数据: {len(result_list)} 条记录")
+        return _with_etag(jsonify(result_list), etag)
     except Exception as e:
         logger.error(f"获取使用汇总数据失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -217,154 +516,444 @@ def get_usage_summary():
 def get_complete_summary():
     """获取完整的汇总数据，包括积分、已使用积分和剩余积分"""
     try:
-        if not USE_SUPABASE or not supabase:
+        if repository is None:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        # 获取积分数据
-        points_result = supabase.table('volunteer_points').select('name, score').execute()
-        points_summary = {}
-        for record in points_result.data:
-            name = record['name']
-            score = int(record['score']) if record['score'] is not None else 0
-            points_summary[name] = points_summary.get(name, 0) + score
-
-        # 获取使用数据
-        usage_result = supabase.table('volunteer_usage').select('name, used_points, course_count').execute()
-        usage_summary = {}
-        for record in usage_result.data:
-            name = record['name']
-            used_points = int(record['used_points']) if record['used_points'] is not None else 0
-            course_count = int(record['course_count']) if record['course_count'] is not None else 0
-
-            if name in usage_summary:
-                usage_summary[name]['used_points'] += used_points
-                usage_summary[name]['course_count'] += course_count
-            else:
-                usage_summary[name] = {
-                    'used_points': used_points,
-                    'course_count': course_count
-                }
-
-        # 合并数据
-        all_names = set(points_summary.keys()) | set(usage_summary.keys())
-        result_list = []
-
-        for name in all_names:
-            total_score = points_summary.get(name, 0)
-            used_points = usage_summary.get(name, {}).get('used_points', 0)
-            course_count = usage_summary.get(name, {}).get('course_count', 0)
-            remaining_score = total_score - used_points
-
-            result_list.append({
-                "name": name,
-                "total_score": total_score,
-                "used_points": used_points,
-                "course_count": course_count,
-                "remaining_score": remaining_score
-            })
-
-        logger.info(f"返回完整汇总数据: {len(result_list)} 条记录")
-        return jsonify(result_list)
+        etag = _data_etag()
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+
+        args = request.args
+        sort = args.get('sort')
+        if sort is None and 'offset' not in args and 'limit' not in args:
+            result_list = _fetch_complete_summary()
+            app_metrics.add_rows_returned(len(result_list))
+            logger.info(f"返回完整汇总数据: {len(result_list)} 条记录")
+            return _with_etag(jsonify(result_list), etag)
+
+        try:
+            order = args.get('order', 'desc' if sort and sort != 'name' else 'asc').lower()
+            if sort is not None and sort not in SUMMARY_SORT_COLUMNS:
+                raise ValueError(f"sort 必须为 {', '.join(SUMMARY_SORT_COLUMNS)} 之一")
+            if order not in ('asc', 'desc'):
+                raise ValueError("order 必须为 asc 或 desc")
+            offset = int(args.get('offset', 0))
+            limit = int(args['limit']) if 'limit' in args else None
+            if offset < 0 or (limit is not None and limit < 1):
+                raise ValueError("offset 不能为负数，limit 必须为正整数")
+        except ValueError as e:
+            return jsonify({"error": f"参数错误: {str(e)}"}), 400
+
+        rows = _sorted_complete_summary(sort or 'name', order == 'desc')
+        result_list = rows[offset:offset + limit if limit is not None else None]
+        app_metrics.add_rows_returned(len(result_list))
+        logger.info(f"返回完整汇总数据: 第 {offset + 1} 起 {len(result_list)}/{len(rows)} 条记录")
+        response = jsonify(result_list)
+        response.headers['X-Total-Count'] = str(len(rows))
+        return _with_etag(response, etag)
     except Exception as e:
         logger.error(f"获取完整汇总数据失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/export_db')
-def export_db():
-    """导出活动总览表"""
+@app.route('/api/leaderboard')
+def leaderboard():
+    """积分排行榜：按总积分（total）、剩余积分（remaining）或已使用积分（used）取前 limit 位"""
     try:
-        if not USE_SUPABASE or not supabase:
+        if repository is None:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        # 创建Excel文件
-        import pandas as pd
+        by = request.args.get('by', 'total')
+        if by not in LEADERBOARD_COLUMNS:
+            return jsonify({"error": f"参数错误: by 必须为 {', '.join(LEADERBOARD_COLUMNS)} 之一"}), 400
+        try:
+            limit = min(max(int(request.args.get('limit', LEADERBOARD_LIMIT)), 1), LEADERBOARD_MAX_LIMIT)
+        except ValueError:
+            return jsonify({"error": "参数错误: limit 必须为整数"}), 400
+
+        etag = _data_etag()
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+
+        column = LEADERBOARD_COLUMNS[by]
+        leaders = []
+        for position, row in enumerate(_top_summary(column, limit), start=1):
+            # 与前一位积分相同时名次相同
+            rank = leaders[-1]['rank'] if leaders and leaders[-1][column] == row[column] else position
+            leaders.append({"rank": rank, **row})
+
+        app_metrics.add_rows_returned(len(leaders))
+        return _with_etag(jsonify({
+            "by": by,
+            "volunteer_count": len(_fetch_complete_summary()),
+            "leaders": leaders
+        }), etag)
+    except Exception as e:
+        logger.error(f"获取积分排行榜失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# 明细表可用的等值过滤字段
+LEDGER_FILTERS = {
+    'volunteer_points': ('name', 'activity_type', 'category'),
+    'volunteer_usage': ('name',)
+}
+
+# 枚举列的可选值；数据库中这两列为枚举类型，未知的值会导致查询报错
+LEDGER_ENUM_VALUES = {
+    'activity_type': tuple(ACTIVITY_CATEGORIES),
+    'category': tuple(dict.fromkeys(category for categories in ACTIVITY_CATEGORIES.values()
+                                    for category in categories))
+}
+
+def _parse_ledger_args(table):
+    """解析分页与过滤参数，参数非法时抛出 ValueError"""
+    args = request.args
+    limit = int(args.get('limit', LEDGER_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError("limit 必须为正整数")
+
+    cursor = args.get('cursor')
+    cursor = int(cursor) if cursor not in (None, '') else None
+    if cursor is not None and cursor < 0:
+        raise ValueError("cursor 不能为负数")
+
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order 只能为 asc 或 desc")
+
+    created_range = {}
+    for key in ('created_from', 'created_to'):
+        if args.get(key):
+            datetime.fromisoformat(args[key])
+            created_range[key] = args[key]
+
+    filters = {key: args[key] for key in LEDGER_FILTERS[table] if args.get(key)}
+    for key, value in filters.items():
+        if key in LEDGER_ENUM_VALUES and value not in LEDGER_ENUM_VALUES[key]:
+            raise ValueError(f"{key} 必须为 {' / '.join(LEDGER_ENUM_VALUES[key])} 之一")
+    return min(limit, LEDGER_MAX_PAGE_SIZE), cursor, order, filters, created_range
+
+def _list_ledger(table):
+    """按id键集分页读取明细记录
+
+    cursor 为上一页返回的 next_cursor，每页只读取 limit+1 行，耗时与页大小相关、
+    与表大小无关。name 与 created_at 过滤可使用 idx_*_name / idx_*_created_at 索引。
+    """
+    if repository is None:
+        return jsonify({"error": "数据库连接失败"}), 500
 
-        # 从Supabase获取数据
-        result = supabase.table('volunteer_points').select('*').execute()
-        data = result.data
-        logger.info(f"导出数据: 获取到 {len(data)} 条记录")
+    try:
+        limit, cursor, order, filters, created_range = _parse_ledger_args(table)
+    except ValueError as e:
+        return jsonify({"error": f"参数错误: {str(e)}"}), 400
+
+    rows = repository.list_rows(
+        table, filters=filters,
+        created_from=created_range.get('created_from'), created_to=created_range.get('created_to'),
+        cursor=cursor, order=order, limit=limit + 1
+    )
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    app_metrics.add_rows_returned(len(items))
 
-        if not data:
-            return jsonify({"error": "没有数据可导出"}), 400
+    return jsonify({
+        "items": items,
+        "limit": limit,
+        "next_cursor": items[-1]['id'] if has_more else None
+    })
+
+@app.route('/api/points')
+def list_points():
+    """分页查询积分明细，支持 name/activity_type/category/created_from/created_to 过滤"""
+    try:
+        return _list_ledger('volunteer_points')
+    except Exception as e:
+        logger.error(f"查询积分明细失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/usage')
+def list_usage():
+    """分页查询积分使用明细，支持 name/created_from/created_to 过滤"""
+    try:
+        return _list_ledger('volunteer_usage')
+    except Exception as e:
+        logger.error(f"查询积分使用明细失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/volunteer/<path:name>')
+def get_volunteer(name):
+    """查询单个志愿者的总积分、已使用积分、课程数、剩余积分及最近记录"""
+    try:
+        if repository is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+
+        name = name.strip()
+        # 合计与两张表的最近记录互不依赖，并行查询
+        totals, recent_points, recent_usage = run_concurrently(
+            lambda: repository.volunteer_totals(name),
+            lambda: repository.list_rows(
+                'volunteer_points', filters={'name': name}, order='desc', limit=VOLUNTEER_RECENT_LIMIT),
+            lambda: repository.list_rows(
+                'volunteer_usage', filters={'name': name}, order='desc', limit=VOLUNTEER_RECENT_LIMIT)
+        )
+        if totals is None:
+            return jsonify({"error": f"未找到志愿者: {name}"}), 404
 
-        df = pd.DataFrame(data)
-        # 重命名列为中文
-        df = df.rename(columns={
-            'activity_type': '活动类型',
-            'activity_time_name': '活动时间与名称',
-            'category': '类别',
-            'name': '姓名',
-            'score': '积分'
+        app_metrics.add_rows_returned(len(recent_points) + len(recent_usage))
+        return jsonify({
+            "name": name,
+            "total_score": totals['total_score'],
+            "used_points": totals['used_points'],
+            "course_count": totals['course_count'],
+            "remaining_score": totals['total_score'] - totals['used_points'],
+            "recent_points": recent_points,
+            "recent_usage": recent_usage
         })
+    except Exception as e:
+        logger.error(f"查询志愿者积分失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/volunteers/search')
+def search_volunteers():
+    """按姓名前缀、拼音（全拼或首字母）及模糊匹配检索志愿者，用于输入联想"""
+    try:
+        if repository is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), NAME_SEARCH_MAX_LIMIT)
+        except ValueError:
+            return jsonify({"error": "参数错误: limit 必须为整数"}), 400
+
+        name_index.ensure_built(
+            lambda: [row['name'] for row in _fetch_complete_summary() if row.get('name')])
+        matches = name_index.search(request.args.get('q', ''), limit)
+        app_metrics.add_rows_returned(len(matches))
+        return jsonify(matches)
+    except Exception as e:
+        logger.error(f"检索志愿者姓名失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        # 只保留需要的列
-        columns_to_keep = ['活动类型', '活动时间与名称', '类别', '姓名', '积分']
-        df = df[columns_to_keep]
+def _export_format():
+    """读取导出格式参数，默认xlsx，不支持时返回None"""
+    export_format = request.args.get('format', 'xlsx').lower()
+    return export_format if export_format in EXPORT_FORMATS else None
 
-        # 创建Excel文件
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='活动总览', index=False)
+def _export_response(export_format, basename, sheet_title, columns, records, etag, integer_fields=()):
+    """按导出格式生成下载响应：xlsx/parquet写入临时文件后发送，csv分块流式发送"""
+    filename = f'{basename}.{export_format}'
 
-        output.seek(0)
-        filename = f'volunteer_activity_overview_{datetime.now().strftime("%Y%m%d")}.xlsx'
+    if export_format == 'csv':
+        response = Response(stream_with_context(iter_csv(columns, records)), mimetype=CSV_MIMETYPE)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return _with_etag(response, etag)
+
+    if export_format == 'parquet':
+        output = write_parquet(columns, records, integer_fields=integer_fields, batch_rows=EXPORT_PAGE_SIZE)
+        mimetype = PARQUET_MIMETYPE
+    else:
+        output = write_xlsx(sheet_title, columns, records)
+        mimetype = XLSX_MIMETYPE
+
+    return _with_etag(send_file(
+        output,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=filename
+    ), etag)
+
+@app.route('/api/export_db')
+def export_db():
+    """导出活动总览表，format 参数可选 xlsx（默认）、csv、parquet"""
+    try:
+        if repository is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+
+        export_format = _export_format()
+        if not export_format:
+            return jsonify({"error": f"不支持的导出格式，可选: {', '.join(EXPORT_FORMATS)}"}), 400
+
+        today = datetime.now().strftime("%Y%m%d")
+        etag = _data_etag(today)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+
+        # 按id分页读取并逐行写入，内存占用与表大小无关
+        records = app_metrics.count_rows(repository.iter_rows('volunteer_points', page_size=EXPORT_PAGE_SIZE))
+        first = next(records, None)
+        if first is None:
+            return jsonify({"error": "没有数据可导出"}), 400
 
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        return _export_response(
+            export_format, f'volunteer_activity_overview_{today}', '活动总览',
+            ACTIVITY_COLUMNS, itertools.chain([first], records), etag, integer_fields=('score',)
         )
+    except ImportError as e:
+        logger.error(f"导出活动总览失败，缺少依赖: {str(e)}")
+        return jsonify({"error": f"服务器缺少导出所需的依赖: {e.name}"}), 500
     except Exception as e:
         logger.error(f"导出活动总览失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/export_volunteer_summary')
 def export_volunteer_summary():
-    """导出志愿者积分总表"""
+    """导出志愿者积分总表，format 参数可选 xlsx（默认）、csv、parquet"""
     try:
-        if not USE_SUPABASE or not supabase:
+        if repository is None:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        import pandas as pd
+        export_format = _export_format()
+        if not export_format:
+            return jsonify({"error": f"不支持的导出格式，可选: {', '.join(EXPORT_FORMATS)}"}), 400
 
-        # 从Supabase获取数据并汇总
-        result = supabase.table('volunteer_points').select('name, score').execute()
-        logger.info(f"导出汇总数据: 获取到 {len(result.data)} 条记录")
+        today = datetime.now().strftime("%Y%m%d")
+        etag = _data_etag(today)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
 
-        summary = {}
-        for record in result.data:
-            name = record['name']
-            score = int(record['score']) if record['score'] is not None else 0
-            summary[name] = summary.get(name, 0) + score
+        # 由数据库按姓名汇总
+        summary = _fetch_points_summary()
+        logger.info(f"导出汇总数据: 获取到 {len(summary)} 位志愿者")
 
         if not summary:
             return jsonify({"error": "没有数据可导出"}), 400
+        app_metrics.add_rows_returned(len(summary))
 
-        # 创建DataFrame
-        df = pd.DataFrame([
-            {"姓名": name, "总积分": score}
-            for name, score in summary.items()
-        ])
-
-        # 创建Excel文件
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='志愿者积分总表', index=False)
-
-        output.seek(0)
-        filename = f'volunteer_points_summary_{datetime.now().strftime("%Y%m%d")}.xlsx'
-
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        return _export_response(
+            export_format, f'volunteer_points_summary_{today}', '志愿者积分总表',
+            SUMMARY_COLUMNS, summary, etag, integer_fields=('total_score',)
         )
+    except ImportError as e:
+        logger.error(f"导出志愿者积分总表失败，缺少依赖: {str(e)}")
+        return jsonify({"error": f"服务器缺少导出所需的依赖: {e.name}"}), 500
     except Exception as e:
         logger.error(f"导出志愿者积分总表失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/import', methods=['POST'])
+def import_activities():
+    """导入活动总览表格式（活动类型、活动时间与名称、类别、姓名、积分）的xlsx/csv文件
+
+    按 IMPORT_CHUNK_ROWS 行分块校验并批量写入，校验失败的行不写入，在 errors 中
+    给出行号和原因。dry_run=true 时只校验不写入。
+    """
+    try:
+        if repository is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            return jsonify({"error": "请上传文件（字段名 file）"}), 400
+
+        import_format = (request.args.get('format') or request.form.get('format')
+                         or upload.filename.rsplit('.', 1)[-1]).lower()
+        if import_format not in IMPORT_FORMATS:
+            return jsonify({"error": f"不支持的导入格式: {import_format}，可选: {', '.join(IMPORT_FORMATS)}"}), 400
+        dry_run = (request.args.get('dry_run') or request.form.get('dry_run') or 'false').lower() in ('1', 'true', 'yes')
+
+        rows = iter_xlsx_rows(upload.stream) if import_format == 'xlsx' else iter_csv_rows(upload.stream)
+        total_rows = valid_rows = imported_rows = error_count = 0
+        errors = []
+
+        def add_error(line, message):
+            nonlocal error_count
+            error_count += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"row": line, "message": message})
+
+        try:
+            for chunk in iter_chunks(parse_activity_rows(rows), IMPORT_CHUNK_ROWS):
+                records = []
+                for line, record, row_errors in chunk:
+                    total_rows += 1
+                    if row_errors:
+                        add_error(line, '; '.join(row_errors))
+                    else:
+                        records.append((line, record))
+                valid_rows += len(records)
+                if dry_run or not records:
+                    continue
+
+                insert_errors = []
+                saved = _insert_records('volunteer_points', records, '导入数据', insert_errors)
+                imported_rows += saved
+                for message in insert_errors:
+                    add_error(None, message)
+                if saved:
+                    _after_commit([record for _, record in records])
+        except (ValueError, zipfile.BadZipFile) as e:
+            # 表头不符合要求或文件无法解析；此前的分块可能已经写入
+            return jsonify({
+                "error": f"无法读取文件: {str(e)}",
+                "imported_rows": imported_rows
+            }), 400
+
+        logger.info(f"导入{'校验' if dry_run else '数据'}: 共 {total_rows} 行，有效 {valid_rows} 行，"
+                    f"写入 {imported_rows} 行，错误 {error_count} 行")
+        return jsonify({
+            "success": error_count == 0,
+            "dry_run": dry_run,
+            "total_rows": total_rows,
+            "valid_rows": valid_rows,
+            "imported_rows": imported_rows,
+            "error_count": error_count,
+            "errors": errors,
+            "errors_truncated": error_count > len(errors)
+        })
+    except ImportError:
+        return jsonify({"error": "导入xlsx需要安装 openpyxl"}), 500
+    except Exception as e:
+        logger.error(f"导入数据失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.cli.command('rebuild-balance')
+@click.option('--check', is_flag=True, help='只检查漂移，不修改余额表')
+def rebuild_balance_command(check):
+    """根据积分/使用记录重建志愿者积分余额表，并报告漂移"""
+    if repository is None:
+        raise click.ClickException("数据库连接失败")
+
+    try:
+        drift = repository.rebuild_balance(apply=not check)
+    except NotImplementedError as e:
+        raise click.ClickException(str(e))
+    for row in drift:
+        click.echo(
+            f"{row['name']}: 总积分 {row['stored_total_score']} -> {row['actual_total_score']}, "
+            f"已使用积分 {row['stored_used_points']} -> {row['actual_used_points']}, "
+            f"课程数 {row['stored_course_count']} -> {row['actual_course_count']}"
+        )
+
+    if check:
+        click.echo(f"检查完成: {len(drift)} 位志愿者的余额存在漂移")
+    else:
+        click.echo(f"余额表已重建: 修正了 {len(drift)} 位志愿者的余额")
+
+@app.cli.command('backfill-volunteers')
+@click.option('--batch-size', default=5000, show_default=True, help='每张表每批回填的行数')
+@click.option('--check', is_flag=True, help='只统计尚未回填的行数')
+def backfill_volunteers_command(batch_size, check):
+    """为已有的积分/使用记录分批回填 volunteer_id"""
+    if repository is None:
+        raise click.ClickException("数据库连接失败")
+
+    totals = {}
+    try:
+        while True:
+            rows = repository.backfill_volunteers(batch_size=0 if check else batch_size)
+            for row in rows:
+                totals[row['table_name']] = totals.get(row['table_name'], 0) + row['updated']
+            if check or not any(row['updated'] for row in rows):
+                break
+            click.echo(", ".join(f"{row['table_name']}: 剩余 {row['remaining']} 行" for row in rows))
+    except NotImplementedError as e:
+        raise click.ClickException(str(e))
+
+    for row in rows:
+        if check:
+            click.echo(f"{row['table_name']}: {row['remaining']} 行尚未回填")
+        else:
+            click.echo(f"{row['table_name']}: 回填 {totals[row['table_name']]} 行，剩余 {row['remaining']} 行")
+
 @app.errorhandler(404)
 def page_not_found(e):
     """处理404错误"""
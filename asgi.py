@@ -0,0 +1,22 @@
+"""
+ASGI入口点 - 用 uvicorn 等ASGI服务器运行app.py中的应用
+
+    pip install uvicorn a2wsgi
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+连接的接收、keep-alive 和慢客户端的读写由事件循环处理，只有执行视图函数时才占用
+线程；同时执行的视图数量由 ASGI_WORKERS 控制。视图内互不依赖的查询通过
+db.run_concurrently() 并行执行。Vercel 部署仍使用 api/index.py 中的WSGI应用。
+"""
+import os
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    raise ImportError("ASGI模式需要安装 a2wsgi: pip install uvicorn a2wsgi")
+
+from app import app as flask_app
+
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', '32'))
+
+app = WSGIMiddleware(flask_app, workers=ASGI_WORKERS)
@@ -0,0 +1,52 @@
+"""
+基准测试的合成数据
+"""
+import os
+import random
+import sys
+
+# 活动类型与类别取自导入校验使用的常量，与页面中的下拉选项保持一致
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from imports import ACTIVITY_CATEGORIES
+
+# 平均每位志愿者的积分记录数，使用记录数为积分记录数的十分之一
+ROWS_PER_VOLUNTEER = 20
+USAGE_RATIO = 10
+
+def volunteer_count(rows):
+    return max(100, rows // ROWS_PER_VOLUNTEER)
+
+def activity_rows(count, volunteers, seed=0):
+    """产出 count 行 [活动类型, 活动时间与名称, 类别, 姓名, 积分]，同一 seed 结果相同"""
+    rng = random.Random(seed)
+    activity_types = list(ACTIVITY_CATEGORIES)
+    for index in range(count):
+        activity_type = rng.choice(activity_types)
+        yield [
+            activity_type,
+            f"2024-{index % 12 + 1:02d} 活动{index % 500}",
+            rng.choice(ACTIVITY_CATEGORIES[activity_type]),
+            f"志愿者{rng.randrange(volunteers)}",
+            rng.randint(1, 10)
+        ]
+
+def usage_rows(count, volunteers, seed=0):
+    """产出 count 行 [姓名, 使用积分, 课程数]"""
+    rng = random.Random(seed + 1)
+    for _ in range(count):
+        yield [f"志愿者{rng.randrange(volunteers)}", rng.randint(1, 5), 1]
+
+def ledger(rows, seed=0):
+    """rows 行积分记录与对应的使用记录，按表名产出记录字典列表的迭代器"""
+    volunteers = volunteer_count(rows)
+    points = (
+        dict(zip(('activity_type', 'activity_time_name', 'category', 'name', 'score'), row))
+        for row in activity_rows(rows, volunteers, seed)
+    )
+    usage = (
+        dict(zip(('name', 'used_points', 'course_count'), row))
+        for row in usage_rows(rows // USAGE_RATIO, volunteers, seed)
+    )
+    return {'volunteer_points': points, 'volunteer_usage': usage}
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+本地 PostgREST 替身 - 在内存中实现 SupabaseRepository 用到的接口，用于离线基准测试
+
+支持明细表的 select（eq/gt/gte/lt/lte 过滤、order、limit、count=exact）、批量
+insert，以及 get_volunteer_summary / get_usage_summary / get_complete_summary 三个
+汇总函数。与部署了 volunteer_balance 的数据库一样，写入时按姓名累加，汇总耗时只与
+志愿者人数相关。
+
+    python bench/fake_postgrest.py --port 54321 --seed-rows 100000
+"""
+
+import argparse
+import bisect
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from data import ledger
+
+TABLE_COLUMNS = {
+    'volunteer_points': ['id', 'activity_type', 'activity_time_name', 'category', 'name', 'score', 'created_at'],
+    'volunteer_usage': ['id', 'name', 'used_points', 'course_count', 'created_at']
+}
+
+class Store:
+    """按id升序保存的明细记录（只追加）与按姓名累加的余额"""
+
+    def __init__(self):
+        self.rows = {table: [] for table in TABLE_COLUMNS}
+        self.ids = {table: [] for table in TABLE_COLUMNS}
+        self.balance = {}
+        self.lock = threading.Lock()
+
+    def insert(self, table, records):
+        created_at = datetime.now(timezone.utc).isoformat()
+        inserted = []
+        with self.lock:
+            rows = self.rows[table]
+            for record in records:
+                row = {column: record.get(column) for column in TABLE_COLUMNS[table]}
+                row['id'] = len(rows) + 1
+                row['created_at'] = record.get('created_at') or created_at
+                rows.append(row)
+                self.ids[table].append(row['id'])
+                inserted.append(row)
+
+                # [总积分, 已使用积分, 课程数, 积分记录数, 使用记录数]
+                balance = self.balance.setdefault(row['name'], [0, 0, 0, 0, 0])
+                if table == 'volunteer_points':
+                    balance[0] += int(row['score'] or 0)
+                    balance[3] += 1
+                else:
+                    balance[1] += int(row['used_points'] or 0)
+                    balance[2] += int(row['course_count'] or 0)
+                    balance[4] += 1
+        return inserted
+
+    def select(self, table, columns, filters, order_desc, limit, count=False):
+        """filters 为 [(列, 运算符, 值)]；id 上的范围条件通过二分查找定位，其余逐行比较
+
+        返回 (记录, 满足条件的总行数)，count 为False时总行数只计到 limit 为止。
+        """
+        ids = self.ids[table]
+        start, stop = 0, len(ids)
+        other = []
+        for column, op, value in filters:
+            if column == 'id' and op in ('gt', 'gte', 'lt', 'lte'):
+                value = int(value)
+                if op == 'gt':
+                    start = max(start, bisect.bisect_right(ids, value))
+                elif op == 'gte':
+                    start = max(start, bisect.bisect_left(ids, value))
+                elif op == 'lt':
+                    stop = min(stop, bisect.bisect_left(ids, value))
+                else:
+                    stop = min(stop, bisect.bisect_right(ids, value))
+            else:
+                other.append((column, op, value))
+
+        rows = self.rows[table]
+        indexes = range(stop - 1, start - 1, -1) if order_desc else range(start, stop)
+        result = []
+        total = 0
+        for index in indexes:
+            row = rows[index]
+            if not all(_compare(row.get(column), op, value) for column, op, value in other):
+                continue
+            total += 1
+            if limit is None or len(result) < limit:
+                result.append({column: row[column] for column in columns} if columns else dict(row))
+            elif not count:
+                break
+            elif not other:
+                # 只有id范围条件时总数可以直接算出
+                total = stop - start
+                break
+        return result, total
+
+    def summary(self, function_name):
+        with self.lock:
+            balance = sorted(self.balance.items())
+        if function_name == 'get_volunteer_summary':
+            return [
+                {"name": name, "total_score": total}
+                for name, (total, _, _, activity_count, _) in balance if activity_count
+            ]
+        if function_name == 'get_usage_summary':
+            return [
+                {"name": name, "used_points": used, "course_count": courses}
+                for name, (_, used, courses, _, usage_count) in balance if usage_count
+            ]
+        if function_name == 'get_complete_summary':
+            return [
+                {"name": name, "total_score": total, "used_points": used,
+                 "course_count": courses, "remaining_score": total - used}
+                for name, (total, used, courses, _, _) in balance
+            ]
+        return None
+
+def _compare(actual, op, value):
+    if actual is None:
+        return False
+    if isinstance(actual, int):
+        value = int(value)
+    if op == 'eq':
+        return actual == value
+    if op == 'gt':
+        return actual > value
+    if op == 'gte':
+        return actual >= value
+    if op == 'lt':
+        return actual < value
+    if op == 'lte':
+        return actual <= value
+    raise ValueError(f"不支持的运算符: {op}")
+
+def make_handler(store, latency=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 响应头与响应体分两次写出，关闭Nagle算法避免每个请求多等一个延迟确认
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            if latency:
+                time.sleep(latency)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _not_found(self, what):
+            self._send(404, {"code": "42P01", "message": f'relation "{what}" does not exist',
+                             "hint": None, "details": None})
+
+        def _read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'null') if length else None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            table = url.path.rsplit('/', 1)[-1]
+            if not url.path.startswith('/rest/v1/') or table not in TABLE_COLUMNS:
+                return self._not_found(table)
+
+            columns, filters, order_desc, limit = None, [], False, None
+            for key, value in parse_qsl(url.query, keep_blank_values=True):
+                if key == 'select':
+                    columns = None if value == '*' else [column.strip() for column in value.split(',')]
+                elif key == 'order':
+                    order_desc = value.split('.')[1:2] == ['desc']
+                elif key == 'limit':
+                    limit = int(value)
+                elif key == 'offset':
+                    return self._send(400, {"code": "PGRST100", "message": "offset 未实现", "hint": None, "details": None})
+                else:
+                    op, _, operand = value.partition('.')
+                    filters.append((key, op, operand))
+
+            count = 'count=exact' in (self.headers.get('Prefer') or '')
+            rows, total = store.select(table, columns, filters, order_desc, limit, count)
+            headers = {}
+            if count:
+                headers['Content-Range'] = f"0-{len(rows) - 1}/{total}" if rows else f"*/{total}"
+            self._send(200, rows, headers)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            name = url.path.rsplit('/', 1)[-1]
+            body = self._read_json()
+            if url.path.startswith('/rest/v1/rpc/'):
+                result = store.summary(name)
+                if result is None:
+                    return self._send(404, {"code": "PGRST202", "message": f"function {name} not found",
+                                         "hint": None, "details": None})
+                return self._send(200, result)
+            if name not in TABLE_COLUMNS:
+                return self._not_found(name)
+            records = body if isinstance(body, list) else [body]
+            self._send(201, store.insert(name, records))
+
+    return Handler
+
+class FakePostgREST:
+    """在后台线程中运行的替身服务，url 为传给 SupabaseRepository 的 SUPABASE_URL"""
+
+    def __init__(self, port=0, latency=0.0):
+        self.store = Store()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(self.store, latency))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = None
+
+    def seed(self, rows, seed=0, chunk_rows=5000):
+        for table, records in ledger(rows, seed).items():
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_rows:
+                    self.store.insert(table, chunk)
+                    chunk = []
+            if chunk:
+                self.store.insert(table, chunk)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 PostgREST 替身")
+    parser.add_argument('--port', type=int, default=0, help='监听端口，0为随机端口')
+    parser.add_argument('--seed-rows', type=int, default=0, help='预先写入的合成积分记录行数')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每个响应附加的延迟，模拟网络往返')
+    args = parser.parse_args()
+
+    fake = FakePostgREST(args.port, args.latency_ms / 1000)
+    fake.seed(args.seed_rows)
+    # 父进程从第一行读取地址
+    print(fake.url, flush=True)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+性能基准测试 - 离线测量提交、汇总与导出接口
+
+每个 (存储后端, 数据规模) 在单独的子进程中运行：写入合成数据后通过 Flask 测试客户端
+调用接口，记录延迟分位数、吞吐量和进程峰值内存(RSS)。supabase 后端连接本地的
+PostgREST 替身（bench/fake_postgrest.py，在另一个进程中运行），不访问网络。
+
+结果可以保存为JSON基线；与基线比较时 p50 延迟或峰值内存超过基线 --threshold 时
+以非零状态退出。
+
+    python bench/run_benchmarks.py --save-baseline
+    python bench/run_benchmarks.py --rows 10000,100000,1000000 --backends sqlite,memory
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+BACKENDS = ("sqlite", "memory", "supabase")
+
+SUMMARY_ENDPOINTS = {
+    "get_summary": "/api/get_summary",
+    "get_usage_summary": "/api/get_usage_summary",
+    "get_complete_summary": "/api/get_complete_summary"
+}
+
+EXPORT_ENDPOINTS = {
+    "export_db": "/api/export_db",
+    "export_volunteer_summary": "/api/export_volunteer_summary"
+}
+
+# 与基线比较的指标及低于该差值时不视为退化的噪声下限
+COMPARED_METRICS = {"p50_ms": 1.0, "peak_rss_mb": 5.0}
+
+def percentile(sorted_values, fraction):
+    """最近秩法求分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(durations, rows_per_call=None):
+    """把每次调用的耗时（秒）汇总为毫秒分位数与吞吐量"""
+    ordered = sorted(durations)
+    total = sum(ordered)
+    result = {
+        "iterations": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "requests_per_s": round(len(ordered) / total, 2) if total else None
+    }
+    if rows_per_call:
+        result["rows_per_s"] = round(rows_per_call * len(ordered) / total, 1) if total else None
+    return result
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _start_fake_postgrest(rows, latency_ms):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_postgrest.py"),
+         "--seed-rows", str(rows), "--latency-ms", str(latency_ms)],
+        stdout=subprocess.PIPE, text=True
+    )
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError("PostgREST替身启动失败")
+    return process, url
+
+def _seed(repository, rows, chunk_rows=5000):
+    from data import ledger
+
+    for table, records in ledger(rows).items():
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                repository.insert(table, chunk)
+                chunk = []
+        if chunk:
+            repository.insert(table, chunk)
+
+def _measure(client, method, path, iterations, warmup, before=None, **kwargs):
+    """先不计时地调用 warmup 次（导入延迟加载的模块、建立连接），再返回 iterations 次的耗时"""
+    durations = []
+    for iteration in range(warmup + iterations):
+        if before:
+            before()
+        elapsed = _timed(client, method, path, **kwargs)
+        if iteration >= warmup:
+            durations.append(elapsed)
+    return durations
+
+def _timed(client, method, path, **kwargs):
+    started = time.perf_counter()
+    response = getattr(client, method)(path, **kwargs)
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method.upper()} {path} 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return elapsed
+
+def run_case(backend, rows, args):
+    """在当前进程中运行一个后端与数据规模的全部测试，返回 {测试名: 指标}"""
+    fake = None
+    workdir = tempfile.mkdtemp(prefix="volunteer-bench-")
+    os.environ["DB_MODE"] = backend
+    os.environ["WRITE_BEHIND"] = "false"
+    if backend == "sqlite":
+        os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    elif backend == "supabase":
+        fake, url = _start_fake_postgrest(rows, args.latency_ms)
+        os.environ["SUPABASE_URL"] = url
+        os.environ["SUPABASE_SERVICE_KEY"] = "bench-service-key"
+
+    sys.path.insert(0, ROOT)
+    import logging
+    import app as app_module
+
+    # 测量期间不输出每个请求的日志
+    logging.disable(logging.WARNING)
+    try:
+        if app_module.repository is None:
+            raise RuntimeError(f"{backend} 存储后端初始化失败")
+        if backend != "supabase":
+            _seed(app_module.repository, rows)
+
+        client = app_module.app.test_client()
+        results = {}
+
+        # 每次都从存储后端读取，不命中汇总缓存
+        invalidate = app_module.summary_cache.invalidate
+        for name, path in SUMMARY_ENDPOINTS.items():
+            durations = _measure(client, "get", path, args.iterations, args.warmup, invalidate)
+            results[name] = summarize(durations)
+
+        for name, path in EXPORT_ENDPOINTS.items():
+            durations = _measure(client, "get", f"{path}?format={args.export_format}",
+                                 args.export_iterations, args.warmup, invalidate)
+            results[f"{name}_{args.export_format}"] = summarize(
+                durations, rows_per_call=rows if name == "export_db" else None)
+
+        # 写入放在最后，不影响上面读取的数据规模
+        from data import activity_rows, volunteer_count
+        volunteers = volunteer_count(rows)
+        for batch_size in args.batch_sizes:
+            activity = [[str(value) for value in row] for row in activity_rows(batch_size, volunteers, seed=1)]
+            durations = _measure(client, "post", "/api/submit", args.iterations, args.warmup,
+                                 json={"activityData": activity, "usageData": []})
+            results[f"submit_{batch_size}"] = summarize(durations, rows_per_call=batch_size)
+
+        results["peak_rss"] = {"peak_rss_mb": peak_rss_mb()}
+        return results
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _parse_ints(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def run_all(args):
+    """每个用例在新的子进程中运行，峰值内存互不影响"""
+    results = {}
+    for backend in args.backends:
+        for rows in args.rows:
+            print(f"▶ {backend} / {rows} 行", flush=True)
+            command = [
+                sys.executable, os.path.abspath(__file__),
+                "--case", backend, "--case-rows", str(rows),
+                "--iterations", str(args.iterations),
+                "--export-iterations", str(args.export_iterations),
+                "--export-format", args.export_format,
+                "--batch-sizes", ",".join(str(size) for size in args.batch_sizes),
+                "--latency-ms", str(args.latency_ms),
+                "--warmup", str(args.warmup)
+            ]
+            completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"{backend} / {rows} 行运行失败:\n{completed.stderr[-2000:]}")
+            case = json.loads(completed.stdout.strip().splitlines()[-1])
+            for name, metrics in case.items():
+                results[f"{backend}/{rows}/{name}"] = metrics
+    return results
+
+def compare(results, baseline, threshold):
+    """返回超过基线 threshold 的退化 [(用例, 指标, 基线值, 当前值)]"""
+    regressions = []
+    for key, metrics in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric, noise_floor in COMPARED_METRICS.items():
+            current, previous = metrics.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + threshold) and current - previous > noise_floor:
+                regressions.append((key, metric, previous, current))
+    return regressions
+
+def print_results(results):
+    print(f"{'用例':<52}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'req/s':>10}{'rows/s':>12}")
+    for key, metrics in results.items():
+        if "peak_rss_mb" in metrics:
+            print(f"{key:<52}{'峰值内存':>10}{metrics['peak_rss_mb']:>10} MB")
+            continue
+        print(f"{key:<52}{metrics['p50_ms']:>10}{metrics['p95_ms']:>10}{metrics['p99_ms']:>10}"
+              f"{metrics['requests_per_s']:>10}{metrics.get('rows_per_s') or '':>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="提交、汇总与导出接口的性能基准测试")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help=f"逗号分隔的存储后端，可选 {', '.join(BACKENDS)}")
+    parser.add_argument("--rows", type=_parse_ints, default=[10000, 100000],
+                        help="逗号分隔的合成积分记录行数（使用记录为其十分之一）")
+    parser.add_argument("--batch-sizes", type=_parse_ints, default=[1, 10, 100, 1000],
+                        help="逗号分隔的单次提交行数")
+    parser.add_argument("--iterations", type=int, default=20, help="汇总与提交的重复次数")
+    parser.add_argument("--export-iterations", type=int, default=3, help="导出的重复次数")
+    parser.add_argument("--export-format", default="csv", help="导出格式")
+    parser.add_argument("--warmup", type=int, default=1, help="每项测试开始计时前的预热调用次数")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="PostgREST替身每个响应附加的延迟，模拟网络往返")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="允许的退化比例，0.25 表示比基线慢25%%以内不算退化")
+    parser.add_argument("--output", help="另存本次结果的JSON文件")
+    parser.add_argument("--case", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--case-rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.case_rows, args)))
+        return 0
+
+    args.backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"未知的存储后端: {', '.join(sorted(unknown))}")
+
+    print("🚀 开始性能基准测试")
+    results = run_all(args)
+    print_results(results)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 基线已保存到 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ 没有基线文件 {args.baseline}，使用 --save-baseline 生成")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, metric, previous, current in regressions:
+        print(f"❌ {key} {metric}: {previous} -> {current}（+{(current / previous - 1) * 100:.0f}%）")
+    if regressions:
+        return 1
+    print(f"✅ 与基线相比没有超过 {args.threshold:.0%} 的退化")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
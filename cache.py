@@ -0,0 +1,76 @@
+"""
+汇总数据缓存模块
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class SummaryCache:
+    """进程内的汇总结果缓存
+
+    每个条目在 ttl 秒后过期，条目数超过 max_entries 时淘汰最久未使用的条目。
+    写入数据后调用 invalidate() 清空缓存。ttl 为 0 时不缓存。
+    """
+
+    def __init__(self, ttl=60, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回未过期的缓存值，不存在时返回 (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            # 加载期间缓存已失效，丢弃可能过期的结果
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """命中时直接返回缓存值，否则调用 loader() 加载并缓存"""
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self._generation
+        value = loader()
+        self.set(key, value, generation)
+        return value
+
+    def invalidate(self):
+        """清空全部缓存条目"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries
+            }
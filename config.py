@@ -4,10 +4,23 @@
 import os
 import logging
 from dotenv import load_dotenv
+from logging_setup import setup_logging
 
 # 加载环境变量
 load_dotenv()
 
+# Supabase配置，优先使用服务密钥，如果没有则使用匿名密钥
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
+
+def _default_db_mode(fallback):
+    """未显式设置 DB_MODE 时，配置了Supabase则使用Supabase，否则使用 fallback"""
+    if os.environ.get("DB_MODE"):
+        return os.environ["DB_MODE"]
+    if SUPABASE_URL and SUPABASE_KEY:
+        return "supabase"
+    return fallback
+
 # 基础配置
 class BaseConfig:
     # 应用配置
@@ -17,21 +30,49 @@ class BaseConfig:
     
     # 日志配置
     LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
-    LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+    # json：每行一条JSON；text：按 LOG_FORMAT 输出的文本，便于本地查看
+    LOG_OUTPUT = os.environ.get("LOG_OUTPUT", "json").lower()
+    # 是否由后台线程格式化和写出日志；Vercel等无服务器部署默认直接写出
+    LOG_ASYNC = os.environ.get("LOG_ASYNC", "false" if os.environ.get("VERCEL") else "true").lower() == "true"
+    # 单条日志消息的最大字符数，超出部分截断
+    LOG_MAX_MESSAGE_CHARS = int(os.environ.get("LOG_MAX_MESSAGE_CHARS", "2000"))
     
     # 数据库配置
-    DB_MODE = os.environ.get("DB_MODE", "sqlite")  # 'sqlite', 'postgres', 'memory'
+    DB_MODE = _default_db_mode("sqlite")  # 'supabase', 'postgres', 'sqlite', 'memory'
+    SUPABASE_URL = SUPABASE_URL
+    SUPABASE_KEY = SUPABASE_KEY
     DATABASE_URL = os.environ.get("DATABASE_URL")
     SQLITE_DB_PATH = os.environ.get("DB_PATH", "volunteer_points.db")
     
+    # SQLite连接配置（每个线程一个长连接）
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "20480"))  # 页缓存大小
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "5"))  # 秒，等待写锁的时间
+    
+    # Supabase HTTP配置：所有请求共用一个保持连接的客户端
+    SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))  # 秒，单次请求超时
+    SUPABASE_CONNECT_TIMEOUT = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5"))  # 秒
+    SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "20"))
+    SUPABASE_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_MAX_KEEPALIVE", "10"))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "30"))  # 秒
+    SUPABASE_HTTP2 = os.environ.get("SUPABASE_HTTP2", "false").lower() == "true"
+    SUPABASE_MAX_RETRIES = int(os.environ.get("SUPABASE_MAX_RETRIES", "2"))
+    SUPABASE_RETRY_BACKOFF = float(os.environ.get("SUPABASE_RETRY_BACKOFF", "0.1"))  # 秒，首次重试的最大等待
+    
     # 连接池配置
     DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
     DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))  # 秒，等待空闲连接的最长时间
+    DB_POOL_MAX_LIFETIME = int(os.environ.get("DB_POOL_MAX_LIFETIME", "1800"))  # 秒，0表示不限
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
     
     # 重试配置
     MAX_RETRIES = int(os.environ.get("MAX_RETRIES", "3"))
     RETRY_DELAY = int(os.environ.get("RETRY_DELAY", "1"))  # 秒
     
+    # 并发查询配置：一次请求中互不依赖的查询并行执行的线程数
+    QUERY_CONCURRENCY = int(os.environ.get("QUERY_CONCURRENCY", "8"))
+    
     # API配置
     API_PREFIX = "/api"
     CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "*").split(",")
@@ -51,8 +92,8 @@ class TestingConfig(BaseConfig):
 class ProductionConfig(BaseConfig):
     DEBUG = False
     TESTING = False
-    LOG_LEVEL = "ERROR"
-    DB_MODE = "postgres"  # 生产环境使用PostgreSQL
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "ERROR")
+    DB_MODE = _default_db_mode("postgres")  # 生产环境使用Supabase或PostgreSQL
     DB_POOL_MIN = 2
     DB_POOL_MAX = 5
 
@@ -70,10 +111,13 @@ def get_config():
 config = get_config()
 
 # 配置日志
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format=config.LOG_FORMAT
+setup_logging(
+    config.LOG_LEVEL,
+    output=config.LOG_OUTPUT,
+    text_format=config.LOG_FORMAT,
+    use_queue=config.LOG_ASYNC,
+    max_message_chars=config.LOG_MAX_MESSAGE_CHARS
 )
 logger = logging.getLogger(__name__)
-logger.info(f"加载配置: {config.__class__.__name__}")
+logger.info(f"加载配置: {config.__name__}")
 logger.info(f"数据库模式: {config.DB_MODE}")
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+数据库访问包
+"""
+from db.repository import Repository, LEDGER_COLUMNS, get_repository, run_concurrently
+
+__all__ = ['Repository', 'LEDGER_COLUMNS', 'get_repository', 'run_concurrently']
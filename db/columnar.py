@@ -0,0 +1,149 @@
+"""
+内存列式存储模块
+"""
+import threading
+from array import array
+
+class Dictionary:
+    """字典编码：每个不同的值只保存一次，列中保存其编号"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.values)
+                    self.values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def lookup(self, value):
+        """值对应的编号，从未出现过时返回None"""
+        return self._codes.get(value)
+
+class ColumnStore:
+    """按列保存一张明细表：整数列为 array('q')，其余列字典编码为 array('I')
+
+    追加时同时更新按 key 列分组的行数与各整数列之和，汇总只需遍历分组而不必
+    扫描全部记录。行号从0开始，只追加不删除。多张表可以共用同一个 Dictionary
+    （如姓名），使分组编号在各表之间一致。
+    """
+
+    def __init__(self, fields, integer_fields=(), key=None, dictionaries=None):
+        self.fields = list(fields)
+        self.integer_fields = [field for field in self.fields if field in integer_fields]
+        self.key = key
+        dictionaries = dictionaries or {}
+        # 共用的字典在建表时通常还是空的（len 为0），不能用 or 判断
+        self._dictionaries = {
+            field: dictionaries[field] if dictionaries.get(field) is not None else Dictionary()
+            for field in self.fields if field not in self.integer_fields
+        }
+        self._columns = {
+            field: array('q') if field in self.integer_fields else array('I')
+            for field in self.fields
+        }
+        self._length = 0
+        self._group_counts = array('q')
+        self._group_sums = {field: array('q') for field in self.integer_fields}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def _encode(self, row):
+        """把一行（按 fields 顺序的列表，缺少的字段为None）转换为列中保存的值"""
+        encoded = []
+        for position, field in enumerate(self.fields):
+            value = row[position] if position < len(row) else None
+            if field in self._group_sums:
+                encoded.append(int(value) if value not in (None, '') else 0)
+            else:
+                encoded.append(self._dictionaries[field].encode(value))
+        return encoded
+
+    def extend(self, rows):
+        """追加多行；任一行的整数列无法转换时抛出 ValueError，且不写入任何一行"""
+        encoded_rows = [self._encode(row) for row in rows]
+        key_position = self.fields.index(self.key) if self.key else None
+        with self._lock:
+            for encoded in encoded_rows:
+                for field, value in zip(self.fields, encoded):
+                    self._columns[field].append(value)
+                if key_position is not None:
+                    self._add_to_group(encoded[key_position], encoded)
+            self._length += len(encoded_rows)
+        return len(encoded_rows)
+
+    def _add_to_group(self, code, encoded):
+        if code >= len(self._group_counts):
+            missing = code + 1 - len(self._group_counts)
+            self._group_counts.extend([0] * missing)
+            for sums in self._group_sums.values():
+                sums.extend([0] * missing)
+        self._group_counts[code] += 1
+        for field, value in zip(self.fields, encoded):
+            if field in self._group_sums:
+                self._group_sums[field][code] += value
+
+    def value(self, field, index):
+        stored = self._columns[field][index]
+        if field in self._group_sums:
+            return stored
+        return self._dictionaries[field].values[stored]
+
+    def row(self, index):
+        """第 index 行，按 fields 顺序的列表"""
+        return [self.value(field, index) for field in self.fields]
+
+    def matches(self, index, filters):
+        """第 index 行是否满足等值过滤条件；比较编号，不解码字符串"""
+        for field, value in filters.items():
+            if field in self._group_sums:
+                if self._columns[field][index] != value:
+                    return False
+            else:
+                code = self._dictionaries[field].lookup(value)
+                if code is None or self._columns[field][index] != code:
+                    return False
+        return True
+
+    def groups(self):
+        """每个 key 值一项: {key值: {'count': 行数, 整数列: 和}}，耗时只与分组数相关"""
+        names = self._dictionaries[self.key].values
+        with self._lock:
+            counts = list(self._group_counts)
+            sums = {field: list(values) for field, values in self._group_sums.items()}
+        return {
+            names[code]: dict({'count': count}, **{field: sums[field][code] for field in sums})
+            for code, count in enumerate(counts) if count
+        }
+
+    def group(self, value):
+        """单个 key 值的 {'count', 整数列之和}，没有记录时返回None"""
+        code = self._dictionaries[self.key].lookup(value)
+        with self._lock:
+            if code is None or code >= len(self._group_counts) or not self._group_counts[code]:
+                return None
+            result = {'count': self._group_counts[code]}
+            for field, sums in self._group_sums.items():
+                result[field] = sums[code]
+        return result
+
+    def nbytes(self):
+        """列与分组数组占用的字节数（不含字典中的字符串）"""
+        arrays = list(self._columns.values()) + [self._group_counts] + list(self._group_sums.values())
+        return sum(values.itemsize * len(values) for values in arrays)
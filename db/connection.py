@@ -3,90 +3,161 @@
 """
 import time
 import logging
+import threading
 from contextlib import contextmanager
 from config import config
 
 logger = logging.getLogger(__name__)
 
-# 内存数据存储
+# 内存数据存储：按列保存，两张表共用姓名字典
 if config.DB_MODE == 'memory':
-    volunteer_data = []
-    usage_data = []
+    from db.columnar import ColumnStore, Dictionary
+    _volunteer_names = Dictionary()
+    volunteer_data = ColumnStore(
+        ['activity_type', 'activity_time_name', 'category', 'name', 'score', 'created_at'],
+        integer_fields=['score'], key='name', dictionaries={'name': _volunteer_names}
+    )
+    usage_data = ColumnStore(
+        ['name', 'used_points', 'course_count', 'created_at'],
+        integer_fields=['used_points', 'course_count'], key='name', dictionaries={'name': _volunteer_names}
+    )
+
+# SQLite连接：每个线程一个长连接，避免每次操作都重新打开数据库文件
+_sqlite_local = threading.local()
+_sqlite_connections = {}  # 线程 -> 连接，用于关闭连接和清理已结束线程的连接
+_sqlite_lock = threading.Lock()
+# close_db_connections() 关闭全部连接后加一，其它线程据此丢弃已关闭的连接并重新打开
+_sqlite_generation = 0
+
+def _open_sqlite_connection():
+    import sqlite3
+    conn = sqlite3.connect(
+        config.SQLITE_DB_PATH,
+        timeout=config.SQLITE_BUSY_TIMEOUT,
+        check_same_thread=False,  # 只在所属线程中使用，关闭时可能来自其他线程
+        cached_statements=256  # 长连接上复用已编译的语句
+    )
+    conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+    # WAL模式下读写互不阻塞；synchronous=NORMAL 在WAL下仍保证数据库一致
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def _get_sqlite_connection():
+    """返回当前线程的SQLite连接，首次使用时创建"""
+    conn = getattr(_sqlite_local, 'conn', None)
+    if conn is not None and _sqlite_local.generation == _sqlite_generation:
+        return conn
+
+    conn = _open_sqlite_connection()
+    with _sqlite_lock:
+        _sqlite_local.conn = conn
+        _sqlite_local.generation = _sqlite_generation
+        for thread in [thread for thread in _sqlite_connections if not thread.is_alive()]:
+            try:
+                _sqlite_connections.pop(thread).close()
+            except Exception as e:
+                logger.error(f"关闭SQLite连接失败: {str(e)}")
+        _sqlite_connections[threading.current_thread()] = conn
+    logger.debug(f"SQLite连接已创建，当前连接数: {len(_sqlite_connections)}")
+    return conn
 
 # PostgreSQL连接池
 connection_pool = None
 if config.DB_MODE == 'postgres':
     try:
-        import psycopg2
-        from psycopg2 import pool
+        from db.pool import PostgresPool
         
         # 创建连接池
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            config.DB_POOL_MIN, 
-            config.DB_POOL_MAX, 
-            config.DATABASE_URL
+        connection_pool = PostgresPool(
+            config.DATABASE_URL,
+            minconn=config.DB_POOL_MIN,
+            maxconn=config.DB_POOL_MAX,
+            max_lifetime=config.DB_POOL_MAX_LIFETIME,
+            checkout_timeout=config.DB_POOL_TIMEOUT,
+            pre_ping=config.DB_POOL_PRE_PING
         )
         logger.info("PostgreSQL连接池创建成功")
     except Exception as e:
         logger.error(f"PostgreSQL连接池创建失败: {str(e)}")
         connection_pool = None
 
-@contextmanager
-def get_db_connection():
-    """获取数据库连接的上下文管理器"""
-    conn = None
+def _acquire_postgres_connection():
+    """获取PostgreSQL连接，只对建立连接失败进行重试"""
+    from db.pool import PoolTimeout
+
     retries = 0
-    
-    while retries < config.MAX_RETRIES:
+    while True:
         try:
-            if config.DB_MODE == 'memory':
-                # 内存模式返回字典
-                yield {'volunteer_data': volunteer_data, 'usage_data': usage_data}
-                return
-            elif config.DB_MODE == 'sqlite':
-                # SQLite连接
-                import sqlite3
-                conn = sqlite3.connect(config.SQLITE_DB_PATH)
-                conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
-                yield conn
-                conn.close()
-                return
-            elif config.DB_MODE == 'postgres':
-                # PostgreSQL连接
-                if connection_pool:
-                    conn = connection_pool.getconn()
-                else:
-                    # 如果连接池创建失败，尝试直接连接
-                    import psycopg2
-                    logger.warning("使用直接连接而非连接池")
-                    conn = psycopg2.connect(config.DATABASE_URL)
-                yield conn
-                if connection_pool and conn:
-                    connection_pool.putconn(conn)
-                else:
-                    conn.close()
-                return
+            if connection_pool:
+                return connection_pool.getconn()
+            # 如果连接池创建失败，尝试直接连接
+            import psycopg2
+            logger.warning("使用直接连接而非连接池")
+            return psycopg2.connect(config.DATABASE_URL)
+        except PoolTimeout:
+            # 连接池已满时的等待已经包含在 DB_POOL_TIMEOUT 内，不再重试
+            raise
         except Exception as e:
             retries += 1
             logger.error(f"数据库连接尝试 {retries} 失败: {str(e)}")
-            if conn:
-                try:
-                    if config.DB_MODE == 'postgres' and connection_pool and conn:
-                        connection_pool.putconn(conn)
-                    else:
-                        conn.close()
-                except Exception as close_error:
-                    logger.error(f"关闭数据库连接失败: {str(close_error)}")
-            
-            if retries < config.MAX_RETRIES:
-                logger.info(f"{config.RETRY_DELAY} 秒后重试...")
-                time.sleep(config.RETRY_DELAY)
-            else:
+            if retries >= config.MAX_RETRIES:
                 logger.error("达到最大重试次数。无法连接到数据库。")
                 raise
+            logger.info(f"{config.RETRY_DELAY} 秒后重试...")
+            time.sleep(config.RETRY_DELAY)
+
+@contextmanager
+def get_db_connection():
+    """获取数据库连接的上下文管理器
+
+    重试只发生在获取连接时；with 块内的异常原样抛出，连接随后归还（PostgreSQL会
+    回滚未提交的事务）。
+    """
+    if config.DB_MODE == 'memory':
+        # 内存模式返回字典
+        yield {'volunteer_data': volunteer_data, 'usage_data': usage_data}
+    elif config.DB_MODE == 'sqlite':
+        # 复用当前线程的长连接，出错时回滚未提交的事务，连接保持打开
+        conn = _get_sqlite_connection()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+    elif config.DB_MODE == 'postgres':
+        conn = _acquire_postgres_connection()
+        try:
+            yield conn
+        finally:
+            if connection_pool:
+                connection_pool.putconn(conn)
+            else:
+                conn.close()
+    else:
+        raise ValueError(f"数据库模式 {config.DB_MODE} 不使用 db.connection")
+
+def pool_stats():
+    """PostgreSQL连接池指标，其他模式返回None"""
+    return connection_pool.stats() if connection_pool else None
 
 def close_db_connections():
     """关闭所有数据库连接"""
+    global _sqlite_generation
     if config.DB_MODE == 'postgres' and connection_pool:
         connection_pool.closeall()
-        logger.info("已关闭所有PostgreSQL连接")
\ No newline at end of file
+        logger.info("已关闭所有PostgreSQL连接")
+    elif config.DB_MODE == 'sqlite':
+        with _sqlite_lock:
+            # 包括请求线程、写入队列线程等其它线程打开的连接；这些线程下次访问时重新打开
+            for conn in _sqlite_connections.values():
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"关闭SQLite连接失败: {str(e)}")
+            _sqlite_connections.clear()
+            _sqlite_generation += 1
+        _sqlite_local.__dict__.pop('conn', None)
+        logger.info("已关闭所有SQLite连接")
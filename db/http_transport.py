@@ -0,0 +1,151 @@
+"""
+Supabase HTTP传输层模块
+"""
+import time
+import random
+import logging
+import threading
+from collections import deque
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 可以安全重发的请求：只读方法，以及只读/幂等的RPC汇总函数
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+def endpoint_name(request):
+    """把请求归类为统计用的端点名，例如 GET volunteer_points、POST rpc/get_complete_summary"""
+    path = request.url.path
+    for prefix in ('/rest/v1/', '/auth/v1/', '/storage/v1/', '/functions/v1/'):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    return f"{request.method} {path.strip('/') or '/'}"
+
+class LatencyStats:
+    """按端点统计上游请求耗时（到收到响应头为止），保留最近 window 次用于计算分位数"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, seconds, error=False, retries=0):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "count": 0, "errors": 0, "retries": 0, "total": 0.0,
+                    "samples": deque(maxlen=self.window)
+                }
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["retries"] += retries
+            if error:
+                entry["errors"] += 1
+            entry["samples"].append(seconds)
+
+    def snapshot(self):
+        """{端点: {count, errors, retries, avg_ms, p50_ms, p95_ms, p99_ms, max_ms}}"""
+        with self._lock:
+            items = [(endpoint, dict(entry, samples=sorted(entry["samples"])))
+                     for endpoint, entry in self._endpoints.items()]
+
+        def percentile(samples, q):
+            return samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+
+        result = {}
+        for endpoint, entry in sorted(items):
+            samples = entry["samples"]
+            result[endpoint] = {
+                "count": entry["count"],
+                "errors": entry["errors"],
+                "retries": entry["retries"],
+                "avg_ms": round(entry["total"] / entry["count"] * 1000, 3),
+                "p50_ms": round(percentile(samples, 0.5), 3),
+                "p95_ms": round(percentile(samples, 0.95), 3),
+                "p99_ms": round(percentile(samples, 0.99), 3),
+                "max_ms": round(samples[-1] * 1000, 3)
+            }
+        return result
+
+class RetryTransport(httpx.BaseTransport):
+    """带连接池、重试与耗时统计的 httpx 传输层
+
+    - 连接建立失败（请求尚未发出）时任何请求都会重试
+    - 读超时、连接中断或 502/503/504 只对只读请求和 RPC 调用重试，插入不会被重复执行
+    - 重试间隔为指数退避加全抖动：random(0, min(backoff_max, backoff * 2^n))
+    """
+
+    def __init__(self, transport, stats, max_retries=2, backoff=0.1, backoff_max=2.0):
+        self._transport = transport
+        self.stats = stats
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+    def _retry_safe(self, request):
+        return request.method in SAFE_METHODS or '/rpc/' in request.url.path
+
+    def _sleep(self, attempt):
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt))))
+
+    def handle_request(self, request):
+        endpoint = endpoint_name(request)
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                retryable = True
+                error = e
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError) as e:
+                retryable = self._retry_safe(request)
+                error = e
+            else:
+                if (response.status_code in RETRY_STATUS_CODES and self._retry_safe(request)
+                        and attempt < self.max_retries):
+                    response.close()
+                    logger.warning(f"Supabase请求 {endpoint} 返回 {response.status_code}，重试第 {attempt + 1} 次")
+                    self._sleep(attempt)
+                    attempt += 1
+                    continue
+                self.stats.record(endpoint, time.perf_counter() - started,
+                                  error=response.status_code >= 500, retries=attempt)
+                return response
+
+            if not retryable or attempt >= self.max_retries:
+                self.stats.record(endpoint, time.perf_counter() - started, error=True, retries=attempt)
+                raise error
+            logger.warning(f"Supabase请求 {endpoint} 失败: {str(error)}，重试第 {attempt + 1} 次")
+            self._sleep(attempt)
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+def create_http_client(timeout=10, connect_timeout=5, max_connections=20, max_keepalive=10,
+                       keepalive_expiry=30, http2=False, max_retries=2, backoff=0.1, stats=None):
+    """创建所有Supabase请求共用的 httpx.Client，连接在请求之间保持复用"""
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 h2，无法启用HTTP/2，改用HTTP/1.1（pip install httpx[http2]）")
+            http2 = False
+
+    transport = httpx.HTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+    return httpx.Client(
+        transport=RetryTransport(transport, stats or LatencyStats(), max_retries=max_retries, backoff=backoff),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        follow_redirects=True
+    )
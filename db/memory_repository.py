@@ -0,0 +1,85 @@
+"""
+内存存储后端模块
+"""
+from datetime import datetime, timezone
+from db.connection import get_db_connection
+from db.repository import Repository
+
+DATA_KEYS = {
+    'volunteer_points': 'volunteer_data',
+    'volunteer_usage': 'usage_data'
+}
+
+class MemoryRepository(Repository):
+    """进程内存储，用于测试和演示，数据保存在 db.connection 的列式存储中
+
+    记录的id为其行号加1；汇总读取写入时维护的按姓名分组结果，耗时只与志愿者人数相关。
+    """
+
+    name = 'memory'
+
+    def _store(self, table):
+        with get_db_connection() as conn:
+            return conn[DATA_KEYS[table]]
+
+    def insert(self, table, records):
+        created_at = datetime.now(timezone.utc).isoformat()
+        store = self._store(table)
+        return store.extend([
+            [record.get('created_at') or created_at if field == 'created_at' else record.get(field)
+             for field in store.fields]
+            for record in records
+        ])
+
+    def points_summary(self):
+        return [
+            {"name": name, "total_score": group['score']}
+            for name, group in self._store('volunteer_points').groups().items()
+        ]
+
+    def usage_summary(self):
+        return [
+            {"name": name, "used_points": group['used_points'], "course_count": group['course_count']}
+            for name, group in self._store('volunteer_usage').groups().items()
+        ]
+
+    def volunteer_totals(self, name):
+        points = self._store('volunteer_points').group(name)
+        usage = self._store('volunteer_usage').group(name)
+        if points is None and usage is None:
+            return None
+        return {
+            "total_score": points['score'] if points else 0,
+            "used_points": usage['used_points'] if usage else 0,
+            "course_count": usage['course_count'] if usage else 0
+        }
+
+    def list_rows(self, table, filters=None, created_from=None, created_to=None,
+                  cursor=None, order='asc', limit=100):
+        store = self._store(table)
+        length = len(store)
+        if order == 'asc':
+            start = max(cursor or 0, 0)
+            indexes = range(start, length)
+        else:
+            start = max(cursor - 1, 0) if cursor is not None else length
+            indexes = range(min(start, length) - 1, -1, -1)
+
+        result = []
+        for index in indexes:
+            if filters and not store.matches(index, filters):
+                continue
+            created_at = store.value('created_at', index)
+            if created_from and created_at < created_from:
+                continue
+            if created_to and created_at > created_to:
+                continue
+            record = dict(zip(store.fields, store.row(index)))
+            record['id'] = index + 1
+            result.append(record)
+            if len(result) >= limit:
+                break
+        return result
+
+    def data_version(self):
+        return '|'.join(f"{table}:{len(self._store(table))}" for table in DATA_KEYS)
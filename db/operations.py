@@ -7,8 +7,60 @@ from config import config
 
 logger = logging.getLogger(__name__)
 
+# 与 supabase_setup.sql 中一致的索引（SQLite不支持 INCLUDE，只建组合索引）
+# 按姓名过滤并按id分页的查询使用 (name, id)，它同时取代了旧的单列姓名索引
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS idx_volunteer_points_name_id ON volunteer_points(name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_volunteer_usage_name_id ON volunteer_usage(name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_volunteer_points_category_id ON volunteer_points(category, id)",
+    "DROP INDEX IF EXISTS idx_volunteer_points_name",
+    "DROP INDEX IF EXISTS idx_volunteer_usage_name",
+    "CREATE INDEX IF NOT EXISTS idx_volunteer_points_created_at ON volunteer_points(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_volunteer_usage_created_at ON volunteer_usage(created_at)"
+]
+
+def _upgrade_sqlite_schema(cursor):
+    """升级旧版SQLite表结构
+
+    旧版 volunteer_points 没有 created_at；旧版 volunteer_usage 每人一行（name UNIQUE，
+    带 total_points），改为与Supabase一致的每次使用一行，已有数据原样迁移。
+    """
+    cursor.execute("PRAGMA table_info(volunteer_points)")
+    points_columns = [row[1] for row in cursor.fetchall()]
+    if points_columns and 'created_at' not in points_columns:
+        cursor.execute("ALTER TABLE volunteer_points ADD COLUMN created_at TIMESTAMP")
+        logger.info("已为 volunteer_points 添加 created_at 列")
+
+    cursor.execute("PRAGMA table_info(volunteer_usage)")
+    usage_columns = [row[1] for row in cursor.fetchall()]
+    if 'total_points' in usage_columns:
+        cursor.execute("ALTER TABLE volunteer_usage RENAME TO volunteer_usage_legacy")
+        cursor.execute('''
+            CREATE TABLE volunteer_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                used_points INTEGER NOT NULL DEFAULT 0,
+                course_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO volunteer_usage (name, used_points, course_count)
+            SELECT name, COALESCE(used_points, 0), COALESCE(course_count, 0)
+            FROM volunteer_usage_legacy
+            WHERE name IS NOT NULL
+        ''')
+        cursor.execute("DROP TABLE volunteer_usage_legacy")
+        logger.info("已将 volunteer_usage 升级为使用记录表")
+
+# 表结构只在进程内初始化一次
+_schema_ready = False
+
 def init_db():
-    """初始化数据库表"""
+    """初始化数据库表，同一进程内重复调用直接返回"""
+    global _schema_ready
+    if _schema_ready:
+        return True
     try:
         with get_db_connection() as conn:
             if config.DB_MODE == 'memory':
@@ -16,6 +68,7 @@ def init_db():
                 return True
             elif config.DB_MODE == 'sqlite':
                 cursor = conn.cursor()
+                _upgrade_sqlite_schema(cursor)
                 
                 # 创建志愿者积分表
                 cursor.execute('''
@@ -25,22 +78,27 @@ def init_db():
                         activity_time_name TEXT,
                         category TEXT,
                         name TEXT,
-                        score TEXT
+                        score INTEGER NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
                 
-                # 创建志愿者积分使用情况表
+                # 创建志愿者积分使用记录表（每次使用一行）
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS volunteer_usage (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT UNIQUE,
-                        total_points INTEGER DEFAULT 0,
-                        used_points INTEGER DEFAULT 0,
-                        course_count INTEGER DEFAULT 0
+                        name TEXT NOT NULL,
+                        used_points INTEGER NOT NULL DEFAULT 0,
+                        course_count INTEGER NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
                 
+                for statement in INDEX_STATEMENTS:
+                    cursor.execute(statement)
+                
                 conn.commit()
+                _schema_ready = True
                 logger.info("SQLite数据库初始化成功")
                 return True
             elif config.DB_MODE == 'postgres':
@@ -54,22 +112,27 @@ def init_db():
                         activity_time_name TEXT,
                         category TEXT,
                         name TEXT,
-                        score TEXT
+                        score INTEGER NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
                     )
                 ''')
                 
-                # 创建志愿者积分使用情况表
+                # 创建志愿者积分使用记录表（每次使用一行）
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS volunteer_usage (
                         id SERIAL PRIMARY KEY,
-                        name TEXT UNIQUE,
-                        total_points INTEGER DEFAULT 0,
-                        used_points INTEGER DEFAULT 0,
-                        course_count INTEGER DEFAULT 0
+                        name TEXT NOT NULL,
+                        used_points INTEGER NOT NULL DEFAULT 0,
+                        course_count INTEGER NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
                     )
                 ''')
                 
+                for statement in INDEX_STATEMENTS:
+                    cursor.execute(statement)
+                
                 conn.commit()
+                _schema_ready = True
                 logger.info("PostgreSQL数据库初始化成功")
                 return True
     except Exception as e:
@@ -94,47 +157,33 @@ def health_check():
     except Exception as e:
         return False, f"数据库连接异常: {str(e)}"
 
+def _activity_rows(activity_data):
+    """补全活动类型：4列的旧格式记录默认为线下活动"""
+    rows = []
+    for row in activity_data:
+        if len(row) == 5:
+            rows.append(list(row))
+        elif len(row) == 4:
+            rows.append(['线下活动'] + list(row))
+    return rows
+
 def add_volunteer_points(activity_data):
-    """添加志愿者积分记录"""
+    """添加志愿者积分记录，所有记录在一个事务内批量写入"""
+    rows = _activity_rows(activity_data)
     try:
         with get_db_connection() as conn:
             if config.DB_MODE == 'memory':
                 # 内存模式
                 from db.connection import volunteer_data
-                for row in activity_data:
-                    if len(row) == 5:
-                        volunteer_data.append(row)
-                    elif len(row) == 4:
-                        volunteer_data.append(['线下活动'] + row)
+                volunteer_data.extend(rows)
                 return True
-            elif config.DB_MODE == 'sqlite':
+            elif config.DB_MODE in ('sqlite', 'postgres'):
+                placeholder = '?' if config.DB_MODE == 'sqlite' else '%s'
                 cursor = conn.cursor()
-                for row in activity_data:
-                    if len(row) == 5:
-                        cursor.execute('''
-                            INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score)
-                            VALUES (?,?,?,?,?)
-                        ''', row)
-                    elif len(row) == 4:
-                        cursor.execute('''
-                            INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score)
-                            VALUES (?,?,?,?,?)
-                        ''', ['线下活动'] + row)
-                conn.commit()
-                return True
-            elif config.DB_MODE == 'postgres':
-                cursor = conn.cursor()
-                for row in activity_data:
-                    if len(row) == 5:
-                        cursor.execute('''
-                            INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score)
-                            VALUES (%s, %s, %s, %s, %s)
-                        ''', row)
-                    elif len(row) == 4:
-                        cursor.execute('''
-                            INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score)
-                            VALUES (%s, %s, %s, %s, %s)
-                        ''', ['线下活动'] + row)
+                cursor.executemany(f'''
+                    INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score)
+                    VALUES ({', '.join([placeholder] * 5)})
+                ''', rows)
                 conn.commit()
                 return True
     except Exception as e:
@@ -148,18 +197,11 @@ def get_volunteer_summary():
             if config.DB_MODE == 'memory':
                 # 内存模式
                 from db.connection import volunteer_data
-                # 按名字分组并累加积分
-                summary = {}
-                for row in volunteer_data:
-                    name = row[3]  # 名字在第4个位置
-                    score = int(row[4])  # 积分在第5个位置
-                    if name in summary:
-                        summary[name] += score
-                    else:
-                        summary[name] = score
-                
-                # 转换为列表格式
-                return [{"name": name, "total_score": score} for name, score in summary.items()]
+                # 按名字分组的积分在写入时已累加
+                return [
+                    {"name": name, "total_score": group['score']}
+                    for name, group in volunteer_data.groups().items()
+                ]
             elif config.DB_MODE == 'sqlite':
                 cursor = conn.cursor()
                 cursor.execute('''
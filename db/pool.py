@@ -0,0 +1,205 @@
+"""
+PostgreSQL连接池模块
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    """在 checkout_timeout 内没有可用连接"""
+
+class PostgresPool:
+    """线程安全的PostgreSQL连接池
+
+    - 借出前校验连接（pre_ping 时执行 SELECT 1），失效的连接丢弃后重新建立
+    - 连接存活超过 max_lifetime 秒后在归还或借出时关闭
+    - 连接数达到 maxconn 时最多等待 checkout_timeout 秒，超时抛出 PoolTimeout
+    - 归还时回滚未结束的事务，避免下一位使用者看到脏状态
+    - stats() 返回等待时间和饱和度等指标
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, max_lifetime=1800, checkout_timeout=5,
+                 pre_ping=True, connect=None):
+        if connect is None:
+            import psycopg2
+            connect = psycopg2.connect
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.pre_ping = pre_ping
+        self._connect = connect
+        self._condition = threading.Condition()
+        self._idle = deque()  # (连接, 创建时间)
+        self._created_at = {}  # id(连接) -> 创建时间，包括借出中的连接
+        self._pending = 0  # 已占用名额、正在建立的连接数
+        self._closed = False
+        self._waiting = 0
+        self._metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "connections_created": 0,
+            "connections_discarded": 0
+        }
+
+        for _ in range(minconn):
+            conn = self._new_connection()
+            self._idle.append((conn, self._created_at[id(conn)]))
+
+    def _new_connection(self):
+        conn = self._connect(self.dsn)
+        self._created_at[id(conn)] = time.monotonic()
+        self._metrics["connections_created"] += 1
+        return conn
+
+    def _expired(self, created_at):
+        return self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+
+    def _discard(self, conn):
+        """关闭连接并释放它占用的名额，调用方需持有锁"""
+        self._created_at.pop(id(conn), None)
+        self._metrics["connections_discarded"] += 1
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"关闭数据库连接失败: {str(e)}")
+        self._condition.notify()
+
+    def _is_usable(self, conn):
+        if conn.closed:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"数据库连接校验失败，重新建立连接: {str(e)}")
+            return False
+
+    def getconn(self, timeout=None):
+        """借出一个可用连接；超时抛出 PoolTimeout，建立连接失败时抛出驱动的异常"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._condition:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("连接池已关闭")
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    if conn.closed or self._expired(created_at):
+                        self._discard(conn)
+                        continue
+                    break
+                if len(self._created_at) + self._pending < self.maxconn:
+                    # 先占住名额，在锁外建立连接
+                    conn = None
+                    self._pending += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeout(f"等待数据库连接超时（{timeout} 秒，连接池已满 {self.maxconn}）")
+                waited = True
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            wait_time = time.monotonic() - started
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_time_total"] += wait_time
+            self._metrics["wait_time_max"] = max(self._metrics["wait_time_max"], wait_time)
+            if waited:
+                self._metrics["waits"] += 1
+
+        if conn is None:
+            try:
+                conn = self._connect(self.dsn)
+            except Exception:
+                with self._condition:
+                    self._pending -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._pending -= 1
+                self._created_at[id(conn)] = time.monotonic()
+                self._metrics["connections_created"] += 1
+            return conn
+
+        if self._is_usable(conn):
+            return conn
+
+        # 连接已失效，丢弃后在原名额上重新建立
+        with self._condition:
+            self._discard(conn)
+        return self.getconn(max(deadline - time.monotonic(), 0))
+
+    def putconn(self, conn):
+        """归还连接；未结束的事务会被回滚，无法回滚或已过期的连接直接关闭"""
+        import psycopg2.extensions
+
+        healthy = not conn.closed
+        if healthy and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.warning(f"回滚未完成的事务失败，丢弃连接: {str(e)}")
+                healthy = False
+
+        with self._condition:
+            created_at = self._created_at.get(id(conn))
+            if created_at is None:
+                # 不属于本连接池（例如关闭后归还）
+                conn.close()
+                return
+            if not healthy or self._closed or self._expired(created_at):
+                self._discard(conn)
+                return
+            self._idle.append((conn, created_at))
+            self._condition.notify()
+
+    def closeall(self):
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._condition.notify_all()
+
+    def stats(self):
+        """连接池状态与等待指标"""
+        with self._condition:
+            size = len(self._created_at) + self._pending
+            in_use = size - len(self._idle)
+            checkouts = self._metrics["checkouts"]
+            return {
+                "size": size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "max": self.maxconn,
+                "waiting": self._waiting,
+                "saturation": round(in_use / self.maxconn, 4) if self.maxconn else 0,
+                "checkouts": checkouts,
+                "waits": self._metrics["waits"],
+                "timeouts": self._metrics["timeouts"],
+                "wait_time_avg_ms": round(self._metrics["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0,
+                "wait_time_max_ms": round(self._metrics["wait_time_max"] * 1000, 3),
+                "connections_created": self._metrics["connections_created"],
+                "connections_discarded": self._metrics["connections_discarded"]
+            }
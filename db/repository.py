@@ -0,0 +1,152 @@
+"""
+存储后端接口模块
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# 两张明细表的字段
+LEDGER_COLUMNS = {
+    'volunteer_points': ['id', 'activity_type', 'activity_time_name', 'category', 'name', 'score', 'created_at'],
+    'volunteer_usage': ['id', 'name', 'used_points', 'course_count', 'created_at']
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_THREAD_PREFIX = 'repository-query'
+
+def run_concurrently(*calls):
+    """并行执行互不依赖的查询（无参函数），按顺序返回结果，任一查询失败时抛出其异常
+
+    查询大多在等待网络或数据库，放到共享线程池中执行可以让总耗时接近最慢的一个。
+    已在线程池中的调用直接顺序执行，避免线程池被占满时互相等待。
+    """
+    global _executor
+    if len(calls) < 2 or config.QUERY_CONCURRENCY < 2 \
+            or threading.current_thread().name.startswith(_THREAD_PREFIX):
+        return [call() for call in calls]
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.QUERY_CONCURRENCY,
+                                               thread_name_prefix=_THREAD_PREFIX)
+    # 每个查询在调用方上下文的副本中执行，请求级的状态（如 flask.g 中的指标）在线程中仍可访问
+    futures = [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    return [future.result() for future in futures]
+
+class Repository:
+    """存储后端接口，app.py 中的路由只通过该接口读写数据
+
+    汇总方法每位志愿者返回一行，字段与对应接口返回的JSON一致：
+    points_summary -> {name, total_score}
+    usage_summary -> {name, used_points, course_count}
+    complete_summary -> {name, total_score, used_points, course_count, remaining_score}
+    """
+
+    name = None
+
+    def insert(self, table, records):
+        """一次多行插入 records（字典列表），返回写入的行数，失败时抛出异常"""
+        raise NotImplementedError
+
+    def insert_rejected(self, error):
+        """insert() 抛出的 error 是否表示数据库明确拒绝了整批写入（没有任何行写入）
+
+        只有这种情况下才可以逐行重新写入；超时、连接中断等结果未知的错误返回False，
+        多行插入可能已经提交，重新发送会重复写入。
+        """
+        return isinstance(error, (ValueError, TypeError))
+
+    def points_summary(self):
+        raise NotImplementedError
+
+    def usage_summary(self):
+        raise NotImplementedError
+
+    def complete_summary(self):
+        """默认并行获取积分与使用汇总后在应用内合并，耗时与志愿者人数相关"""
+        points_rows, usage_rows = run_concurrently(self.points_summary, self.usage_summary)
+        points = {row['name']: row['total_score'] for row in points_rows}
+        usage = {row['name']: row for row in usage_rows}
+
+        result_list = []
+        for name in set(points) | set(usage):
+            total_score = points.get(name, 0)
+            used_points = usage.get(name, {}).get('used_points', 0)
+            course_count = usage.get(name, {}).get('course_count', 0)
+            result_list.append({
+                "name": name,
+                "total_score": total_score,
+                "used_points": used_points,
+                "course_count": course_count,
+                "remaining_score": total_score - used_points
+            })
+        return result_list
+
+    def volunteer_totals(self, name):
+        """单个志愿者的 {total_score, used_points, course_count}，没有任何记录时返回None"""
+        raise NotImplementedError
+
+    def list_rows(self, table, filters=None, created_from=None, created_to=None,
+                  cursor=None, order='asc', limit=100):
+        """按id键集分页读取明细记录
+
+        filters 为等值过滤条件，cursor 为上一页最后一条记录的id，
+        order 为 'asc' 或 'desc'。
+        """
+        raise NotImplementedError
+
+    def iter_rows(self, table, page_size=1000):
+        """按id升序分页读取整张表，逐行产出记录"""
+        cursor = None
+        while True:
+            rows = self.list_rows(table, cursor=cursor, limit=page_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            cursor = rows[-1]['id']
+
+    def data_version(self):
+        """数据版本字符串，插入或删除记录后会改变"""
+        raise NotImplementedError
+
+    def rebuild_balance(self, apply=True):
+        """根据明细重建积分余额表，返回存在漂移的志愿者"""
+        raise NotImplementedError(f"{self.name} 后端没有积分余额表")
+
+    def backfill_volunteers(self, batch_size=5000):
+        """为已有记录分批回填 volunteer_id，返回每张表本次更新与剩余的行数"""
+        raise NotImplementedError(f"{self.name} 后端没有志愿者维表")
+
+    def health_check(self):
+        return True, f"{self.name} 存储正常"
+
+    def pool_stats(self):
+        """连接池指标，没有连接池的后端返回None"""
+        return None
+
+    def upstream_latency(self):
+        """按端点统计的上游请求耗时，不经过HTTP的后端返回None"""
+        return None
+
+def get_repository(mode=None):
+    """按 DB_MODE 创建存储后端，各后端的依赖只在选用时导入"""
+    mode = mode or config.DB_MODE
+    if mode == 'supabase':
+        from db.supabase_repository import SupabaseRepository
+        return SupabaseRepository(config.SUPABASE_URL, config.SUPABASE_KEY)
+    if mode == 'postgres':
+        from db.sql_repository import PostgresRepository
+        return PostgresRepository()
+    if mode == 'sqlite':
+        from db.sql_repository import SQLiteRepository
+        return SQLiteRepository()
+    if mode == 'memory':
+        from db.memory_repository import MemoryRepository
+        return MemoryRepository()
+    raise ValueError(f"未知的数据库模式: {mode}")
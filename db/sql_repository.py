@@ -0,0 +1,263 @@
+"""
+SQL存储后端模块（PostgreSQL / SQLite）
+"""
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from db.connection import get_db_connection, pool_stats
+from db.operations import init_db
+from db.repository import Repository, LEDGER_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# 函数或表未部署时PostgreSQL的错误码（undefined_function、undefined_table）
+MISSING_OBJECT_PGCODES = ('42883', '42P01')
+
+POINTS_SUMMARY_SQL = '''
+    SELECT name, SUM(CAST(score AS INTEGER)) AS total_score
+    FROM volunteer_points
+    GROUP BY name
+    ORDER BY name
+'''
+
+USAGE_SUMMARY_SQL = '''
+    SELECT name, SUM(used_points) AS used_points, SUM(course_count) AS course_count
+    FROM volunteer_usage
+    GROUP BY name
+    ORDER BY name
+'''
+
+# 用 UNION ALL 代替 FULL OUTER JOIN，兼容较旧的SQLite
+COMPLETE_SUMMARY_SQL = '''
+    SELECT name,
+           SUM(total_score) AS total_score,
+           SUM(used_points) AS used_points,
+           SUM(course_count) AS course_count,
+           SUM(total_score) - SUM(used_points) AS remaining_score
+    FROM (
+        SELECT name, CAST(score AS INTEGER) AS total_score, 0 AS used_points, 0 AS course_count
+        FROM volunteer_points
+        UNION ALL
+        SELECT name, 0, used_points, course_count
+        FROM volunteer_usage
+    ) ledger
+    GROUP BY name
+    ORDER BY name
+'''
+
+def _fetch_dicts(cursor):
+    """将查询结果转换为字典列表，时间统一为ISO格式字符串（与Supabase返回一致）"""
+    columns = [column[0] for column in cursor.description]
+    return [
+        {column: value.isoformat() if isinstance(value, datetime) else value
+         for column, value in zip(columns, row)}
+        for row in cursor.fetchall()
+    ]
+
+class SQLRepository(Repository):
+    """直接执行SQL的存储后端，连接由 db.connection.get_db_connection() 提供
+
+    子类通过 placeholder 指定参数占位符。
+    """
+
+    placeholder = '?'
+
+    def __init__(self):
+        init_db()
+
+    def _query(self, sql, params=()):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = _fetch_dicts(cursor)
+            conn.commit()
+            return rows
+
+    def _insert_sql(self, table, columns):
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join([self.placeholder] * len(columns))})"
+        )
+
+    def insert(self, table, records):
+        if not records:
+            return 0
+        columns = [column for column in LEDGER_COLUMNS[table] if column in records[0]]
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self._insert_sql(table, columns),
+                               [[record[column] for column in columns] for record in records])
+            conn.commit()
+        return len(records)
+
+    def points_summary(self):
+        return self._query(POINTS_SUMMARY_SQL)
+
+    def usage_summary(self):
+        return self._query(USAGE_SUMMARY_SQL)
+
+    def complete_summary(self):
+        return self._query(COMPLETE_SUMMARY_SQL)
+
+    def volunteer_totals(self, name):
+        """按姓名过滤两张明细表后求和，走 idx_volunteer_points_name / idx_volunteer_usage_name 索引"""
+        p = self.placeholder
+        points = self._query(
+            f"SELECT COUNT(*) AS row_count, SUM(CAST(score AS INTEGER)) AS total_score "
+            f"FROM volunteer_points WHERE name = {p}", (name,))[0]
+        usage = self._query(
+            f"SELECT COUNT(*) AS row_count, SUM(used_points) AS used_points, SUM(course_count) AS course_count "
+            f"FROM volunteer_usage WHERE name = {p}", (name,))[0]
+        if not points['row_count'] and not usage['row_count']:
+            return None
+        return {
+            "total_score": points['total_score'] or 0,
+            "used_points": usage['used_points'] or 0,
+            "course_count": usage['course_count'] or 0
+        }
+
+    def list_rows(self, table, filters=None, created_from=None, created_to=None,
+                  cursor=None, order='asc', limit=100):
+        columns = LEDGER_COLUMNS[table]
+        p = self.placeholder
+        conditions = []
+        params = []
+        for key, value in (filters or {}).items():
+            if key not in columns:
+                raise ValueError(f"未知的过滤字段: {key}")
+            conditions.append(f"{key} = {p}")
+            params.append(value)
+        if created_from:
+            conditions.append(f"created_at >= {p}")
+            params.append(created_from)
+        if created_to:
+            conditions.append(f"created_at <= {p}")
+            params.append(created_to)
+        if cursor is not None:
+            conditions.append(f"id > {p}" if order == 'asc' else f"id < {p}")
+            params.append(cursor)
+
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY id {'DESC' if order == 'desc' else 'ASC'} LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def data_version(self):
+        parts = []
+        for table in ('volunteer_points', 'volunteer_usage'):
+            row = self._query(f"SELECT COALESCE(MAX(id), 0) AS max_id, COUNT(*) AS row_count FROM {table}")[0]
+            parts.append(f"{table}:{row['max_id']}:{row['row_count']}")
+        return '|'.join(parts)
+
+    def health_check(self):
+        try:
+            self._query("SELECT 1 AS ok")
+            return True, f"{self.name} 数据库连接正常"
+        except Exception as e:
+            return False, f"数据库连接异常: {str(e)}"
+
+class PostgresRepository(SQLRepository):
+    """通过 psycopg2 连接池直连PostgreSQL，绕过 PostgREST 的HTTP开销
+
+    若数据库中部署了 supabase/migrations 中的汇总函数和积分余额表则优先使用，
+    否则直接执行 GROUP BY 查询。
+    """
+
+    name = 'postgres'
+    placeholder = '%s'
+
+    def insert_rejected(self, error):
+        """约束冲突、数据格式错误或SQL错误时整条 INSERT 已回滚"""
+        import psycopg2
+        return isinstance(error, (psycopg2.IntegrityError, psycopg2.DataError, psycopg2.ProgrammingError))
+
+    def _query_with_fallback(self, sql, fallback_sql, params=()):
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+            except Exception as e:
+                # 只在汇总函数或余额表未部署时改用备用查询，超时等错误直接抛出
+                if getattr(e, 'pgcode', None) not in MISSING_OBJECT_PGCODES:
+                    raise
+                logger.warning(f"汇总函数未部署，改用备用查询: {str(e)}")
+                conn.rollback()
+                cursor = conn.cursor()
+                cursor.execute(fallback_sql, params)
+            rows = _fetch_dicts(cursor)
+            conn.commit()
+            return rows
+
+    def insert(self, table, records):
+        if not records:
+            return 0
+        from psycopg2.extras import execute_values
+
+        columns = [column for column in LEDGER_COLUMNS[table] if column in records[0]]
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # 一条多行 INSERT 语句写入整个分块
+            execute_values(
+                cursor,
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+                [[record[column] for column in columns] for record in records],
+                page_size=len(records)
+            )
+            conn.commit()
+        return len(records)
+
+    def points_summary(self):
+        return self._query_with_fallback("SELECT * FROM get_volunteer_summary()", POINTS_SUMMARY_SQL)
+
+    def usage_summary(self):
+        return self._query_with_fallback("SELECT * FROM get_usage_summary()", USAGE_SUMMARY_SQL)
+
+    def complete_summary(self):
+        return self._query_with_fallback("SELECT * FROM get_complete_summary()", COMPLETE_SUMMARY_SQL)
+
+    def volunteer_totals(self, name):
+        """优先读取 volunteer_balance 中的一行"""
+        try:
+            rows = self._query(
+                "SELECT total_score, used_points, course_count, activity_count, usage_count "
+                "FROM volunteer_balance WHERE name = %s", (name,))
+        except Exception as e:
+            if getattr(e, 'pgcode', None) not in MISSING_OBJECT_PGCODES:
+                raise
+            logger.warning(f"积分余额表不存在，改为按姓名汇总明细: {str(e)}")
+            return super().volunteer_totals(name)
+        if not rows or (not rows[0]['activity_count'] and not rows[0]['usage_count']):
+            return None
+        row = rows[0]
+        return {
+            "total_score": row['total_score'],
+            "used_points": row['used_points'],
+            "course_count": row['course_count']
+        }
+
+    def rebuild_balance(self, apply=True):
+        return self._query("SELECT * FROM rebuild_volunteer_balance(%s)", (apply,))
+
+    def backfill_volunteers(self, batch_size=5000):
+        return self._query("SELECT * FROM backfill_volunteer_ids(%s)", (batch_size,))
+
+    def pool_stats(self):
+        return pool_stats()
+
+class SQLiteRepository(SQLRepository):
+    """本地SQLite文件存储"""
+
+    name = 'sqlite'
+    placeholder = '?'
+
+    def insert_rejected(self, error):
+        """约束冲突或参数错误时事务已回滚"""
+        return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError,
+                                  sqlite3.ProgrammingError))
+
+    def insert(self, table, records):
+        # 旧版表的 created_at 没有默认值，统一在写入时填入
+        created_at = datetime.now(timezone.utc).isoformat()
+        return super().insert(table, [dict(record, created_at=record.get('created_at') or created_at)
+                                      for record in records])
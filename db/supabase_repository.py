@@ -0,0 +1,236 @@
+"""
+Supabase存储后端模块
+"""
+import logging
+import threading
+from config import config
+from db.repository import Repository, LEDGER_COLUMNS, run_concurrently
+
+logger = logging.getLogger(__name__)
+
+# 数据库对象未部署时 PostgREST 返回的错误码：找不到函数、找不到表
+MISSING_FUNCTION_CODES = ('PGRST202', '42883')
+MISSING_TABLE_CODES = ('PGRST205', '42P01')
+
+def _is_missing(error, codes):
+    """error 是否表示数据库中没有对应的函数或表；超时、连接错误等返回False"""
+    from postgrest.exceptions import APIError
+
+    return isinstance(error, APIError) and error.code in codes
+
+class SupabaseRepository(Repository):
+    """通过 Supabase (PostgREST) 访问数据
+
+    汇总通过 RPC 调用数据库中的汇总函数，函数未部署（PGRST202）时才回退到应用内汇总。
+    客户端在第一次访问数据时才创建，导入应用时不加载 supabase 包，缩短冷启动时间。
+    """
+
+    name = 'supabase'
+
+    def __init__(self, url, key, client=None):
+        if client is None and (not url or not key):
+            raise ValueError("Supabase环境变量未设置")
+        self.url = url
+        self.key = key
+        self.latency = None
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client(self.url, self.key)
+                    logger.info("Supabase客户端初始化成功")
+        return self._client
+
+    def _create_client(self, url, key):
+        """创建Supabase客户端，PostgREST请求经由共享的 httpx 客户端发出"""
+        from supabase import create_client
+        from db.http_transport import create_http_client, LatencyStats
+
+        self.latency = LatencyStats()
+        http_client = create_http_client(
+            timeout=config.SUPABASE_TIMEOUT,
+            connect_timeout=config.SUPABASE_CONNECT_TIMEOUT,
+            max_connections=config.SUPABASE_MAX_CONNECTIONS,
+            max_keepalive=config.SUPABASE_MAX_KEEPALIVE,
+            keepalive_expiry=config.SUPABASE_KEEPALIVE_EXPIRY,
+            http2=config.SUPABASE_HTTP2,
+            max_retries=config.SUPABASE_MAX_RETRIES,
+            backoff=config.SUPABASE_RETRY_BACKOFF,
+            stats=self.latency
+        )
+        try:
+            from supabase import ClientOptions
+            options = ClientOptions(httpx_client=http_client)
+        except (ImportError, TypeError):
+            # 旧版 supabase 不支持传入 httpx 客户端
+            logger.warning("当前 supabase 版本不支持自定义HTTP客户端，使用默认传输层")
+            http_client.close()
+            self.latency = None
+            return create_client(url, key)
+        return create_client(url, key, options=options)
+
+    def insert(self, table, records):
+        result = self.client.table(table).insert(records).execute()
+        return len(result.data or [])
+
+    def insert_rejected(self, error):
+        """PostgREST 返回了数据库或请求错误（整个请求在一个事务中，已回滚）
+
+        错误码为 SQLSTATE（例如 23505、22P02）或 PGRST 开头时数据库明确拒绝了写入；
+        响应不是JSON时错误码为HTTP状态码，只有4xx（408除外）是明确的拒绝，网关超时等
+        5xx 以及超时、连接中断等传输错误的结果未知。
+        """
+        from postgrest.exceptions import APIError
+
+        if not isinstance(error, APIError):
+            return False
+        if isinstance(error.code, int):
+            return 400 <= error.code < 500 and error.code != 408
+        return bool(error.code)
+
+    def _aggregate(self, function_name, fallback):
+        """调用数据库端的汇总函数（每位志愿者一行），函数未部署时回退到应用内汇总
+
+        其它错误（超时、连接中断等）直接抛出：数据库繁忙时改为拉取全部明细只会加重负载。
+        """
+        try:
+            result = self.client.rpc(function_name).execute()
+            return result.data or []
+        except Exception as e:
+            if not _is_missing(e, MISSING_FUNCTION_CODES):
+                raise
+            logger.warning(f"数据库汇总函数 {function_name} 未部署，改为应用内汇总: {str(e)}")
+            return fallback()
+
+    def _sum_points_in_app(self):
+        """应用内汇总积分（旧方式，需拉取全部积分记录）"""
+        result = self.client.table('volunteer_points').select('name, score').execute()
+        logger.info(f"从Supabase获取到 {len(result.data)} 条记录")
+
+        summary = {}
+        for record in result.data:
+            name = record['name']
+            score = int(record['score']) if record['score'] is not None else 0
+            summary[name] = summary.get(name, 0) + score
+
+        return [{"name": name, "total_score": score} for name, score in summary.items()]
+
+    def _sum_usage_in_app(self):
+        """应用内汇总积分使用情况（旧方式，需拉取全部使用记录）"""
+        result = self.client.table('volunteer_usage').select('name, used_points, course_count').execute()
+        logger.info(f"从Supabase获取到 {len(result.data)} 条使用记录")
+
+        usage_summary = {}
+        for record in result.data:
+            name = record['name']
+            used_points = int(record['used_points']) if record['used_points'] is not None else 0
+            course_count = int(record['course_count']) if record['course_count'] is not None else 0
+
+            if name in usage_summary:
+                usage_summary[name]['used_points'] += used_points
+                usage_summary[name]['course_count'] += course_count
+            else:
+                usage_summary[name] = {
+                    'used_points': used_points,
+                    'course_count': course_count
+                }
+
+        return [
+            {
+                "name": name,
+                "used_points": data['used_points'],
+                "course_count": data['course_count']
+            }
+            for name, data in usage_summary.items()
+        ]
+
+    def points_summary(self):
+        return self._aggregate('get_volunteer_summary', self._sum_points_in_app)
+
+    def usage_summary(self):
+        return self._aggregate('get_usage_summary', self._sum_usage_in_app)
+
+    def complete_summary(self):
+        return self._aggregate('get_complete_summary', super().complete_summary)
+
+    def volunteer_totals(self, name):
+        """优先读取 volunteer_balance 中的一行；余额表不可用时按姓名过滤两张明细表后求和"""
+        try:
+            result = self.client.table('volunteer_balance') \
+                .select('total_score, used_points, course_count, activity_count, usage_count') \
+                .eq('name', name).limit(1).execute()
+            if not result.data:
+                return None
+            row = result.data[0]
+            if not row['activity_count'] and not row['usage_count']:
+                return None
+            return {
+                "total_score": row['total_score'],
+                "used_points": row['used_points'],
+                "course_count": row['course_count']
+            }
+        except Exception as e:
+            if not _is_missing(e, MISSING_TABLE_CODES):
+                raise
+            logger.warning(f"积分余额表不存在，改为按姓名汇总明细: {str(e)}")
+
+        points, usage = run_concurrently(
+            lambda: self.client.table('volunteer_points').select('score').eq('name', name).execute().data or [],
+            lambda: self.client.table('volunteer_usage').select('used_points, course_count').eq('name', name).execute().data or []
+        )
+        if not points and not usage:
+            return None
+        return {
+            "total_score": sum(int(row['score']) for row in points if row['score'] is not None),
+            "used_points": sum(row['used_points'] or 0 for row in usage),
+            "course_count": sum(row['course_count'] or 0 for row in usage)
+        }
+
+    def list_rows(self, table, filters=None, created_from=None, created_to=None,
+                  cursor=None, order='asc', limit=100):
+        query = self.client.table(table).select(', '.join(LEDGER_COLUMNS[table]))
+        for key, value in (filters or {}).items():
+            query = query.eq(key, value)
+        if created_from:
+            query = query.gte('created_at', created_from)
+        if created_to:
+            query = query.lte('created_at', created_to)
+        if cursor is not None:
+            query = query.gt('id', cursor) if order == 'asc' else query.lt('id', cursor)
+
+        result = query.order('id', desc=(order == 'desc')).limit(limit).execute()
+        return result.data or []
+
+    def _table_version(self, table):
+        result = self.client.table(table).select('id', count='exact').order('id', desc=True).limit(1).execute()
+        max_id = result.data[0]['id'] if result.data else 0
+        return f"{table}:{max_id}:{result.count or 0}"
+
+    def data_version(self):
+        # 两张表的查询互不依赖，并行发出
+        return '|'.join(run_concurrently(
+            lambda: self._table_version('volunteer_points'),
+            lambda: self._table_version('volunteer_usage')
+        ))
+
+    def rebuild_balance(self, apply=True):
+        result = self.client.rpc('rebuild_volunteer_balance', {'apply': apply}).execute()
+        return result.data or []
+
+    def backfill_volunteers(self, batch_size=5000):
+        result = self.client.rpc('backfill_volunteer_ids', {'batch_size': batch_size}).execute()
+        return result.data or []
+
+    def upstream_latency(self):
+        return self.latency.snapshot() if self.latency else None
+
+    def health_check(self):
+        try:
+            self.client.table('volunteer_points').select('id').limit(1).execute()
+            return True, "Supabase连接正常"
+        except Exception as e:
+            return False, f"Supabase连接异常: {str(e)}"
@@ -0,0 +1,106 @@
+"""
+数据导出模块
+"""
+import csv
+import io
+import itertools
+import tempfile
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+# 支持的导出格式
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+# 活动总览表的字段与中文表头
+ACTIVITY_COLUMNS = [
+    ('activity_type', '活动类型'),
+    ('activity_time_name', '活动时间与名称'),
+    ('category', '类别'),
+    ('name', '姓名'),
+    ('score', '积分')
+]
+
+# 志愿者积分总表的字段与中文表头
+SUMMARY_COLUMNS = [
+    ('name', '姓名'),
+    ('total_score', '总积分')
+]
+
+def write_xlsx(sheet_title, columns, records):
+    """用 openpyxl 的只写工作簿逐行写入 Excel
+
+    records 可以是任意可迭代对象（例如分页读取数据库的生成器），写入过程中
+    不会在内存中保留全部记录。返回已定位到开头的临时文件。
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append([header for _, header in columns])
+    for record in records:
+        sheet.append([record.get(field) for field, _ in columns])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def iter_csv(columns, records, chunk_rows=500):
+    """逐块生成CSV文本，可直接作为Flask的流式响应体
+
+    首块带UTF-8 BOM，便于Excel正确识别中文表头。
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in columns])
+
+    pending = 0
+    for record in records:
+        writer.writerow([record.get(field) for field, _ in columns])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+def write_parquet(columns, records, integer_fields=(), batch_rows=1000):
+    """按列写入Parquet，每 batch_rows 条记录写成一个行组
+
+    integer_fields 中的字段写为 int64，其余字段写为字符串。返回已定位到开头的
+    临时文件；未安装 pyarrow 时抛出 ImportError。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (header, pa.int64() if field in integer_fields else pa.string())
+        for field, header in columns
+    ])
+
+    def convert(field, value):
+        if value is None:
+            return None
+        if field in integer_fields:
+            return int(value)
+        return str(value)
+
+    output = tempfile.TemporaryFile()
+    with pq.ParquetWriter(output, schema) as writer:
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, batch_rows))
+            if not batch:
+                break
+            arrays = [
+                pa.array([convert(field, record.get(field)) for record in batch], type=schema.field(header).type)
+                for field, header in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    output.seek(0)
+    return output
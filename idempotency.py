@@ -0,0 +1,103 @@
+"""
+提交请求幂等键模块
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class IdempotencyStore:
+    """记录已处理的幂等键及其响应，重复请求直接返回保存的响应而不再写入数据
+
+    每个键在 ttl 秒后过期，键数达到 max_keys 时淘汰最早的已完成的键；正在处理的
+    键不会被淘汰（否则同一个键的重试会再次写入），全部键都在处理中时拒绝新的键。
+    同一个键的请求正在
+    处理时，后到的请求最多等待 wait_timeout 秒取前一个请求的结果。同一个键对应
+    不同的请求内容时视为客户端错误。
+    """
+
+    def __init__(self, ttl=86400, max_keys=10000, wait_timeout=10):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait_timeout = wait_timeout
+        self.replays = 0
+        self._entries = OrderedDict()  # 键 -> {fingerprint, expires_at, done, response}
+        self._lock = threading.Lock()
+
+    def _purge(self, reserve=0):
+        """删除过期的键，键数超过 max_keys - reserve 时删除最早的已完成的键
+
+        返回键数是否已在上限以内。
+        """
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry['expires_at'] > now:
+                break
+            del self._entries[key]
+        excess = len(self._entries) + reserve - self.max_keys
+        if excess > 0:
+            finished = []
+            for key, entry in self._entries.items():
+                if entry['done'].is_set():
+                    finished.append(key)
+                    if len(finished) == excess:
+                        break
+            for key in finished:
+                del self._entries[key]
+        return len(self._entries) + reserve <= self.max_keys
+
+    def begin(self, key, fingerprint):
+        """开始处理一个请求，返回 (状态, 保存的响应)
+
+        状态为 'new'（首次出现，处理完成后调用 complete 或 abort）、'replay'
+        （返回保存的 (body, status)）、'mismatch'（键已用于不同的请求内容）、
+        'in_progress'（前一个请求仍未完成）或 'full'（键数已满且都在处理中）。
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry['expires_at'] <= time.monotonic():
+                    self._entries.pop(key, None)
+                    if not self._purge(reserve=1):
+                        return 'full', None
+                    self._entries[key] = {
+                        'fingerprint': fingerprint,
+                        'expires_at': time.monotonic() + self.ttl,
+                        'done': threading.Event(),
+                        'response': None
+                    }
+                    return 'new', None
+                if entry['fingerprint'] != fingerprint:
+                    return 'mismatch', None
+                if entry['done'].is_set():
+                    self.replays += 1
+                    return 'replay', entry['response']
+                done = entry['done']
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not done.wait(remaining):
+                return 'in_progress', None
+
+    def complete(self, key, body, status):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['response'] = (body, status)
+                entry['done'].set()
+
+    def abort(self, key):
+        """处理失败且未写入数据时删除键，允许客户端用同一个键重试"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry['done'].set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._entries),
+                "replays": self.replays,
+                "ttl": self.ttl,
+                "max_keys": self.max_keys
+            }
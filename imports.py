@@ -0,0 +1,114 @@
+"""
+数据导入模块
+"""
+import csv
+import io
+import itertools
+from exports import ACTIVITY_COLUMNS
+
+# 各活动类型可选的类别，与页面中的下拉选项一致
+ACTIVITY_CATEGORIES = {
+    '线下活动': ['海报', '宣发', '签到', '写稿', '场务'],
+    '线上直播': ['海报', '宣发', '直播助手', '写稿', '视频剪辑']
+}
+
+# 支持的导入格式
+IMPORT_FORMATS = ('xlsx', 'csv')
+
+def iter_csv_rows(stream, encoding='utf-8-sig'):
+    """逐行读取CSV文件（默认兼容带BOM的UTF-8），产出单元格列表"""
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        for row in csv.reader(text):
+            yield row
+    finally:
+        text.detach()
+
+def iter_xlsx_rows(stream):
+    """以只读模式逐行读取Excel第一个工作表，不把整个工作簿载入内存"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _parse_score(value):
+    """积分必须为非负整数，Excel中的 5.0 视为 5"""
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        if float(value).is_integer() and value >= 0:
+            return int(value)
+        raise ValueError
+    text = _cell_text(value)
+    if not text.isdigit():
+        raise ValueError
+    return int(text)
+
+def parse_activity_rows(rows):
+    """校验活动总览表格式的数据行
+
+    第一行为表头，列名与导出的活动总览表一致（顺序不限）。逐行产出
+    (行号, 记录, 错误列表)，有错误时记录为None；空行跳过。表头缺少列时抛出
+    ValueError。
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("文件为空")
+    positions = {_cell_text(cell): index for index, cell in enumerate(header)}
+    missing = [title for _, title in ACTIVITY_COLUMNS if title not in positions]
+    if missing:
+        raise ValueError(f"表头缺少列: {', '.join(missing)}")
+
+    for line, row in enumerate(rows, start=2):
+        values = {
+            field: row[positions[title]] if positions[title] < len(row) else None
+            for field, title in ACTIVITY_COLUMNS
+        }
+        if all(_cell_text(value) == '' for value in values.values()):
+            continue
+
+        errors = []
+        activity_type = _cell_text(values['activity_type'])
+        category = _cell_text(values['category'])
+        record = {
+            'activity_type': activity_type,
+            'activity_time_name': _cell_text(values['activity_time_name']),
+            'category': category,
+            'name': _cell_text(values['name']),
+            'score': None
+        }
+        if activity_type not in ACTIVITY_CATEGORIES:
+            errors.append(f"活动类型必须为 {' / '.join(ACTIVITY_CATEGORIES)}: {activity_type or '(空)'}")
+        elif category not in ACTIVITY_CATEGORIES[activity_type]:
+            errors.append(f"{activity_type}的类别必须为 {' / '.join(ACTIVITY_CATEGORIES[activity_type])}: {category or '(空)'}")
+        if not record['activity_time_name']:
+            errors.append("活动时间与名称不能为空")
+        if not record['name']:
+            errors.append("姓名不能为空")
+        try:
+            record['score'] = _parse_score(values['score'])
+        except ValueError:
+            errors.append(f"积分必须为非负整数: {_cell_text(values['score']) or '(空)'}")
+
+        yield line, (None if errors else record), errors
+
+def iter_chunks(items, size):
+    """把可迭代对象按 size 个一组切分"""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,156 @@
+"""
+日志配置模块 - 按 LOG_LEVEL 输出带请求编号的结构化（JSON）日志
+
+请求线程只把日志记录放入队列（QueueHandler），格式化和写出由后台线程
+（QueueListener）完成，慢速的标准输出或日志收集不会阻塞请求。
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+# 当前请求的编号，由 app.py 在请求开始时设置；并行查询的线程通过复制的上下文继承
+_request_id = contextvars.ContextVar('request_id', default='-')
+
+# LogRecord 自带的属性，其余属性（extra=）作为结构化字段输出
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+
+_listener = None
+
+def set_request_id(request_id):
+    """设置当前上下文的请求编号，返回用于 reset_request_id 的令牌"""
+    return _request_id.set(request_id)
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+def get_request_id():
+    return _request_id.get()
+
+def summarize(value, max_items=3, max_chars=200):
+    """把较大的数据缩减为可写入日志的摘要
+
+    列表只保留总数和前 max_items 项，字典最多保留 max_items * 4 个键，字符串超过
+    max_chars 时截断并注明原长度，嵌套结构逐层缩减。
+    """
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}...(共{len(value)}字符)"
+    if isinstance(value, (list, tuple)):
+        if len(value) <= max_items:
+            return [summarize(item, max_items, max_chars) for item in value]
+        return {
+            "count": len(value),
+            "sample": [summarize(item, max_items, max_chars) for item in value[:max_items]]
+        }
+    if isinstance(value, dict):
+        keys = list(value)[:max_items * 4]
+        summary = {str(key): summarize(value[key], max_items, max_chars) for key in keys}
+        if len(value) > len(keys):
+            summary["..."] = f"共{len(value)}个键"
+        return summary
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return summarize(str(value), max_items, max_chars)
+
+class RequestIdQueueHandler(logging.handlers.QueueHandler):
+    """在请求线程中只固定消息内容和请求编号，格式化留给后台线程"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # 参数可能在放入队列后被修改，先合并进消息
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = get_request_id()
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，extra= 传入的字段经 summarize() 缩减后一并输出"""
+
+    def __init__(self, max_message_chars=2000):
+        super().__init__()
+        self.max_message_chars = max_message_chars
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "message": summarize(record.getMessage(), max_chars=self.max_message_chars)
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = summarize(value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """本地调试用的文本格式，过长的消息同样截断"""
+
+    def __init__(self, fmt, max_message_chars=2000):
+        super().__init__(fmt)
+        self.max_message_chars = max_message_chars
+
+    def formatMessage(self, record):
+        record.message = summarize(record.message, max_chars=self.max_message_chars)
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().formatMessage(record)
+
+def setup_logging(level, output='json', text_format=None, use_queue=True, max_message_chars=2000):
+    """配置根日志记录器，只在进程内生效一次
+
+    use_queue 为False时在调用线程中直接写出（无服务器部署中进程可能在后台线程
+    写出前被冻结）。
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    if any(getattr(handler, '_volunteer_logging', False) for handler in root.handlers):
+        return
+
+    if output == 'text':
+        formatter = TextFormatter(text_format or "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s",
+                                  max_message_chars)
+    else:
+        formatter = JsonFormatter(max_message_chars)
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        handler = RequestIdQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = stream_handler
+        handler.addFilter(_add_request_id)
+    handler._volunteer_logging = True
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+def _add_request_id(record):
+    record.request_id = get_request_id()
+    return True
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,333 @@
+"""
+请求耗时与数据库调用指标模块
+"""
+import contextvars
+import functools
+import threading
+import time
+
+# 秒，与 Prometheus 客户端默认的延迟分桶一致
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500, 1000)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# 计入数据库调用的存储后端方法
+REPOSITORY_METHODS = (
+    'insert', 'points_summary', 'usage_summary', 'complete_summary', 'volunteer_totals',
+    'list_rows', 'data_version', 'rebuild_balance', 'backfill_volunteers'
+)
+
+# 存储后端方法内部再调用其它方法时只记录最外层的一次
+_in_repository_call = contextvars.ContextVar('in_repository_call', default=False)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    """按标签分组累加的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+class Histogram:
+    """按标签分组的累积分桶直方图，记录观测值的分布、总和与次数"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # 标签值 -> [各分桶计数, 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def series(self):
+        """{标签值: (各分桶计数（非累积）, 总和, 次数)}"""
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def quantile(self, key, fraction):
+        """由分桶估计分位数，返回所在分桶的上界；落在最后一个分桶时返回最大的有限上界"""
+        counts, _, count = self.series().get(key, ([], 0.0, 0))
+        if not count:
+            return None
+        target = fraction * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound if bound != float('inf') else self.buckets[-2]
+        return self.buckets[-2]
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.series().items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', labels + (('le', _format_value(float(bound))),), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+class MetricsRegistry:
+    """指标集合，render() 输出 Prometheus 文本格式
+
+    除了直接记录的计数器和直方图，还可以通过 add_collector 注册在输出时读取的
+    指标（如缓存命中数、连接池状态），collector 返回
+    [(名称, 类型, 说明, [(标签元组, 值)])]。
+    """
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self.prefix + name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(self.prefix + name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                name = self.prefix + name
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+class RequestMetrics:
+    """单个请求内累计的数据库调用次数、耗时与行数（查询可能在多个线程中并行执行）"""
+
+    __slots__ = ('started', 'db_calls', 'db_seconds', 'rows_fetched', 'rows_returned', 'status', 'streaming',
+                 '_lock')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.rows_fetched = 0
+        self.rows_returned = 0
+        self.status = None
+        self.streaming = False  # 流式响应在发送完毕后才记录
+        self._lock = threading.Lock()
+
+    def add_db_call(self, seconds, rows):
+        with self._lock:
+            self.db_calls += 1
+            self.db_seconds += seconds
+            self.rows_fetched += rows
+
+    def add_rows_returned(self, rows):
+        with self._lock:
+            self.rows_returned += rows
+
+def _result_rows(result):
+    """存储后端方法返回的行数：列表按长度计，单行结果计1，写入的行数不计"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return 1
+    return 0
+
+class AppMetrics:
+    """应用的请求与数据库调用指标
+
+    current 为返回当前请求的 RequestMetrics（不在请求中时返回None）的函数，由
+    app.py 基于 flask.g 提供。
+    """
+
+    def __init__(self, current):
+        self.current = current
+        self.registry = MetricsRegistry(prefix='volunteer_')
+        self.request_duration = self.registry.histogram(
+            'http_request_duration_seconds', '按路由统计的请求耗时（流式响应包含发送时间）', ('route', 'method'))
+        self.requests = self.registry.counter(
+            'http_requests_total', '按路由与状态码统计的请求数', ('route', 'method', 'status'))
+        self.db_call_duration = self.registry.histogram(
+            'db_call_duration_seconds', '存储后端每次调用的耗时', ('backend', 'operation'))
+        self.db_call_errors = self.registry.counter(
+            'db_call_errors_total', '存储后端调用失败次数', ('backend', 'operation'))
+        self.request_db_calls = self.registry.histogram(
+            'request_db_calls', '每个请求的存储后端调用次数', ('route',), buckets=COUNT_BUCKETS)
+        self.request_db_seconds = self.registry.histogram(
+            'request_db_seconds', '每个请求中存储后端调用的累计耗时', ('route',))
+        self.rows_fetched = self.registry.counter(
+            'rows_fetched_total', '从存储后端读取的行数', ('route',))
+        self.rows_returned = self.registry.counter(
+            'rows_returned_total', '返回给客户端的行数', ('route',))
+        self.export_bytes = self.registry.histogram(
+            'export_bytes', '导出文件的字节数', ('route', 'format'), buckets=BYTE_BUCKETS)
+
+    def instrument_repository(self, repository):
+        """包装存储后端的数据访问方法，记录每次调用的耗时并计入当前请求"""
+        for method_name in REPOSITORY_METHODS:
+            method = getattr(repository, method_name, None)
+            if method is not None:
+                setattr(repository, method_name, self._timed_call(repository.name, method_name, method))
+        return repository
+
+    def _timed_call(self, backend, operation, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if _in_repository_call.get():
+                return method(*args, **kwargs)
+            token = _in_repository_call.set(True)
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                self.db_call_errors.inc(backend=backend, operation=operation)
+                raise
+            finally:
+                _in_repository_call.reset(token)
+                elapsed = time.perf_counter() - started
+                self.db_call_duration.observe(elapsed, backend=backend, operation=operation)
+            request_metrics = self.current()
+            if request_metrics is not None:
+                request_metrics.add_db_call(elapsed, _result_rows(result))
+            return result
+        return wrapper
+
+    def add_rows_returned(self, rows):
+        request_metrics = self.current()
+        if request_metrics is not None:
+            request_metrics.add_rows_returned(rows)
+
+    def count_rows(self, records):
+        """逐个产出 records，结束时计入返回行数，用于导出等流式返回的接口"""
+        request_metrics = self.current()
+        count = 0
+        try:
+            for record in records:
+                count += 1
+                yield record
+        finally:
+            if request_metrics is not None:
+                request_metrics.add_rows_returned(count)
+
+    def finish_request(self, request_metrics, route, method):
+        elapsed = time.perf_counter() - request_metrics.started
+        self.request_duration.observe(elapsed, route=route, method=method)
+        self.requests.inc(route=route, method=method, status=request_metrics.status or 500)
+        self.request_db_calls.observe(request_metrics.db_calls, route=route)
+        self.request_db_seconds.observe(request_metrics.db_seconds, route=route)
+        if request_metrics.rows_fetched:
+            self.rows_fetched.inc(request_metrics.rows_fetched, route=route)
+        if request_metrics.rows_returned:
+            self.rows_returned.inc(request_metrics.rows_returned, route=route)
+
+    def finish_after_stream(self, chunks, request_metrics, route, method, export_format=None):
+        """包装流式响应体：逐块产出内容（文本编码为UTF-8），发送完毕后记录请求指标与导出的字节数
+
+        调用后 request_metrics.streaming 为True，请求结束时不再重复记录。
+        """
+        request_metrics.streaming = True
+        return self._stream(chunks, request_metrics, route, method, export_format)
+
+    def _stream(self, chunks, request_metrics, route, method, export_format):
+        size = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                size += len(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            if export_format is not None:
+                self.export_bytes.observe(size, route=route, format=export_format)
+            self.finish_request(request_metrics, route, method)
+
+    def summary(self):
+        """/api/health 中的指标摘要：各路由的请求数与耗时、每个请求的数据库调用与行数"""
+        durations = self.request_duration.series()
+        db_calls = self.request_db_calls.series()
+        db_seconds = self.request_db_seconds.series()
+        fetched = self.rows_fetched.values()
+        returned = self.rows_returned.values()
+
+        routes = {}
+        for (route, method), (_, total, count) in sorted(durations.items()):
+            p95 = self.request_duration.quantile((route, method), 0.95)
+            calls = db_calls.get((route,), (None, 0, 0))
+            seconds = db_seconds.get((route,), (None, 0.0, 0))
+            routes[f'{method} {route}'] = {
+                "count": count,
+                "avg_ms": round(total / count * 1000, 3),
+                "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+                "db_calls_per_request": round(calls[1] / calls[2], 2) if calls[2] else 0,
+                "db_ms_per_request": round(seconds[1] / seconds[2] * 1000, 3) if seconds[2] else 0,
+                "rows_fetched": fetched.get((route,), 0),
+                "rows_returned": returned.get((route,), 0)
+            }
+        export_bytes = self.export_bytes.series()
+        return {
+            "requests": sum(route['count'] for route in routes.values()),
+            "routes": routes,
+            "export_bytes": sum(total for _, total, _ in export_bytes.values()),
+            "db_call_errors": sum(self.db_call_errors.values().values())
+        }
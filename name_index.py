@@ -0,0 +1,160 @@
+"""
+志愿者姓名检索模块
+"""
+import threading
+import time
+
+# pypinyin 加载拼音词典较慢，在第一次构建索引时才导入
+_pinyin = None
+
+def _load_pinyin():
+    """返回 (lazy_pinyin, Style)，未安装 pypinyin 时返回 (None, None)"""
+    global _pinyin
+    if _pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin, Style
+            _pinyin = (lazy_pinyin, Style)
+        except ImportError:
+            _pinyin = (None, None)
+    return _pinyin
+
+# 匹配类型及其排序优先级
+MATCH_RANKS = {'exact': 0, 'prefix': 1, 'pinyin': 2, 'fuzzy': 3}
+
+class _Trie:
+    """前缀树：键为检索用的字符串，节点上记录以该键结尾的姓名"""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key, name):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(None, set()).add(name)
+
+    def search_prefix(self, prefix, limit):
+        """返回键以 prefix 开头的姓名，键越短越靠前"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+
+        # 按层遍历，较短（更接近查询词）的键先返回
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                for char, child in current.items():
+                    if char is None:
+                        found.extend(sorted(child))
+                    else:
+                        next_level.append(child)
+            level = next_level
+        return found[:limit]
+
+def _bigrams(text):
+    padded = f'^{text}$'
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def _pinyin_keys(name):
+    """姓名的全拼与首字母，例如 张三 -> zhangsan, zs"""
+    lazy_pinyin, Style = _load_pinyin()
+    if lazy_pinyin is None:
+        return []
+    full = ''.join(lazy_pinyin(name)).lower()
+    initials = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return [key for key in {full, initials} if key and key != name.lower()]
+
+class NameIndex:
+    """志愿者姓名的内存索引
+
+    姓名和拼音分别建前缀树用于前缀匹配，另建二元组倒排表用于模糊匹配（例如
+    同音或错别字）。索引在首次检索时构建，超过 refresh_interval 秒后在下次
+    检索时重建；提交数据后调用 add_many() 增量加入新姓名。
+    """
+
+    def __init__(self, refresh_interval=300, fuzzy_threshold=0.3):
+        self.refresh_interval = refresh_interval
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._reset()
+
+    def _reset(self):
+        self._names = set()
+        self._name_trie = _Trie()
+        self._pinyin_trie = _Trie()
+        self._grams = {}
+
+    def _add(self, name):
+        if not name or name in self._names:
+            return
+        self._names.add(name)
+        self._name_trie.insert(name.lower(), name)
+        for key in _pinyin_keys(name):
+            self._pinyin_trie.insert(key, name)
+        for gram in _bigrams(name.lower()):
+            self._grams.setdefault(gram, set()).add(name)
+
+    def build(self, names):
+        """用给定的姓名重建索引"""
+        with self._lock:
+            self._reset()
+            for name in names:
+                self._add(name)
+            self._built_at = time.monotonic()
+
+    def add_many(self, names):
+        with self._lock:
+            for name in names:
+                self._add(name)
+
+    def ensure_built(self, loader):
+        """索引未构建或已过期时调用 loader() 获取全部姓名并重建"""
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.refresh_interval:
+                return
+            self.build(loader())
+
+    def __len__(self):
+        return len(self._names)
+
+    def search(self, query, limit=10):
+        """返回按匹配类型和相似度排序的结果: [{name, match, score}]"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        lowered = query.lower()
+
+        with self._lock:
+            matches = {}
+
+            def add(name, match, score):
+                current = matches.get(name)
+                if current is None or (MATCH_RANKS[match], -score) < (MATCH_RANKS[current[0]], -current[1]):
+                    matches[name] = (match, score)
+
+            for name in self._name_trie.search_prefix(lowered, limit):
+                add(name, 'exact' if name.lower() == lowered else 'prefix', 1.0)
+
+            if len(matches) < limit:
+                for name in self._pinyin_trie.search_prefix(lowered, limit):
+                    add(name, 'pinyin', 1.0)
+
+            if len(matches) < limit:
+                query_grams = _bigrams(lowered)
+                overlaps = {}
+                for gram in query_grams:
+                    for name in self._grams.get(gram, ()):
+                        overlaps[name] = overlaps.get(name, 0) + 1
+                for name, overlap in overlaps.items():
+                    # Dice 系数衡量二元组重合程度
+                    score = 2 * overlap / (len(query_grams) + len(_bigrams(name.lower())))
+                    if score >= self.fuzzy_threshold:
+                        add(name, 'fuzzy', round(score, 4))
+
+        ranked = sorted(matches.items(), key=lambda item: (MATCH_RANKS[item[1][0]], -item[1][1], len(item[0]), item[0]))
+        return [{"name": name, "match": match, "score": score} for name, (match, score) in ranked[:limit]]
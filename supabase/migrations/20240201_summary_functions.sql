@@ -0,0 +1,62 @@
+-- 在数据库端按姓名汇总积分与使用情况，每位志愿者只返回一行
+-- get_volunteer_summary() 已在 20240101_init.sql 中定义
+
+-- 创建获取积分使用汇总的存储过程
+CREATE OR REPLACE FUNCTION get_usage_summary()
+RETURNS TABLE (
+    name TEXT,
+    used_points BIGINT,
+    course_count BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_usage.name,
+        SUM(COALESCE(volunteer_usage.used_points, 0))::BIGINT as used_points,
+        SUM(COALESCE(volunteer_usage.course_count, 0))::BIGINT as course_count
+    FROM
+        volunteer_usage
+    GROUP BY
+        volunteer_usage.name
+    ORDER BY
+        volunteer_usage.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- 创建获取完整汇总（总积分、已使用积分、课程数、剩余积分）的存储过程
+CREATE OR REPLACE FUNCTION get_complete_summary()
+RETURNS TABLE (
+    name TEXT,
+    total_score BIGINT,
+    used_points BIGINT,
+    course_count BIGINT,
+    remaining_score BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH point_totals AS (
+        SELECT
+            vp.name AS volunteer_name,
+            SUM(CAST(vp.score AS INTEGER))::BIGINT AS points_total
+        FROM volunteer_points vp
+        GROUP BY vp.name
+    ),
+    usage_totals AS (
+        SELECT
+            vu.name AS volunteer_name,
+            SUM(COALESCE(vu.used_points, 0))::BIGINT AS usage_points,
+            SUM(COALESCE(vu.course_count, 0))::BIGINT AS usage_courses
+        FROM volunteer_usage vu
+        GROUP BY vu.name
+    )
+    SELECT
+        COALESCE(point_totals.volunteer_name, usage_totals.volunteer_name),
+        COALESCE(point_totals.points_total, 0),
+        COALESCE(usage_totals.usage_points, 0),
+        COALESCE(usage_totals.usage_courses, 0),
+        COALESCE(point_totals.points_total, 0) - COALESCE(usage_totals.usage_points, 0)
+    FROM point_totals
+    FULL OUTER JOIN usage_totals ON point_totals.volunteer_name = usage_totals.volunteer_name
+    ORDER BY 1;
+END;
+$$ LANGUAGE plpgsql STABLE;
@@ -0,0 +1,347 @@
+-- 每位志愿者的积分余额表，由触发器在写入积分/使用记录的同一事务内增量维护
+-- 汇总函数改为读取该表，每次查询只与志愿者人数相关，与历史记录条数无关
+
+-- 创建志愿者积分余额表
+CREATE TABLE IF NOT EXISTS volunteer_balance (
+    name TEXT PRIMARY KEY,
+    total_score BIGINT NOT NULL DEFAULT 0,
+    used_points BIGINT NOT NULL DEFAULT 0,
+    course_count BIGINT NOT NULL DEFAULT 0,
+    activity_count BIGINT NOT NULL DEFAULT 0,
+    usage_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 积分记录变更时累加/扣减余额（语句级触发器，一次多行插入只更新一次）
+CREATE OR REPLACE FUNCTION sync_balance_from_points()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 涉及的余额行一律按姓名顺序加锁（新姓名也按姓名顺序插入），并发写入的志愿者
+    -- 有重叠时按相同顺序等待，不会互相死锁。插入只有下面一条按姓名排序的语句；
+    -- 修改和删除会分两步处理新旧姓名，先按姓名顺序锁定（修改时不存在则创建）全部涉及的行
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO volunteer_balance (name)
+        SELECT changed.name
+        FROM (SELECT new_rows.name FROM new_rows UNION SELECT old_rows.name FROM old_rows) changed
+        WHERE changed.name IS NOT NULL
+        ORDER BY changed.name
+        ON CONFLICT (name) DO UPDATE SET updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM volunteer_balance
+        WHERE volunteer_balance.name IN (SELECT old_rows.name FROM old_rows)
+        ORDER BY volunteer_balance.name
+        FOR UPDATE;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO volunteer_balance (name, total_score, activity_count)
+        SELECT new_rows.name, SUM(CAST(new_rows.score AS INTEGER)), COUNT(*)
+        FROM new_rows
+        WHERE new_rows.name IS NOT NULL
+        GROUP BY new_rows.name
+        ORDER BY new_rows.name
+        ON CONFLICT (name) DO UPDATE SET
+            total_score = volunteer_balance.total_score + EXCLUDED.total_score,
+            activity_count = volunteer_balance.activity_count + EXCLUDED.activity_count,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE volunteer_balance
+        SET total_score = volunteer_balance.total_score - removed.score_total,
+            activity_count = volunteer_balance.activity_count - removed.row_count,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT old_rows.name, SUM(CAST(old_rows.score AS INTEGER)) AS score_total, COUNT(*) AS row_count
+            FROM old_rows
+            WHERE old_rows.name IS NOT NULL
+            GROUP BY old_rows.name
+        ) removed
+        WHERE volunteer_balance.name = removed.name;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 使用记录变更时累加/扣减余额
+CREATE OR REPLACE FUNCTION sync_balance_from_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 涉及的余额行一律按姓名顺序加锁（新姓名也按姓名顺序插入），并发写入的志愿者
+    -- 有重叠时按相同顺序等待，不会互相死锁。插入只有下面一条按姓名排序的语句；
+    -- 修改和删除会分两步处理新旧姓名，先按姓名顺序锁定（修改时不存在则创建）全部涉及的行
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO volunteer_balance (name)
+        SELECT changed.name
+        FROM (SELECT new_rows.name FROM new_rows UNION SELECT old_rows.name FROM old_rows) changed
+        WHERE changed.name IS NOT NULL
+        ORDER BY changed.name
+        ON CONFLICT (name) DO UPDATE SET updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM volunteer_balance
+        WHERE volunteer_balance.name IN (SELECT old_rows.name FROM old_rows)
+        ORDER BY volunteer_balance.name
+        FOR UPDATE;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO volunteer_balance (name, used_points, course_count, usage_count)
+        SELECT new_rows.name, SUM(COALESCE(new_rows.used_points, 0)), SUM(COALESCE(new_rows.course_count, 0)), COUNT(*)
+        FROM new_rows
+        WHERE new_rows.name IS NOT NULL
+        GROUP BY new_rows.name
+        ORDER BY new_rows.name
+        ON CONFLICT (name) DO UPDATE SET
+            used_points = volunteer_balance.used_points + EXCLUDED.used_points,
+            course_count = volunteer_balance.course_count + EXCLUDED.course_count,
+            usage_count = volunteer_balance.usage_count + EXCLUDED.usage_count,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE volunteer_balance
+        SET used_points = volunteer_balance.used_points - removed.points_total,
+            course_count = volunteer_balance.course_count - removed.course_total,
+            usage_count = volunteer_balance.usage_count - removed.row_count,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT old_rows.name,
+                   SUM(COALESCE(old_rows.used_points, 0)) AS points_total,
+                   SUM(COALESCE(old_rows.course_count, 0)) AS course_total,
+                   COUNT(*) AS row_count
+            FROM old_rows
+            WHERE old_rows.name IS NOT NULL
+            GROUP BY old_rows.name
+        ) removed
+        WHERE volunteer_balance.name = removed.name;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 创建触发器（带过渡表的触发器每个只能对应一种事件）
+DROP TRIGGER IF EXISTS volunteer_points_balance_insert ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_insert
+    AFTER INSERT ON volunteer_points
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_update ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_update
+    AFTER UPDATE ON volunteer_points
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_delete ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_delete
+    AFTER DELETE ON volunteer_points
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_insert ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_insert
+    AFTER INSERT ON volunteer_usage
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_update ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_update
+    AFTER UPDATE ON volunteer_usage
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_delete ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_delete
+    AFTER DELETE ON volunteer_usage
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+-- 清空积分或使用记录（TRUNCATE 不触发行级/删除触发器）时清零余额中对应的部分
+CREATE OR REPLACE FUNCTION reset_balance_on_truncate()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'volunteer_points' THEN
+        UPDATE volunteer_balance
+        SET total_score = 0, activity_count = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE volunteer_balance.total_score <> 0 OR volunteer_balance.activity_count <> 0;
+    ELSE
+        UPDATE volunteer_balance
+        SET used_points = 0, course_count = 0, usage_count = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE volunteer_balance.used_points <> 0 OR volunteer_balance.course_count <> 0
+           OR volunteer_balance.usage_count <> 0;
+    END IF;
+    DELETE FROM volunteer_balance
+    WHERE volunteer_balance.activity_count = 0 AND volunteer_balance.usage_count = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_truncate ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_truncate
+    AFTER TRUNCATE ON volunteer_points
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_balance_on_truncate();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_truncate ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_truncate
+    AFTER TRUNCATE ON volunteer_usage
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_balance_on_truncate();
+
+-- 根据积分/使用记录重新计算余额表，返回与重算结果不一致（漂移）的志愿者
+-- apply 为 FALSE 时只检查不修改
+CREATE OR REPLACE FUNCTION rebuild_volunteer_balance(apply BOOLEAN DEFAULT TRUE)
+RETURNS TABLE (
+    name TEXT,
+    stored_total_score BIGINT,
+    actual_total_score BIGINT,
+    stored_used_points BIGINT,
+    actual_used_points BIGINT,
+    stored_course_count BIGINT,
+    actual_course_count BIGINT
+) AS $$
+BEGIN
+    -- 重算期间阻止新的写入，保证结果与记录一致
+    LOCK TABLE volunteer_points, volunteer_usage IN SHARE MODE;
+
+    CREATE TEMP TABLE expected_balance ON COMMIT DROP AS
+    WITH point_totals AS (
+        SELECT vp.name AS volunteer_name,
+               SUM(CAST(vp.score AS INTEGER))::BIGINT AS points_total,
+               COUNT(*) AS points_rows
+        FROM volunteer_points vp
+        WHERE vp.name IS NOT NULL
+        GROUP BY vp.name
+    ),
+    usage_totals AS (
+        SELECT vu.name AS volunteer_name,
+               SUM(COALESCE(vu.used_points, 0))::BIGINT AS usage_points,
+               SUM(COALESCE(vu.course_count, 0))::BIGINT AS usage_courses,
+               COUNT(*) AS usage_rows
+        FROM volunteer_usage vu
+        WHERE vu.name IS NOT NULL
+        GROUP BY vu.name
+    )
+    SELECT
+        COALESCE(point_totals.volunteer_name, usage_totals.volunteer_name) AS volunteer_name,
+        COALESCE(point_totals.points_total, 0) AS total_score,
+        COALESCE(usage_totals.usage_points, 0) AS used_points,
+        COALESCE(usage_totals.usage_courses, 0) AS course_count,
+        COALESCE(point_totals.points_rows, 0) AS activity_count,
+        COALESCE(usage_totals.usage_rows, 0) AS usage_count
+    FROM point_totals
+    FULL OUTER JOIN usage_totals ON point_totals.volunteer_name = usage_totals.volunteer_name;
+
+    RETURN QUERY
+    SELECT
+        COALESCE(expected.volunteer_name, stored.name),
+        COALESCE(stored.total_score, 0),
+        COALESCE(expected.total_score, 0),
+        COALESCE(stored.used_points, 0),
+        COALESCE(expected.used_points, 0),
+        COALESCE(stored.course_count, 0),
+        COALESCE(expected.course_count, 0)
+    FROM expected_balance expected
+    FULL OUTER JOIN volunteer_balance stored ON stored.name = expected.volunteer_name
+    WHERE COALESCE(stored.total_score, 0) <> COALESCE(expected.total_score, 0)
+       OR COALESCE(stored.used_points, 0) <> COALESCE(expected.used_points, 0)
+       OR COALESCE(stored.course_count, 0) <> COALESCE(expected.course_count, 0)
+       OR COALESCE(stored.activity_count, 0) <> COALESCE(expected.activity_count, 0)
+       OR COALESCE(stored.usage_count, 0) <> COALESCE(expected.usage_count, 0)
+    ORDER BY 1;
+
+    IF apply THEN
+        DELETE FROM volunteer_balance;
+        INSERT INTO volunteer_balance (name, total_score, used_points, course_count, activity_count, usage_count)
+        SELECT expected.volunteer_name, expected.total_score, expected.used_points,
+               expected.course_count, expected.activity_count, expected.usage_count
+        FROM expected_balance expected;
+    END IF;
+
+    DROP TABLE expected_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 重算会锁住两张明细表并改写余额表，只允许服务角色（rebuild-balance 命令）通过RPC调用
+REVOKE EXECUTE ON FUNCTION rebuild_volunteer_balance(BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_volunteer_balance(BOOLEAN) TO service_role;
+
+-- 汇总函数改为读取余额表
+CREATE OR REPLACE FUNCTION get_volunteer_summary()
+RETURNS TABLE (
+    name TEXT,
+    total_score BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.total_score
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.activity_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION get_usage_summary()
+RETURNS TABLE (
+    name TEXT,
+    used_points BIGINT,
+    course_count BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.used_points,
+        volunteer_balance.course_count
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.usage_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION get_complete_summary()
+RETURNS TABLE (
+    name TEXT,
+    total_score BIGINT,
+    used_points BIGINT,
+    course_count BIGINT,
+    remaining_score BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.total_score,
+        volunteer_balance.used_points,
+        volunteer_balance.course_count,
+        volunteer_balance.total_score - volunteer_balance.used_points
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.activity_count > 0 OR volunteer_balance.usage_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- 创建RLS策略
+ALTER TABLE volunteer_balance ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "允许公共读取志愿者积分余额" ON volunteer_balance;
+CREATE POLICY "允许公共读取志愿者积分余额" ON volunteer_balance
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "允许服务角色完全访问志愿者积分余额" ON volunteer_balance;
+CREATE POLICY "允许服务角色完全访问志愿者积分余额" ON volunteer_balance
+    FOR ALL USING (auth.role() = 'service_role');
+
+-- 根据已有记录初始化余额表
+SELECT * FROM rebuild_volunteer_balance();
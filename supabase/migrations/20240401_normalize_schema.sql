@@ -0,0 +1,223 @@
+-- 规范化表结构：整数积分、志愿者维表、枚举类型的活动类型与类别、热点查询的组合索引
+-- 可重复执行；已有记录的 volunteer_id 由 backfill_volunteer_ids() 分批回填
+-- （flask --app app backfill-volunteers）
+
+-- 1. 积分改为整数，无法转换的旧值记录到 volunteer_points_invalid_score 后按0处理
+CREATE TABLE IF NOT EXISTS volunteer_points_invalid_score (
+    point_id INTEGER PRIMARY KEY,
+    original_score TEXT,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'score') <> 'integer' THEN
+        INSERT INTO volunteer_points_invalid_score (point_id, original_score)
+        SELECT id, score FROM volunteer_points
+        WHERE score IS NULL OR score !~ '^\s*-?\d{1,9}\s*$'
+        ON CONFLICT (point_id) DO NOTHING;
+
+        ALTER TABLE volunteer_points
+            ALTER COLUMN score TYPE INTEGER
+            USING (CASE WHEN score ~ '^\s*-?\d{1,9}\s*$' THEN trim(score)::INTEGER ELSE 0 END);
+    END IF;
+END $$;
+
+UPDATE volunteer_points SET score = 0 WHERE score IS NULL;
+ALTER TABLE volunteer_points ALTER COLUMN score SET DEFAULT 0;
+ALTER TABLE volunteer_points ALTER COLUMN score SET NOT NULL;
+
+-- 2. 活动类型与类别改为枚举类型，取值为页面中的选项加上已有记录中出现过的值
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'activity_type_enum') THEN
+        EXECUTE (
+            SELECT format('CREATE TYPE activity_type_enum AS ENUM (%s)',
+                          string_agg(quote_literal(value), ', ' ORDER BY position, value))
+            FROM (
+                SELECT value, MIN(position) AS position
+                FROM (
+                    SELECT known.value, known.position
+                    FROM unnest(ARRAY['线下活动', '线上直播']) WITH ORDINALITY AS known(value, position)
+                    UNION ALL
+                    SELECT DISTINCT activity_type, 1000 FROM volunteer_points WHERE activity_type IS NOT NULL
+                ) candidates
+                GROUP BY value
+            ) enum_values
+        );
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'activity_category_enum') THEN
+        EXECUTE (
+            SELECT format('CREATE TYPE activity_category_enum AS ENUM (%s)',
+                          string_agg(quote_literal(value), ', ' ORDER BY position, value))
+            FROM (
+                SELECT value, MIN(position) AS position
+                FROM (
+                    SELECT known.value, known.position
+                    FROM unnest(ARRAY['海报', '宣发', '签到', '写稿', '场务', '直播助手', '视频剪辑'])
+                         WITH ORDINALITY AS known(value, position)
+                    UNION ALL
+                    SELECT DISTINCT category, 1000 FROM volunteer_points WHERE category IS NOT NULL
+                ) candidates
+                GROUP BY value
+            ) enum_values
+        );
+    END IF;
+
+    IF (SELECT udt_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'activity_type') <> 'activity_type_enum' THEN
+        ALTER TABLE volunteer_points
+            ALTER COLUMN activity_type TYPE activity_type_enum USING activity_type::activity_type_enum;
+    END IF;
+
+    IF (SELECT udt_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'category') <> 'activity_category_enum' THEN
+        ALTER TABLE volunteer_points
+            ALTER COLUMN category TYPE activity_category_enum USING category::activity_category_enum;
+    END IF;
+END $$;
+
+-- 3. 志愿者维表，两张明细表通过 volunteer_id 引用
+-- name 列仍保留在明细表中，现有接口按姓名读写不受影响
+CREATE TABLE IF NOT EXISTS volunteers (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE volunteer_points ADD COLUMN IF NOT EXISTS volunteer_id BIGINT REFERENCES volunteers(id);
+ALTER TABLE volunteer_usage ADD COLUMN IF NOT EXISTS volunteer_id BIGINT REFERENCES volunteers(id);
+
+-- 写入或修改姓名时按姓名查找（不存在则创建）志愿者，填入 volunteer_id
+CREATE OR REPLACE FUNCTION resolve_volunteer_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.name IS NULL THEN
+        NEW.volunteer_id := NULL;
+        RETURN NEW;
+    END IF;
+
+    -- 已有的志愿者只读取不加锁。创建新志愿者前先取得事务级咨询锁，同一时间只有一个
+    -- 事务在创建志愿者，并发提交中逐行创建的顺序不同也不会互相等待而死锁
+    SELECT volunteers.id INTO NEW.volunteer_id FROM volunteers WHERE volunteers.name = NEW.name;
+    IF NEW.volunteer_id IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtext('volunteers'));
+        INSERT INTO volunteers (name) VALUES (NEW.name)
+        ON CONFLICT (name) DO NOTHING
+        RETURNING volunteers.id INTO NEW.volunteer_id;
+        IF NEW.volunteer_id IS NULL THEN
+            -- 持有锁的上一个事务已经创建了该志愿者
+            SELECT volunteers.id INTO NEW.volunteer_id FROM volunteers WHERE volunteers.name = NEW.name;
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS volunteer_points_resolve_volunteer ON volunteer_points;
+CREATE TRIGGER volunteer_points_resolve_volunteer
+    BEFORE INSERT OR UPDATE OF name ON volunteer_points
+    FOR EACH ROW EXECUTE FUNCTION resolve_volunteer_id();
+
+DROP TRIGGER IF EXISTS volunteer_usage_resolve_volunteer ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_resolve_volunteer
+    BEFORE INSERT OR UPDATE OF name ON volunteer_usage
+    FOR EACH ROW EXECUTE FUNCTION resolve_volunteer_id();
+
+-- 分批回填已有记录的 volunteer_id，每张表每次最多处理 batch_size 行
+-- 返回本次更新的行数和剩余未回填的行数；batch_size 为0时只统计
+CREATE OR REPLACE FUNCTION backfill_volunteer_ids(batch_size INTEGER DEFAULT 5000)
+RETURNS TABLE (
+    table_name TEXT,
+    updated BIGINT,
+    remaining BIGINT
+) AS $$
+DECLARE
+    points_updated BIGINT;
+    usage_updated BIGINT;
+BEGIN
+    -- 与 resolve_volunteer_id() 使用同一个锁创建志愿者
+    PERFORM pg_advisory_xact_lock(hashtext('volunteers'));
+
+    INSERT INTO volunteers (name)
+    SELECT DISTINCT batch.name
+    FROM (
+        SELECT vp.name FROM volunteer_points vp
+        WHERE vp.volunteer_id IS NULL AND vp.name IS NOT NULL
+        ORDER BY vp.id LIMIT batch_size
+    ) batch
+    ON CONFLICT (name) DO NOTHING;
+
+    UPDATE volunteer_points vp
+    SET volunteer_id = v.id
+    FROM (
+        SELECT inner_vp.id FROM volunteer_points inner_vp
+        WHERE inner_vp.volunteer_id IS NULL AND inner_vp.name IS NOT NULL
+        ORDER BY inner_vp.id LIMIT batch_size
+    ) batch, volunteers v
+    WHERE vp.id = batch.id AND v.name = vp.name;
+    GET DIAGNOSTICS points_updated = ROW_COUNT;
+
+    INSERT INTO volunteers (name)
+    SELECT DISTINCT batch.name
+    FROM (
+        SELECT vu.name FROM volunteer_usage vu
+        WHERE vu.volunteer_id IS NULL AND vu.name IS NOT NULL
+        ORDER BY vu.id LIMIT batch_size
+    ) batch
+    ON CONFLICT (name) DO NOTHING;
+
+    UPDATE volunteer_usage vu
+    SET volunteer_id = v.id
+    FROM (
+        SELECT inner_vu.id FROM volunteer_usage inner_vu
+        WHERE inner_vu.volunteer_id IS NULL AND inner_vu.name IS NOT NULL
+        ORDER BY inner_vu.id LIMIT batch_size
+    ) batch, volunteers v
+    WHERE vu.id = batch.id AND v.name = vu.name;
+    GET DIAGNOSTICS usage_updated = ROW_COUNT;
+
+    RETURN QUERY
+    SELECT 'volunteer_points'::TEXT, points_updated,
+           (SELECT COUNT(*) FROM volunteer_points vp WHERE vp.volunteer_id IS NULL AND vp.name IS NOT NULL)
+    UNION ALL
+    SELECT 'volunteer_usage'::TEXT, usage_updated,
+           (SELECT COUNT(*) FROM volunteer_usage vu WHERE vu.volunteer_id IS NULL AND vu.name IS NOT NULL);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 以定义者权限批量改写明细表，只允许服务角色（backfill-volunteers 命令）通过RPC调用
+REVOKE EXECUTE ON FUNCTION backfill_volunteer_ids(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION backfill_volunteer_ids(INTEGER) TO service_role;
+
+-- 4. 热点查询的组合索引
+-- 按姓名过滤并按id分页（/api/points、/api/usage、/api/volunteer），INCLUDE 的列使按姓名求和只扫描索引
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_name_id ON volunteer_points (name, id) INCLUDE (score);
+CREATE INDEX IF NOT EXISTS idx_volunteer_usage_name_id ON volunteer_usage (name, id) INCLUDE (used_points, course_count);
+-- 按类别过滤并按id分页
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_category_id ON volunteer_points (category, id);
+-- volunteer_id 外键的索引：删除或合并志愿者时按 volunteer_id 查找明细，不扫描全表
+-- 余额表与汇总函数仍按姓名维护，见 SUPABASE_SETUP.md「表结构规范化」
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_volunteer_id ON volunteer_points (volunteer_id) INCLUDE (score);
+CREATE INDEX IF NOT EXISTS idx_volunteer_usage_volunteer_id ON volunteer_usage (volunteer_id) INCLUDE (used_points, course_count);
+-- 被上面的 (name, id) 索引取代
+DROP INDEX IF EXISTS idx_volunteer_points_name;
+DROP INDEX IF EXISTS idx_volunteer_usage_name;
+
+-- 志愿者维表只由触发器和回填函数（定义者权限）写入，客户端只读；无效积分记录只对服务角色可见
+ALTER TABLE volunteers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE volunteer_points_invalid_score ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "允许公共读取志愿者" ON volunteers;
+CREATE POLICY "允许公共读取志愿者" ON volunteers
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "允许服务角色完全访问志愿者" ON volunteers;
+CREATE POLICY "允许服务角色完全访问志愿者" ON volunteers
+    FOR ALL USING (auth.role() = 'service_role');
+
+DROP POLICY IF EXISTS "允许服务角色完全访问无效积分记录" ON volunteer_points_invalid_score;
+CREATE POLICY "允许服务角色完全访问无效积分记录" ON volunteer_points_invalid_score
+    FOR ALL USING (auth.role() = 'service_role');
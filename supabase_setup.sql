@@ -37,17 +37,574 @@ ALTER TABLE volunteer_usage DISABLE ROW LEVEL SECURITY;
 -- CREATE POLICY "Allow all operations on volunteer_usage" ON volunteer_usage
 --     FOR ALL USING (true) WITH CHECK (true);
 
--- 5. 创建索引以提高查询性能
-CREATE INDEX IF NOT EXISTS idx_volunteer_points_name ON volunteer_points(name);
-CREATE INDEX IF NOT EXISTS idx_volunteer_usage_name ON volunteer_usage(name);
+-- 5. 创建索引以提高查询性能（按姓名、类别的组合索引见第7节）
 CREATE INDEX IF NOT EXISTS idx_volunteer_points_created_at ON volunteer_points(created_at);
 CREATE INDEX IF NOT EXISTS idx_volunteer_usage_created_at ON volunteer_usage(created_at);
 
--- 6. 插入一些测试数据（可选）
+-- 6. 创建志愿者积分余额表（由触发器增量维护）与汇总函数
+-- 创建志愿者积分余额表
+CREATE TABLE IF NOT EXISTS volunteer_balance (
+    name TEXT PRIMARY KEY,
+    total_score BIGINT NOT NULL DEFAULT 0,
+    used_points BIGINT NOT NULL DEFAULT 0,
+    course_count BIGINT NOT NULL DEFAULT 0,
+    activity_count BIGINT NOT NULL DEFAULT 0,
+    usage_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 积分记录变更时累加/扣减余额（语句级触发器，一次多行插入只更新一次）
+CREATE OR REPLACE FUNCTION sync_balance_from_points()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 涉及的余额行一律按姓名顺序加锁（新姓名也按姓名顺序插入），并发写入的志愿者
+    -- 有重叠时按相同顺序等待，不会互相死锁。插入只有下面一条按姓名排序的语句；
+    -- 修改和删除会分两步处理新旧姓名，先按姓名顺序锁定（修改时不存在则创建）全部涉及的行
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO volunteer_balance (name)
+        SELECT changed.name
+        FROM (SELECT new_rows.name FROM new_rows UNION SELECT old_rows.name FROM old_rows) changed
+        WHERE changed.name IS NOT NULL
+        ORDER BY changed.name
+        ON CONFLICT (name) DO UPDATE SET updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM volunteer_balance
+        WHERE volunteer_balance.name IN (SELECT old_rows.name FROM old_rows)
+        ORDER BY volunteer_balance.name
+        FOR UPDATE;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO volunteer_balance (name, total_score, activity_count)
+        SELECT new_rows.name, SUM(CAST(new_rows.score AS INTEGER)), COUNT(*)
+        FROM new_rows
+        WHERE new_rows.name IS NOT NULL
+        GROUP BY new_rows.name
+        ORDER BY new_rows.name
+        ON CONFLICT (name) DO UPDATE SET
+            total_score = volunteer_balance.total_score + EXCLUDED.total_score,
+            activity_count = volunteer_balance.activity_count + EXCLUDED.activity_count,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE volunteer_balance
+        SET total_score = volunteer_balance.total_score - removed.score_total,
+            activity_count = volunteer_balance.activity_count - removed.row_count,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT old_rows.name, SUM(CAST(old_rows.score AS INTEGER)) AS score_total, COUNT(*) AS row_count
+            FROM old_rows
+            WHERE old_rows.name IS NOT NULL
+            GROUP BY old_rows.name
+        ) removed
+        WHERE volunteer_balance.name = removed.name;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 使用记录变更时累加/扣减余额
+CREATE OR REPLACE FUNCTION sync_balance_from_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 涉及的余额行一律按姓名顺序加锁（新姓名也按姓名顺序插入），并发写入的志愿者
+    -- 有重叠时按相同顺序等待，不会互相死锁。插入只有下面一条按姓名排序的语句；
+    -- 修改和删除会分两步处理新旧姓名，先按姓名顺序锁定（修改时不存在则创建）全部涉及的行
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO volunteer_balance (name)
+        SELECT changed.name
+        FROM (SELECT new_rows.name FROM new_rows UNION SELECT old_rows.name FROM old_rows) changed
+        WHERE changed.name IS NOT NULL
+        ORDER BY changed.name
+        ON CONFLICT (name) DO UPDATE SET updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM volunteer_balance
+        WHERE volunteer_balance.name IN (SELECT old_rows.name FROM old_rows)
+        ORDER BY volunteer_balance.name
+        FOR UPDATE;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO volunteer_balance (name, used_points, course_count, usage_count)
+        SELECT new_rows.name, SUM(COALESCE(new_rows.used_points, 0)), SUM(COALESCE(new_rows.course_count, 0)), COUNT(*)
+        FROM new_rows
+        WHERE new_rows.name IS NOT NULL
+        GROUP BY new_rows.name
+        ORDER BY new_rows.name
+        ON CONFLICT (name) DO UPDATE SET
+            used_points = volunteer_balance.used_points + EXCLUDED.used_points,
+            course_count = volunteer_balance.course_count + EXCLUDED.course_count,
+            usage_count = volunteer_balance.usage_count + EXCLUDED.usage_count,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE volunteer_balance
+        SET used_points = volunteer_balance.used_points - removed.points_total,
+            course_count = volunteer_balance.course_count - removed.course_total,
+            usage_count = volunteer_balance.usage_count - removed.row_count,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT old_rows.name,
+                   SUM(COALESCE(old_rows.used_points, 0)) AS points_total,
+                   SUM(COALESCE(old_rows.course_count, 0)) AS course_total,
+                   COUNT(*) AS row_count
+            FROM old_rows
+            WHERE old_rows.name IS NOT NULL
+            GROUP BY old_rows.name
+        ) removed
+        WHERE volunteer_balance.name = removed.name;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 创建触发器（带过渡表的触发器每个只能对应一种事件）
+DROP TRIGGER IF EXISTS volunteer_points_balance_insert ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_insert
+    AFTER INSERT ON volunteer_points
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_update ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_update
+    AFTER UPDATE ON volunteer_points
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_delete ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_delete
+    AFTER DELETE ON volunteer_points
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_points();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_insert ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_insert
+    AFTER INSERT ON volunteer_usage
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_update ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_update
+    AFTER UPDATE ON volunteer_usage
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_delete ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_delete
+    AFTER DELETE ON volunteer_usage
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_balance_from_usage();
+
+-- 清空积分或使用记录（TRUNCATE 不触发行级/删除触发器）时清零余额中对应的部分
+CREATE OR REPLACE FUNCTION reset_balance_on_truncate()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'volunteer_points' THEN
+        UPDATE volunteer_balance
+        SET total_score = 0, activity_count = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE volunteer_balance.total_score <> 0 OR volunteer_balance.activity_count <> 0;
+    ELSE
+        UPDATE volunteer_balance
+        SET used_points = 0, course_count = 0, usage_count = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE volunteer_balance.used_points <> 0 OR volunteer_balance.course_count <> 0
+           OR volunteer_balance.usage_count <> 0;
+    END IF;
+    DELETE FROM volunteer_balance
+    WHERE volunteer_balance.activity_count = 0 AND volunteer_balance.usage_count = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS volunteer_points_balance_truncate ON volunteer_points;
+CREATE TRIGGER volunteer_points_balance_truncate
+    AFTER TRUNCATE ON volunteer_points
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_balance_on_truncate();
+
+DROP TRIGGER IF EXISTS volunteer_usage_balance_truncate ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_balance_truncate
+    AFTER TRUNCATE ON volunteer_usage
+    FOR EACH STATEMENT EXECUTE FUNCTION reset_balance_on_truncate();
+
+-- 根据积分/使用记录重新计算余额表，返回与重算结果不一致（漂移）的志愿者
+-- apply 为 FALSE 时只检查不修改
+CREATE OR REPLACE FUNCTION rebuild_volunteer_balance(apply BOOLEAN DEFAULT TRUE)
+RETURNS TABLE (
+    name TEXT,
+    stored_total_score BIGINT,
+    actual_total_score BIGINT,
+    stored_used_points BIGINT,
+    actual_used_points BIGINT,
+    stored_course_count BIGINT,
+    actual_course_count BIGINT
+) AS $$
+BEGIN
+    -- 重算期间阻止新的写入，保证结果与记录一致
+    LOCK TABLE volunteer_points, volunteer_usage IN SHARE MODE;
+
+    CREATE TEMP TABLE expected_balance ON COMMIT DROP AS
+    WITH point_totals AS (
+        SELECT vp.name AS volunteer_name,
+               SUM(CAST(vp.score AS INTEGER))::BIGINT AS points_total,
+               COUNT(*) AS points_rows
+        FROM volunteer_points vp
+        WHERE vp.name IS NOT NULL
+        GROUP BY vp.name
+    ),
+    usage_totals AS (
+        SELECT vu.name AS volunteer_name,
+               SUM(COALESCE(vu.used_points, 0))::BIGINT AS usage_points,
+               SUM(COALESCE(vu.course_count, 0))::BIGINT AS usage_courses,
+               COUNT(*) AS usage_rows
+        FROM volunteer_usage vu
+        WHERE vu.name IS NOT NULL
+        GROUP BY vu.name
+    )
+    SELECT
+        COALESCE(point_totals.volunteer_name, usage_totals.volunteer_name) AS volunteer_name,
+        COALESCE(point_totals.points_total, 0) AS total_score,
+        COALESCE(usage_totals.usage_points, 0) AS used_points,
+        COALESCE(usage_totals.usage_courses, 0) AS course_count,
+        COALESCE(point_totals.points_rows, 0) AS activity_count,
+        COALESCE(usage_totals.usage_rows, 0) AS usage_count
+    FROM point_totals
+    FULL OUTER JOIN usage_totals ON point_totals.volunteer_name = usage_totals.volunteer_name;
+
+    RETURN QUERY
+    SELECT
+        COALESCE(expected.volunteer_name, stored.name),
+        COALESCE(stored.total_score, 0),
+        COALESCE(expected.total_score, 0),
+        COALESCE(stored.used_points, 0),
+        COALESCE(expected.used_points, 0),
+        COALESCE(stored.course_count, 0),
+        COALESCE(expected.course_count, 0)
+    FROM expected_balance expected
+    FULL OUTER JOIN volunteer_balance stored ON stored.name = expected.volunteer_name
+    WHERE COALESCE(stored.total_score, 0) <> COALESCE(expected.total_score, 0)
+       OR COALESCE(stored.used_points, 0) <> COALESCE(expected.used_points, 0)
+       OR COALESCE(stored.course_count, 0) <> COALESCE(expected.course_count, 0)
+       OR COALESCE(stored.activity_count, 0) <> COALESCE(expected.activity_count, 0)
+       OR COALESCE(stored.usage_count, 0) <> COALESCE(expected.usage_count, 0)
+    ORDER BY 1;
+
+    IF apply THEN
+        DELETE FROM volunteer_balance;
+        INSERT INTO volunteer_balance (name, total_score, used_points, course_count, activity_count, usage_count)
+        SELECT expected.volunteer_name, expected.total_score, expected.used_points,
+               expected.course_count, expected.activity_count, expected.usage_count
+        FROM expected_balance expected;
+    END IF;
+
+    DROP TABLE expected_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 重算会锁住两张明细表并改写余额表，只允许服务角色（rebuild-balance 命令）通过RPC调用
+REVOKE EXECUTE ON FUNCTION rebuild_volunteer_balance(BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_volunteer_balance(BOOLEAN) TO service_role;
+
+-- 创建汇总函数（/api/get_summary 等接口通过 RPC 调用，每位志愿者只返回一行）
+CREATE OR REPLACE FUNCTION get_volunteer_summary()
+RETURNS TABLE (
+    name TEXT,
+    total_score BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.total_score
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.activity_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION get_usage_summary()
+RETURNS TABLE (
+    name TEXT,
+    used_points BIGINT,
+    course_count BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.used_points,
+        volunteer_balance.course_count
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.usage_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION get_complete_summary()
+RETURNS TABLE (
+    name TEXT,
+    total_score BIGINT,
+    used_points BIGINT,
+    course_count BIGINT,
+    remaining_score BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        volunteer_balance.name,
+        volunteer_balance.total_score,
+        volunteer_balance.used_points,
+        volunteer_balance.course_count,
+        volunteer_balance.total_score - volunteer_balance.used_points
+    FROM
+        volunteer_balance
+    WHERE
+        volunteer_balance.activity_count > 0 OR volunteer_balance.usage_count > 0
+    ORDER BY
+        volunteer_balance.name;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+ALTER TABLE volunteer_balance DISABLE ROW LEVEL SECURITY;
+
+-- 根据已有记录初始化余额表
+SELECT * FROM rebuild_volunteer_balance();
+
+-- 7. 规范化表结构：整数积分、志愿者维表、枚举类型的活动类型与类别、组合索引
+-- 已有记录的 volunteer_id 用 flask --app app backfill-volunteers 分批回填
+-- 7.1 积分改为整数，无法转换的旧值记录到 volunteer_points_invalid_score 后按0处理
+CREATE TABLE IF NOT EXISTS volunteer_points_invalid_score (
+    point_id INTEGER PRIMARY KEY,
+    original_score TEXT,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'score') <> 'integer' THEN
+        INSERT INTO volunteer_points_invalid_score (point_id, original_score)
+        SELECT id, score FROM volunteer_points
+        WHERE score IS NULL OR score !~ '^\s*-?\d{1,9}\s*$'
+        ON CONFLICT (point_id) DO NOTHING;
+
+        ALTER TABLE volunteer_points
+            ALTER COLUMN score TYPE INTEGER
+            USING (CASE WHEN score ~ '^\s*-?\d{1,9}\s*$' THEN trim(score)::INTEGER ELSE 0 END);
+    END IF;
+END $$;
+
+UPDATE volunteer_points SET score = 0 WHERE score IS NULL;
+ALTER TABLE volunteer_points ALTER COLUMN score SET DEFAULT 0;
+ALTER TABLE volunteer_points ALTER COLUMN score SET NOT NULL;
+
+-- 7.2 活动类型与类别改为枚举类型，取值为页面中的选项加上已有记录中出现过的值
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'activity_type_enum') THEN
+        EXECUTE (
+            SELECT format('CREATE TYPE activity_type_enum AS ENUM (%s)',
+                          string_agg(quote_literal(value), ', ' ORDER BY position, value))
+            FROM (
+                SELECT value, MIN(position) AS position
+                FROM (
+                    SELECT known.value, known.position
+                    FROM unnest(ARRAY['线下活动', '线上直播']) WITH ORDINALITY AS known(value, position)
+                    UNION ALL
+                    SELECT DISTINCT activity_type, 1000 FROM volunteer_points WHERE activity_type IS NOT NULL
+                ) candidates
+                GROUP BY value
+            ) enum_values
+        );
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'activity_category_enum') THEN
+        EXECUTE (
+            SELECT format('CREATE TYPE activity_category_enum AS ENUM (%s)',
+                          string_agg(quote_literal(value), ', ' ORDER BY position, value))
+            FROM (
+                SELECT value, MIN(position) AS position
+                FROM (
+                    SELECT known.value, known.position
+                    FROM unnest(ARRAY['海报', '宣发', '签到', '写稿', '场务', '直播助手', '视频剪辑'])
+                         WITH ORDINALITY AS known(value, position)
+                    UNION ALL
+                    SELECT DISTINCT category, 1000 FROM volunteer_points WHERE category IS NOT NULL
+                ) candidates
+                GROUP BY value
+            ) enum_values
+        );
+    END IF;
+
+    IF (SELECT udt_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'activity_type') <> 'activity_type_enum' THEN
+        ALTER TABLE volunteer_points
+            ALTER COLUMN activity_type TYPE activity_type_enum USING activity_type::activity_type_enum;
+    END IF;
+
+    IF (SELECT udt_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'volunteer_points' AND column_name = 'category') <> 'activity_category_enum' THEN
+        ALTER TABLE volunteer_points
+            ALTER COLUMN category TYPE activity_category_enum USING category::activity_category_enum;
+    END IF;
+END $$;
+
+-- 7.3 志愿者维表，两张明细表通过 volunteer_id 引用
+-- name 列仍保留在明细表中，现有接口按姓名读写不受影响
+CREATE TABLE IF NOT EXISTS volunteers (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE volunteer_points ADD COLUMN IF NOT EXISTS volunteer_id BIGINT REFERENCES volunteers(id);
+ALTER TABLE volunteer_usage ADD COLUMN IF NOT EXISTS volunteer_id BIGINT REFERENCES volunteers(id);
+
+-- 写入或修改姓名时按姓名查找（不存在则创建）志愿者，填入 volunteer_id
+CREATE OR REPLACE FUNCTION resolve_volunteer_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.name IS NULL THEN
+        NEW.volunteer_id := NULL;
+        RETURN NEW;
+    END IF;
+
+    -- 已有的志愿者只读取不加锁。创建新志愿者前先取得事务级咨询锁，同一时间只有一个
+    -- 事务在创建志愿者，并发提交中逐行创建的顺序不同也不会互相等待而死锁
+    SELECT volunteers.id INTO NEW.volunteer_id FROM volunteers WHERE volunteers.name = NEW.name;
+    IF NEW.volunteer_id IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtext('volunteers'));
+        INSERT INTO volunteers (name) VALUES (NEW.name)
+        ON CONFLICT (name) DO NOTHING
+        RETURNING volunteers.id INTO NEW.volunteer_id;
+        IF NEW.volunteer_id IS NULL THEN
+            -- 持有锁的上一个事务已经创建了该志愿者
+            SELECT volunteers.id INTO NEW.volunteer_id FROM volunteers WHERE volunteers.name = NEW.name;
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS volunteer_points_resolve_volunteer ON volunteer_points;
+CREATE TRIGGER volunteer_points_resolve_volunteer
+    BEFORE INSERT OR UPDATE OF name ON volunteer_points
+    FOR EACH ROW EXECUTE FUNCTION resolve_volunteer_id();
+
+DROP TRIGGER IF EXISTS volunteer_usage_resolve_volunteer ON volunteer_usage;
+CREATE TRIGGER volunteer_usage_resolve_volunteer
+    BEFORE INSERT OR UPDATE OF name ON volunteer_usage
+    FOR EACH ROW EXECUTE FUNCTION resolve_volunteer_id();
+
+-- 分批回填已有记录的 volunteer_id，每张表每次最多处理 batch_size 行
+-- 返回本次更新的行数和剩余未回填的行数；batch_size 为0时只统计
+CREATE OR REPLACE FUNCTION backfill_volunteer_ids(batch_size INTEGER DEFAULT 5000)
+RETURNS TABLE (
+    table_name TEXT,
+    updated BIGINT,
+    remaining BIGINT
+) AS $$
+DECLARE
+    points_updated BIGINT;
+    usage_updated BIGINT;
+BEGIN
+    -- 与 resolve_volunteer_id() 使用同一个锁创建志愿者
+    PERFORM pg_advisory_xact_lock(hashtext('volunteers'));
+
+    INSERT INTO volunteers (name)
+    SELECT DISTINCT batch.name
+    FROM (
+        SELECT vp.name FROM volunteer_points vp
+        WHERE vp.volunteer_id IS NULL AND vp.name IS NOT NULL
+        ORDER BY vp.id LIMIT batch_size
+    ) batch
+    ON CONFLICT (name) DO NOTHING;
+
+    UPDATE volunteer_points vp
+    SET volunteer_id = v.id
+    FROM (
+        SELECT inner_vp.id FROM volunteer_points inner_vp
+        WHERE inner_vp.volunteer_id IS NULL AND inner_vp.name IS NOT NULL
+        ORDER BY inner_vp.id LIMIT batch_size
+    ) batch, volunteers v
+    WHERE vp.id = batch.id AND v.name = vp.name;
+    GET DIAGNOSTICS points_updated = ROW_COUNT;
+
+    INSERT INTO volunteers (name)
+    SELECT DISTINCT batch.name
+    FROM (
+        SELECT vu.name FROM volunteer_usage vu
+        WHERE vu.volunteer_id IS NULL AND vu.name IS NOT NULL
+        ORDER BY vu.id LIMIT batch_size
+    ) batch
+    ON CONFLICT (name) DO NOTHING;
+
+    UPDATE volunteer_usage vu
+    SET volunteer_id = v.id
+    FROM (
+        SELECT inner_vu.id FROM volunteer_usage inner_vu
+        WHERE inner_vu.volunteer_id IS NULL AND inner_vu.name IS NOT NULL
+        ORDER BY inner_vu.id LIMIT batch_size
+    ) batch, volunteers v
+    WHERE vu.id = batch.id AND v.name = vu.name;
+    GET DIAGNOSTICS usage_updated = ROW_COUNT;
+
+    RETURN QUERY
+    SELECT 'volunteer_points'::TEXT, points_updated,
+           (SELECT COUNT(*) FROM volunteer_points vp WHERE vp.volunteer_id IS NULL AND vp.name IS NOT NULL)
+    UNION ALL
+    SELECT 'volunteer_usage'::TEXT, usage_updated,
+           (SELECT COUNT(*) FROM volunteer_usage vu WHERE vu.volunteer_id IS NULL AND vu.name IS NOT NULL);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 以定义者权限批量改写明细表，只允许服务角色（backfill-volunteers 命令）通过RPC调用
+REVOKE EXECUTE ON FUNCTION backfill_volunteer_ids(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION backfill_volunteer_ids(INTEGER) TO service_role;
+
+-- 7.4 热点查询的组合索引
+-- 按姓名过滤并按id分页（/api/points、/api/usage、/api/volunteer），INCLUDE 的列使按姓名求和只扫描索引
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_name_id ON volunteer_points (name, id) INCLUDE (score);
+CREATE INDEX IF NOT EXISTS idx_volunteer_usage_name_id ON volunteer_usage (name, id) INCLUDE (used_points, course_count);
+-- 按类别过滤并按id分页
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_category_id ON volunteer_points (category, id);
+-- volunteer_id 外键的索引：删除或合并志愿者时按 volunteer_id 查找明细，不扫描全表
+-- 余额表与汇总函数仍按姓名维护，见 SUPABASE_SETUP.md「表结构规范化」
+CREATE INDEX IF NOT EXISTS idx_volunteer_points_volunteer_id ON volunteer_points (volunteer_id) INCLUDE (score);
+CREATE INDEX IF NOT EXISTS idx_volunteer_usage_volunteer_id ON volunteer_usage (volunteer_id) INCLUDE (used_points, course_count);
+-- 被上面的 (name, id) 索引取代
+DROP INDEX IF EXISTS idx_volunteer_points_name;
+DROP INDEX IF EXISTS idx_volunteer_usage_name;
+
+-- 志愿者维表只由触发器和回填函数（定义者权限）写入，客户端只读；无效积分记录只对服务角色可见
+ALTER TABLE volunteers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE volunteer_points_invalid_score ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "允许公共读取志愿者" ON volunteers;
+CREATE POLICY "允许公共读取志愿者" ON volunteers
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "允许服务角色完全访问志愿者" ON volunteers;
+CREATE POLICY "允许服务角色完全访问志愿者" ON volunteers
+    FOR ALL USING (auth.role() = 'service_role');
+
+DROP POLICY IF EXISTS "允许服务角色完全访问无效积分记录" ON volunteer_points_invalid_score;
+CREATE POLICY "允许服务角色完全访问无效积分记录" ON volunteer_points_invalid_score
+    FOR ALL USING (auth.role() = 'service_role');
+
+-- 8. 插入一些测试数据（可选）
 -- INSERT INTO volunteer_points (activity_type, activity_time_name, category, name, score) 
 -- VALUES 
---     ('线下活动', '测试活动', '志愿服务', '测试用户', 10),
---     ('线上直播', '在线讲座', '技术分享', '测试用户', 5);
+--     ('线下活动', '测试活动', '签到', '测试用户', 10),
+--     ('线上直播', '在线讲座', '直播助手', '测试用户', 5);
 
 -- INSERT INTO volunteer_usage (name, used_points, course_count) 
 -- VALUES 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+内存列式存储测试 - 字典编码、原子追加、等值过滤与分组汇总
+
+    python test_columnar.py
+"""
+
+import sys
+import threading
+
+from db.columnar import ColumnStore, Dictionary
+
+def _points(dictionaries=None):
+    return ColumnStore(['name', 'activity_type', 'score'], integer_fields=('score',), key='name',
+                       dictionaries=dictionaries)
+
+def test_dictionary_encoding():
+    """相同的值只保存一次，未出现过的值查不到编号"""
+    names = Dictionary()
+    assert names.encode("张三") == 0
+    assert names.encode("李四") == 1
+    assert names.encode("张三") == 0
+    assert names.values == ["张三", "李四"] and len(names) == 2
+    assert names.lookup("李四") == 1
+    assert names.lookup("王五") is None
+
+def test_rows_round_trip():
+    """追加的行按 fields 顺序读回，缺少的整数列为0"""
+    store = _points()
+    assert store.extend([["张三", "社区服务", 5], ["李四", "环保活动", "3"], ["张三", None]]) == 3
+    assert len(store) == 3
+    assert list(store) == [["张三", "社区服务", 5], ["李四", "环保活动", 3], ["张三", None, 0]]
+    assert store.value('activity_type', 1) == "环保活动"
+
+def test_extend_is_atomic():
+    """任一行的整数列无法转换时不写入任何一行"""
+    store = _points()
+    store.extend([["张三", "社区服务", 5]])
+    try:
+        store.extend([["李四", "社区服务", 2], ["王五", "社区服务", "abc"]])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("无法转换的整数列应抛出 ValueError")
+    assert len(store) == 1
+    assert store.groups() == {"张三": {'count': 1, 'score': 5}}
+    assert store.group("李四") is None
+
+def test_matches():
+    """等值过滤比较字符串列的编号和整数列的值"""
+    store = _points()
+    store.extend([["张三", "社区服务", 5], ["李四", "环保活动", 3]])
+    assert store.matches(0, {'name': "张三", 'score': 5})
+    assert not store.matches(0, {'name': "张三", 'score': 3})
+    assert not store.matches(1, {'activity_type': "社区服务"})
+    assert not store.matches(0, {'name': "从未出现"})
+
+def test_groups():
+    """分组汇总与逐行累加的结果一致"""
+    store = _points()
+    store.extend([["张三", "社区服务", 5], ["李四", "环保活动", 3], ["张三", "环保活动", 2]])
+    assert store.groups() == {"张三": {'count': 2, 'score': 7}, "李四": {'count': 1, 'score': 3}}
+    assert store.group("张三") == {'count': 2, 'score': 7}
+    assert store.group("王五") is None
+
+def test_shared_dictionary():
+    """多张表共用姓名字典时，只在一张表出现的姓名不会出现在另一张表的分组中"""
+    names = Dictionary()
+    points = _points({'name': names})
+    usage = ColumnStore(['name', 'stars'], integer_fields=('stars',), key='name', dictionaries={'name': names})
+    points.extend([["张三", "社区服务", 5]])
+    usage.extend([["李四", 2], ["李四", 1]])
+    assert names.values == ["张三", "李四"]
+    assert usage.groups() == {"李四": {'count': 2, 'stars': 3}}
+    assert usage.group("张三") is None
+    assert points.groups() == {"张三": {'count': 1, 'score': 5}}
+
+def test_concurrent_extend():
+    """多个线程同时追加时行数与分组汇总不丢失"""
+    store = _points()
+
+    def worker(number):
+        for i in range(200):
+            store.extend([[f"志愿者{i % 10}", "社区服务", number]])
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) == 800
+    groups = store.groups()
+    assert sum(group['count'] for group in groups.values()) == 800
+    assert sum(group['score'] for group in groups.values()) == 200 * (1 + 2 + 3 + 4)
+
+def test_nbytes():
+    """整数列每行8字节，字典编码列每行4字节"""
+    store = _points()
+    store.extend([["张三", "社区服务", 5], ["李四", "环保活动", 3]])
+    # 2行 x (4 + 4 + 8) 字节，加上2个分组的行数与分数之和
+    assert store.nbytes() == 2 * 16 + 2 * 8 + 2 * 8
+
+TESTS = (test_dictionary_encoding, test_rows_round_trip, test_extend_is_atomic, test_matches, test_groups,
+         test_shared_dictionary, test_concurrent_extend, test_nbytes)
+
+def main():
+    """运行所有测试"""
+    print("🚀 开始列式存储测试")
+    failed = False
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+幂等键测试 - 重复提交返回保存的响应，不同内容、处理中、过期和淘汰按规则处理
+
+    python test_idempotency.py
+"""
+
+import sys
+import threading
+import time
+
+from idempotency import IdempotencyStore
+
+def test_replay_returns_saved_response():
+    """同一个键和相同内容的重复请求返回保存的响应"""
+    store = IdempotencyStore()
+    assert store.begin('key-1', 'abc') == ('new', None)
+    store.complete('key-1', {"message": "成功提交"}, 201)
+    assert store.begin('key-1', 'abc') == ('replay', ({"message": "成功提交"}, 201))
+    assert store.begin('key-1', 'abc')[0] == 'replay'
+    assert store.stats()['replays'] == 2
+
+def test_mismatch():
+    """同一个键对应不同的请求内容时返回 mismatch"""
+    store = IdempotencyStore()
+    store.begin('key-1', 'abc')
+    store.complete('key-1', {}, 201)
+    assert store.begin('key-1', 'other') == ('mismatch', None)
+    assert store.stats()['replays'] == 0
+
+def test_concurrent_request_waits_for_first():
+    """前一个请求处理中时，后到的请求等待并取得同一个响应"""
+    store = IdempotencyStore(wait_timeout=5)
+    assert store.begin('key-1', 'abc')[0] == 'new'
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(store.begin('key-1', 'abc')))
+    waiter.start()
+    time.sleep(0.05)
+    store.complete('key-1', {"message": "成功提交"}, 201)
+    waiter.join(5)
+    assert results == [('replay', ({"message": "成功提交"}, 201))], results
+
+def test_in_progress_after_timeout():
+    """前一个请求超过 wait_timeout 仍未完成时返回 in_progress"""
+    store = IdempotencyStore(wait_timeout=0.05)
+    store.begin('key-1', 'abc')
+    assert store.begin('key-1', 'abc') == ('in_progress', None)
+
+def test_abort_allows_retry():
+    """处理失败调用 abort 后，同一个键可以重新提交，等待中的请求也改为重新处理"""
+    store = IdempotencyStore(wait_timeout=5)
+    store.begin('key-1', 'abc')
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(store.begin('key-1', 'abc')))
+    waiter.start()
+    time.sleep(0.05)
+    store.abort('key-1')
+    waiter.join(5)
+    assert results == [('new', None)], results
+    store.abort('key-1')
+    assert store.begin('key-1', 'other') == ('new', None)
+
+def test_expired_key_is_new():
+    """键过期后同一个键视为新请求"""
+    store = IdempotencyStore(ttl=0.05)
+    store.begin('key-1', 'abc')
+    store.complete('key-1', {}, 201)
+    time.sleep(0.1)
+    assert store.begin('key-1', 'other') == ('new', None)
+
+def test_max_keys_evicts_oldest():
+    """键数超过 max_keys 时淘汰最早的已完成的键"""
+    store = IdempotencyStore(max_keys=2)
+    for key in ('key-1', 'key-2', 'key-3'):
+        store.begin(key, 'abc')
+        store.complete(key, {}, 201)
+    assert store.stats()['keys'] == 2
+    assert store.begin('key-1', 'abc')[0] == 'new'
+    assert store.begin('key-3', 'abc')[0] == 'replay'
+
+def test_in_progress_keys_are_not_evicted():
+    """键数达到上限时不淘汰正在处理的键，全部在处理中时拒绝新的键"""
+    store = IdempotencyStore(max_keys=2, wait_timeout=0.05)
+    store.begin('key-1', 'abc')
+    store.begin('key-2', 'abc')
+    assert store.begin('key-3', 'abc') == ('full', None)
+    assert store.begin('key-1', 'abc') == ('in_progress', None)
+
+    store.complete('key-2', {}, 201)
+    assert store.begin('key-3', 'abc') == ('new', None)
+    store.complete('key-1', {"message": "成功提交"}, 201)
+    assert store.begin('key-1', 'abc') == ('replay', ({"message": "成功提交"}, 201))
+
+TESTS = (test_replay_returns_saved_response, test_mismatch, test_concurrent_request_waits_for_first,
+         test_in_progress_after_timeout, test_abort_allows_retry, test_expired_key_is_new,
+         test_max_keys_evicts_oldest, test_in_progress_keys_are_not_evicted)
+
+def main():
+    """运行所有测试"""
+    print("🚀 开始幂等键测试")
+    failed = False
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
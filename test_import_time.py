@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+冷启动导入时间测试 - 用 python -X importtime 测量导入Vercel入口 api/index.py 的耗时
+
+导入时不应加载 supabase、pypinyin、openpyxl、pyarrow、pandas 等较重的包，它们只在
+第一次访问数据、构建姓名索引或导出时才导入；总耗时不超过 IMPORT_TIME_BUDGET_MS。
+
+    python test_import_time.py
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENTRY_MODULE = "api.index"
+
+# 导入入口时允许的累计耗时（毫秒），在较慢的机器上可通过环境变量放宽
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "800"))
+
+# 冷启动时不应导入的包
+LAZY_PACKAGES = ["supabase", "postgrest", "httpx", "pypinyin", "openpyxl", "pyarrow", "pandas"]
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+def measure_import():
+    """在新进程中导入入口模块，返回 {模块名: 累计耗时(微秒)}"""
+    env = dict(os.environ)
+    # 模拟生产环境配置了Supabase的情况，客户端应延迟到第一次访问数据时创建
+    env.setdefault("SUPABASE_URL", "https://example.supabase.co")
+    env.setdefault("SUPABASE_SERVICE_KEY", "import-time-test-key")
+    env.setdefault("DB_MODE", "supabase")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {ENTRY_MODULE}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {ENTRY_MODULE} 失败:\n{result.stderr}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+def test_lazy_packages():
+    """冷启动时不导入较重的可选依赖"""
+    modules = measure_import()
+    loaded = sorted({name.split(".")[0] for name in modules} & set(LAZY_PACKAGES))
+    assert not loaded, f"导入 {ENTRY_MODULE} 时加载了应延迟导入的包: {', '.join(loaded)}"
+
+def test_import_time_budget():
+    """导入入口模块的累计耗时不超过预算"""
+    modules = measure_import()
+    total_ms = modules[ENTRY_MODULE] / 1000
+    print(f"   导入 {ENTRY_MODULE} 耗时 {total_ms:.1f} ms（预算 {IMPORT_TIME_BUDGET_MS:.0f} ms）")
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[1:6]
+    for name, micros in slowest:
+        print(f"     {name}: {micros / 1000:.1f} ms")
+    assert total_ms <= IMPORT_TIME_BUDGET_MS, \
+        f"导入 {ENTRY_MODULE} 耗时 {total_ms:.1f} ms，超过预算 {IMPORT_TIME_BUDGET_MS:.0f} ms"
+
+def main():
+    """运行所有测试"""
+    print("🚀 开始冷启动导入时间测试")
+    failed = False
+    for test in (test_lazy_packages, test_import_time_budget):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {e}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+接口测试 - 用 Flask test_client() 和内存存储（FLASK_ENV=testing）检查各接口的行为
+
+内存存储在同一进程中共用，各测试使用不同的志愿者姓名。
+
+    python test_routes.py
+"""
+
+import importlib
+import os
+import sys
+import uuid
+
+def _app_module():
+    """以测试配置导入 app，导入后恢复 FLASK_ENV，不影响其它测试
+
+    配置在导入时确定：其它测试（例如导入 db.columnar）可能已按默认配置导入了
+    config 和 db，先移除它们，确保 app 使用内存存储而不会写入本地数据库文件。
+    """
+    if 'app' in sys.modules:
+        return sys.modules['app']
+    previous = os.environ.get('FLASK_ENV')
+    os.environ['FLASK_ENV'] = 'testing'
+    try:
+        for name in list(sys.modules):
+            if name == 'config' or name == 'db' or name.startswith('db.'):
+                del sys.modules[name]
+        module = importlib.import_module('app')
+        assert module.config.DB_MODE == 'memory', f"接口测试应使用内存存储，实际为 {module.config.DB_MODE}"
+        return module
+    finally:
+        if previous is None:
+            os.environ.pop('FLASK_ENV', None)
+        else:
+            os.environ['FLASK_ENV'] = previous
+
+def _client():
+    return _app_module().app.test_client()
+
+def _unique(prefix):
+    return f"{prefix}{uuid.uuid4().hex[:8]}"
+
+def _activity(name, score=5, activity_type='线下活动', category='社区服务'):
+    return [activity_type, '2024春季活动', category, name, str(score)]
+
+def _get(client, url, **kwargs):
+    """GET 并读完响应体；流式响应未读完就被回收时会在请求上下文之外关闭"""
+    response = client.get(url, **kwargs)
+    response.get_data()
+    response.close()
+    return response
+
+def _total_score(client, name):
+    return _get(client, f'/api/volunteer/{name}').get_json().get('total_score', 0)
+
+def test_submit_rejects_non_object_body():
+    """提交的JSON不是对象（数组、字符串、数字）时返回400"""
+    client = _client()
+    for body in ('[1, 2]', '"abc"', '5', '{}'):
+        response = client.post('/api/submit', data=body, content_type='application/json')
+        assert response.status_code == 400, (body, response.status_code)
+        assert response.get_json()['message'] == "无效的数据格式"
+
+def test_idempotent_replay():
+    """同一个 Idempotency-Key 的重复提交返回第一次的响应，数据只写入一次"""
+    client = _client()
+    name = _unique("幂等")
+    payload = {'activityData': [_activity(name)], 'usageData': []}
+    headers = {'Idempotency-Key': _unique('key-')}
+    first = client.post('/api/submit', json=payload, headers=headers)
+    second = client.post('/api/submit', json=payload, headers=headers)
+    assert first.status_code == 200, first.get_data(as_text=True)
+    assert second.status_code == 200 and second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.get_json() == first.get_json()
+    assert _total_score(client, name) == 5
+
+    other = client.post('/api/submit', json={'activityData': [_activity(name, 3)]}, headers=headers)
+    assert other.status_code == 422
+
+def test_error_after_write_is_not_rewritten():
+    """写入后刷新缓存等步骤出错时保存响应，用同一个键重试不再写入"""
+    module = _app_module()
+    client = module.app.test_client()
+    name = _unique("写入后出错")
+    payload = {'activityData': [_activity(name)], 'usageData': []}
+    headers = {'Idempotency-Key': _unique('key-')}
+    original = module._after_commit
+
+    def broken_after_commit(records):
+        original(records)
+        raise RuntimeError("刷新缓存失败")
+
+    module._after_commit = broken_after_commit
+    try:
+        first = client.post('/api/submit', json=payload, headers=headers)
+    finally:
+        module._after_commit = original
+    assert first.status_code == 500
+    retry = client.post('/api/submit', json=payload, headers=headers)
+    assert retry.status_code == 500 and retry.headers.get('Idempotent-Replayed') == 'true'
+    assert _total_score(client, name) == 5
+
+def test_error_before_write_allows_retry():
+    """开始写入前出错时删除键，用同一个键重试可以正常写入"""
+    module = _app_module()
+    client = module.app.test_client()
+    name = _unique("写入前出错")
+    payload = {'activityData': [_activity(name)], 'usageData': []}
+    headers = {'Idempotency-Key': _unique('key-')}
+    original = module._prepare_activity_records
+
+    def broken_prepare(rows):
+        raise RuntimeError("校验失败")
+
+    module._prepare_activity_records = broken_prepare
+    try:
+        assert client.post('/api/submit', json=payload, headers=headers).status_code == 500
+    finally:
+        module._prepare_activity_records = original
+    retry = client.post('/api/submit', json=payload, headers=headers)
+    assert retry.status_code == 200 and 'Idempotent-Replayed' not in retry.headers
+    assert _total_score(client, name) == 5
+
+def test_ledger_keyset_pagination():
+    """明细接口按 next_cursor 翻页，每条记录只出现一次"""
+    client = _client()
+    name = _unique("分页")
+    rows = [_activity(name, score) for score in range(1, 6)]
+    assert client.post('/api/submit', json={'activityData': rows, 'usageData': []}).status_code == 200
+
+    for order in ('asc', 'desc'):
+        scores = []
+        cursor = None
+        while True:
+            query = {'name': name, 'limit': 2, 'order': order}
+            if cursor is not None:
+                query['cursor'] = cursor
+            page = client.get('/api/points', query_string=query).get_json()
+            assert len(page['items']) <= 2
+            scores.extend(item['score'] for item in page['items'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        expected = [1, 2, 3, 4, 5]
+        assert scores == (expected if order == 'asc' else expected[::-1]), (order, scores)
+
+def test_ledger_rejects_bad_arguments():
+    """明细接口的 cursor 为负数、limit 或 order 非法时返回400"""
+    client = _client()
+    for query in ({'cursor': -3}, {'cursor': -3, 'order': 'desc'}, {'cursor': 'abc'}, {'limit': 0},
+                  {'order': 'sideways'}):
+        response = client.get('/api/points', query_string=query)
+        assert response.status_code == 400, (query, response.status_code)
+        assert "参数错误" in response.get_json()['error']
+
+def test_ledger_enum_filters():
+    """活动类型和类别过滤只接受页面中的可选值，未知值返回400，合法值正常过滤"""
+    client = _client()
+    name = _unique("类别")
+    rows = [_activity(name, 1, '线下活动', '场务'), _activity(name, 2, '线上直播', '直播助手')]
+    client.post('/api/submit', json={'activityData': rows, 'usageData': []})
+
+    for query in ({'activity_type': '线下'}, {'category': '不存在的类别'}):
+        response = _get(client, '/api/points', query_string=query)
+        assert response.status_code == 400, query
+        assert "必须为" in response.get_json()['error']
+
+    page = _get(client, '/api/points', query_string={'name': name, 'category': '直播助手'}).get_json()
+    assert [item['score'] for item in page['items']] == [2]
+    page = _get(client, '/api/points', query_string={'name': name, 'activity_type': '线下活动'}).get_json()
+    assert [item['score'] for item in page['items']] == [1]
+
+def test_summary_and_export_etags():
+    """汇总与导出接口返回 ETag，If-None-Match 匹配时返回304，数据变化后 ETag 随之变化"""
+    client = _client()
+    client.post('/api/submit', json={'activityData': [_activity(_unique("缓存"))], 'usageData': []})
+    endpoints = ('/api/get_summary', '/api/get_usage_summary', '/api/get_complete_summary',
+                 '/api/export_db?format=csv', '/api/export_volunteer_summary?format=csv')
+    etags = {}
+    for url in endpoints:
+        response = _get(client, url)
+        assert response.status_code == 200, url
+        etag = response.headers.get('ETag')
+        assert etag, f"{url} 没有返回 ETag"
+        etags[url] = etag
+        cached = _get(client, url, headers={'If-None-Match': etag})
+        assert cached.status_code == 304 and cached.get_data() == b'', url
+        assert _get(client, url, headers={'If-None-Match': '"other"'}).status_code == 200, url
+
+    name = _unique("缓存")
+    client.post('/api/submit', json={'activityData': [_activity(name)], 'usageData': [[name, '1', '1']]})
+    for url, etag in etags.items():
+        response = _get(client, url, headers={'If-None-Match': etag})
+        assert response.status_code == 200, f"{url} 数据变化后仍返回304"
+        assert response.headers.get('ETag') != etag, url
+
+def test_csv_export_streams_rows():
+    """CSV导出分块流式返回，带UTF-8 BOM，表头与Excel一致并包含提交的记录"""
+    from exports import ACTIVITY_COLUMNS, SUMMARY_COLUMNS
+
+    client = _client()
+    name = _unique("导出")
+    client.post('/api/submit', json={'activityData': [_activity(name, 7)], 'usageData': []})
+    for url, columns, expected in (('/api/export_db?format=csv', ACTIVITY_COLUMNS, f"{name},7"),
+                                   ('/api/export_volunteer_summary?format=csv', SUMMARY_COLUMNS, f"{name},7")):
+        response = client.get(url)
+        assert response.status_code == 200 and response.is_streamed, url
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers.get('Content-Disposition', '')
+        body = response.get_data()
+        response.close()
+        assert body.startswith(b'\xef\xbb\xbf'), "CSV缺少UTF-8 BOM"
+        lines = body.decode('utf-8-sig').splitlines()
+        assert lines[0] == ','.join(header for _, header in columns), lines[0]
+        assert any(line.endswith(expected) for line in lines[1:]), f"{url} 中没有提交的记录"
+
+def test_parquet_export():
+    """Parquet导出的列名与Excel表头一致（未安装 pyarrow 时跳过）"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("   未安装 pyarrow，跳过")
+        return
+    import io
+    from exports import ACTIVITY_COLUMNS
+
+    client = _client()
+    name = _unique("导出")
+    client.post('/api/submit', json={'activityData': [_activity(name, 4)], 'usageData': []})
+    response = _get(client, '/api/export_db?format=parquet')
+    assert response.status_code == 200 and response.mimetype == 'application/vnd.apache.parquet'
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    assert table.column_names == [header for _, header in ACTIVITY_COLUMNS]
+    rows = table.to_pylist()
+    assert {'姓名': name, '积分': 4}.items() <= next(row for row in rows if row['姓名'] == name).items()
+
+def test_export_rejects_unknown_format():
+    """不支持的导出格式返回400"""
+    client = _client()
+    for url in ('/api/export_db?format=xml', '/api/export_volunteer_summary?format=xml'):
+        response = _get(client, url)
+        assert response.status_code == 400 and "不支持的导出格式" in response.get_json()['error'], url
+
+def _upload(client, content, filename, query=''):
+    import io
+    return client.post(f'/api/import{query}', data={'file': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+def test_import_csv():
+    """导入CSV：dry_run 只校验不写入，非法行列出行号与原因且不写入"""
+    client = _client()
+    valid, invalid_category, invalid_score = _unique("导入"), _unique("导入"), _unique("导入")
+    # 列顺序与活动总览表不同
+    content = "\n".join([
+        "姓名,积分,活动类型,活动时间与名称,类别",
+        f"{valid},3,线下活动,春季,海报",
+        f"{invalid_category},2,线上直播,春季,签到",
+        f"{invalid_score},-1,线下活动,春季,海报"
+    ]).encode('utf-8-sig')
+
+    checked = _upload(client, content, '活动.csv', '?dry_run=true').get_json()
+    assert checked['dry_run'] and checked['imported_rows'] == 0
+    assert (checked['total_rows'], checked['valid_rows'], checked['error_count']) == (3, 1, 2)
+    assert [error['row'] for error in checked['errors']] == [3, 4]
+    assert _total_score(client, valid) == 0
+
+    imported = _upload(client, content, '活动.csv').get_json()
+    assert imported['imported_rows'] == 1 and not imported['success']
+    assert _total_score(client, valid) == 3
+    assert _total_score(client, invalid_category) == 0 and _total_score(client, invalid_score) == 0
+
+def test_import_xlsx():
+    """导入Excel文件（未安装 openpyxl 时跳过）"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        print("   未安装 openpyxl，跳过")
+        return
+    import io
+
+    name = _unique("导入")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['活动类型', '活动时间与名称', '类别', '姓名', '积分'])
+    sheet.append(['线上直播', '春季直播', '视频剪辑', name, 6])
+    content = io.BytesIO()
+    workbook.save(content)
+
+    client = _client()
+    result = _upload(client, content.getvalue(), '活动.xlsx').get_json()
+    assert result['success'] and result['imported_rows'] == 1, result
+    assert _total_score(client, name) == 6
+
+def test_import_rejects_bad_requests():
+    """未上传文件或格式不支持时返回400"""
+    client = _client()
+    response = client.post('/api/import', data={}, content_type='multipart/form-data')
+    assert response.status_code == 400 and "file" in response.get_json()['error']
+    response = _upload(client, b'x', '活动.txt')
+    assert response.status_code == 400 and "不支持的导入格式" in response.get_json()['error']
+
+def _metric(client, sample):
+    """/api/metrics 中某个样本（指标名加标签）的值，不存在时为0"""
+    for line in _get(client, '/api/metrics').get_data(as_text=True).splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+def test_metrics_endpoint():
+    """/api/metrics 以 Prometheus 文本格式输出按路由统计的请求数、耗时与存储后端调用"""
+    client = _client()
+    requests_total = 'volunteer_http_requests_total{route="/api/leaderboard",method="GET",status="200"}'
+    duration_count = 'volunteer_http_request_duration_seconds_count{route="/api/leaderboard",method="GET"}'
+    before = _metric(client, requests_total)
+    for _ in range(2):
+        assert _get(client, '/api/leaderboard').status_code == 200
+    assert _metric(client, requests_total) == before + 2
+    assert _metric(client, duration_count) >= 2
+
+    response = _get(client, '/api/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE volunteer_http_request_duration_seconds histogram' in text
+    assert 'volunteer_db_call_duration_seconds_count{backend="memory"' in text
+
+    routes = _get(client, '/api/health').get_json()['metrics']['routes']
+    assert routes['GET /api/leaderboard']['count'] >= 2
+
+def test_request_id():
+    """请求编号取自 X-Request-ID 并在响应头中返回，过长时重新生成，请求中的日志带有同一个编号"""
+    import logging
+    from logging_setup import get_request_id
+
+    class RecordingHandler(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.WARNING)
+            self.request_ids = []
+
+        def emit(self, record):
+            self.request_ids.append(get_request_id())
+
+    client = _client()
+    handler = RecordingHandler()
+    logging.getLogger().addHandler(handler)
+    try:
+        response = _get(client, '/api/not-found', headers={'X-Request-ID': 'trace-123'})
+    finally:
+        logging.getLogger().removeHandler(handler)
+    assert response.status_code == 404
+    assert response.headers['X-Request-ID'] == 'trace-123'
+    assert handler.request_ids and set(handler.request_ids) == {'trace-123'}, handler.request_ids
+    assert get_request_id() == '-', "请求结束后未清除请求编号"
+
+    generated = _get(client, '/api/health', headers={'X-Request-ID': 'x' * 500}).headers['X-Request-ID']
+    assert len(generated) == 32 and generated != 'x' * 500
+    assert _get(client, '/api/health').headers['X-Request-ID'] != generated
+
+def test_json_log_format():
+    """JSON日志每行一个对象，包含请求编号，过长的消息和附加字段被缩减"""
+    import json
+    import logging
+    from logging_setup import JsonFormatter
+
+    record = logging.LogRecord('app', logging.INFO, __file__, 1, "收到提交 %s", ("x" * 50,), None)
+    record.request_id = 'trace-123'
+    record.payload = {'activityData': [[i] for i in range(100)]}
+    entry = json.loads(JsonFormatter(max_message_chars=20).format(record))
+    assert entry['level'] == 'INFO' and entry['logger'] == 'app' and entry['request_id'] == 'trace-123'
+    assert entry['message'].startswith("收到提交 xxx") and "(共55字符)" in entry['message']
+    assert entry['payload'] == {'activityData': {'count': 100, 'sample': [[0], [1], [2]]}}
+
+def test_leaderboard():
+    """排行榜按积分取前几名，积分相同的名次相同并按姓名排序，参数非法时返回400"""
+    client = _client()
+    # 积分远高于其它测试提交的记录，确保占据前几名
+    prefix = _unique("排行")
+    first, second, third = f"{prefix}甲", f"{prefix}乙", f"{prefix}丙"
+    rows = [_activity(first, 9000), _activity(second, 9000), _activity(third, 8000)]
+    client.post('/api/submit', json={'activityData': rows, 'usageData': [[second, '2000', '1']]})
+
+    response = _get(client, '/api/leaderboard', query_string={'limit': 3})
+    assert response.status_code == 200 and response.headers.get('ETag')
+    board = response.get_json()
+    assert board['by'] == 'total' and board['volunteer_count'] >= 3
+    tied = sorted([first, second])
+    assert [(leader['name'], leader['rank']) for leader in board['leaders']] == [(tied[0], 1), (tied[1], 1), (third, 3)]
+
+    board = _get(client, '/api/leaderboard', query_string={'by': 'remaining', 'limit': 2}).get_json()
+    assert [leader['name'] for leader in board['leaders']] == [first, third]
+    assert board['leaders'][0]['remaining_score'] == 9000
+
+    for query in ({'by': 'score'}, {'limit': 'abc'}):
+        assert _get(client, '/api/leaderboard', query_string=query).status_code == 400, query
+
+def test_complete_summary_sorting():
+    """完整汇总支持服务端排序和分页，X-Total-Count 为志愿者总数；不带参数时返回全部"""
+    client = _client()
+    everyone = _get(client, '/api/get_complete_summary').get_json()
+    total = len(everyone)
+
+    response = _get(client, '/api/get_complete_summary', query_string={'sort': 'total_score'})
+    ranked = response.get_json()
+    assert int(response.headers['X-Total-Count']) == total == len(ranked)
+    assert [row['total_score'] for row in ranked] == sorted((row['total_score'] for row in ranked), reverse=True)
+
+    page = _get(client, '/api/get_complete_summary',
+                query_string={'sort': 'total_score', 'offset': 1, 'limit': 2}).get_json()
+    assert page == ranked[1:3]
+
+    by_name = _get(client, '/api/get_complete_summary', query_string={'sort': 'name', 'order': 'desc'}).get_json()
+    assert [row['name'] for row in by_name] == sorted((row['name'] for row in everyone), reverse=True)
+
+    for query in ({'sort': 'bogus'}, {'sort': 'name', 'order': 'up'}, {'offset': -1}):
+        assert _get(client, '/api/get_complete_summary', query_string=query).status_code == 400, query
+
+TESTS = (test_submit_rejects_non_object_body, test_idempotent_replay, test_error_after_write_is_not_rewritten,
+         test_error_before_write_allows_retry, test_ledger_keyset_pagination, test_ledger_rejects_bad_arguments,
+         test_ledger_enum_filters, test_summary_and_export_etags, test_csv_export_streams_rows,
+         test_parquet_export, test_export_rejects_unknown_format, test_import_csv, test_import_xlsx,
+         test_import_rejects_bad_requests, test_metrics_endpoint, test_request_id,
+         test_json_log_format, test_leaderboard, test_complete_summary_sorting)
+
+def main():
+    """运行所有测试"""
+    print("🚀 开始接口测试")
+    failed = False
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+后台写入队列测试 - 多个进程共用日志文件时每个提交只写入一次，被拒绝的提交按次数重试，
+结果未知的提交不重新写入
+
+    python test_write_queue.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from write_queue import WriteQueue
+
+def _records(name, rows=1):
+    return {'volunteer_points': [{'name': name, 'score': 1} for _ in range(rows)], 'volunteer_usage': []}
+
+class Rejected(Exception):
+    """模拟数据库明确拒绝写入（没有写入任何行）"""
+
+def _rejected(error):
+    return isinstance(error, Rejected)
+
+class RecordingInsert:
+    """记录写入的行，可按调用次数模拟失败
+
+    failures 次调用抛出 error；error 为 ConnectionError 时模拟写入后连接中断，
+    行已经写入但调用方收到错误。
+    """
+
+    def __init__(self, failures=0, delay=0.0, error=Rejected):
+        self.rows = []
+        self.calls = 0
+        self.failures = failures
+        self.delay = delay
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, table, records):
+        with self._lock:
+            self.calls += 1
+            failing = self.calls <= self.failures
+        if failing and self.error is not ConnectionError:
+            raise self.error("数据库拒绝写入")
+        time.sleep(self.delay)
+        with self._lock:
+            self.rows.extend(records)
+        if failing:
+            raise ConnectionError("写入后连接中断")
+        return len(records)
+
+def _wait_done(queue, ids, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(queue.status(submission_id)['status'] in ('done', 'failed') for submission_id in ids):
+            return
+        time.sleep(0.02)
+    raise AssertionError("写入队列未在规定时间内处理完所有提交")
+
+def _with_queue_file(test):
+    def run():
+        directory = tempfile.mkdtemp()
+        try:
+            test(os.path.join(directory, 'write_queue.db'))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+@_with_queue_file
+def test_two_consumers_commit_once(path):
+    """两个写入队列共用一个日志文件时，每个提交只写入一次"""
+    insert = RecordingInsert(delay=0.005)
+    first = WriteQueue(path, insert, flush_interval=0.01, batch_rows=5)
+    second = WriteQueue(path, insert, flush_interval=0.01, batch_rows=5)
+    try:
+        ids = [first.enqueue(_records(f"志愿者{i}")) for i in range(60)]
+        second.start()
+        _wait_done(first, ids)
+        names = [row['name'] for row in insert.rows]
+        assert len(names) == 60, f"写入 {len(names)} 行，应为60行"
+        assert len(set(names)) == 60, "同一个提交被写入了多次"
+        assert first.stats()['done'] == 60
+    finally:
+        first.stop()
+        second.stop()
+
+@_with_queue_file
+def test_expired_lease_is_requeued(path):
+    """认领提交的进程退出后，租约到期的提交由其它进程继续写入"""
+    crashed = WriteQueue(path, RecordingInsert(), lease_seconds=0.2)
+    crashed.start = lambda: None
+    submission_id = crashed.enqueue(_records("张三"))
+    # 模拟进程在认领后、写入前退出
+    claimed = crashed._due()
+    assert [submission['id'] for submission in claimed] == [submission_id]
+
+    insert = RecordingInsert()
+    survivor = WriteQueue(path, insert, flush_interval=0.01)
+    try:
+        assert survivor._due() == [], "租约未到期的提交不应被其它进程认领"
+        assert survivor.status(submission_id)['status'] == 'queued'
+        time.sleep(0.3)
+        survivor.start()
+        _wait_done(survivor, [submission_id])
+        assert survivor.status(submission_id)['status'] == 'done'
+        assert len(insert.rows) == 1
+    finally:
+        survivor.stop()
+
+@_with_queue_file
+def test_retry_then_fail(path):
+    """写入失败时按次数重试，超过 max_attempts 后标记为 failed"""
+    insert = RecordingInsert(failures=1)
+    queue = WriteQueue(path, insert, flush_interval=0.01, backoff=0.01, max_attempts=3, rejected=_rejected)
+    try:
+        retried = queue.enqueue(_records("李四"))
+        _wait_done(queue, [retried])
+        status = queue.status(retried)
+        assert status['status'] == 'done' and status['attempts'] == 1, status
+
+        insert.failures = insert.calls + 10
+        failed = queue.enqueue(_records("王五"))
+        _wait_done(queue, [failed])
+        status = queue.status(failed)
+        assert status['status'] == 'failed' and status['attempts'] == 3, status
+        assert "数据库拒绝写入" in status['error']
+        assert insert.rows == [{'name': "李四", 'score': 1}]
+    finally:
+        queue.stop()
+
+@_with_queue_file
+def test_ambiguous_error_is_not_retried(path):
+    """写入后连接中断等结果未知的错误不重试，提交标记为 failed 并注明需要核对"""
+    insert = RecordingInsert(failures=1, error=ConnectionError)
+    queue = WriteQueue(path, insert, flush_interval=0.01, backoff=0.01, max_attempts=3, rejected=_rejected)
+    try:
+        submission_id = queue.enqueue(_records("孙七"))
+        _wait_done(queue, [submission_id])
+        time.sleep(0.1)
+        status = queue.status(submission_id)
+        assert status['status'] == 'failed' and status['attempts'] == 1, status
+        assert "请核对" in status['error']
+        assert insert.calls == 1 and len(insert.rows) == 1, "结果未知的提交不应重新写入"
+    finally:
+        queue.stop()
+
+@_with_queue_file
+def test_ambiguous_group_error_is_not_split(path):
+    """合并提交结果未知时不改为逐个提交，组内所有提交都不重新写入"""
+    insert = RecordingInsert(failures=1, error=ConnectionError)
+    queue = WriteQueue(path, insert, flush_interval=0.01, rejected=_rejected)
+    queue.start = lambda: None
+    ids = [queue.enqueue(_records(f"志愿者{i}")) for i in range(3)]
+    queue._flush()
+    assert [queue.status(submission_id)['status'] for submission_id in ids] == ['failed'] * 3
+    assert insert.calls == 1 and len(insert.rows) == 3
+
+@_with_queue_file
+def test_on_commit_error_does_not_rewrite(path):
+    """写入成功后 on_commit 出错只记录日志，提交仍为 done，不重新写入"""
+    insert = RecordingInsert()
+
+    def broken_on_commit(records):
+        raise RuntimeError("刷新缓存失败")
+
+    queue = WriteQueue(path, insert, on_commit=broken_on_commit, flush_interval=0.01, backoff=0.01,
+                       rejected=_rejected)
+    try:
+        submission_id = queue.enqueue(_records("周八"))
+        _wait_done(queue, [submission_id])
+        time.sleep(0.1)
+        assert queue.status(submission_id)['status'] == 'done'
+        assert insert.calls == 1
+    finally:
+        queue.stop()
+
+@_with_queue_file
+def test_slow_commit_keeps_lease(path):
+    """写入耗时超过租约时定期续租，其它进程不会重新认领并重复写入"""
+    insert = RecordingInsert(delay=0.6)
+    slow = WriteQueue(path, insert, flush_interval=0.01, lease_seconds=0.2)
+    other = WriteQueue(path, insert, flush_interval=0.01, lease_seconds=0.2)
+    try:
+        submission_id = slow.enqueue(_records("吴九"))
+        time.sleep(0.3)
+        other.start()
+        _wait_done(slow, [submission_id])
+        # 等待可能重复认领的写入完成
+        time.sleep(0.8)
+        assert slow.status(submission_id)['status'] == 'done'
+        assert len(insert.rows) == 1, f"写入 {len(insert.rows)} 次，应为1次"
+    finally:
+        slow.stop()
+        other.stop()
+
+@_with_queue_file
+def test_resume_after_restart(path):
+    """进程重启后，日志中未写入的提交继续写入"""
+    stopped = WriteQueue(path, RecordingInsert())
+    stopped.start = lambda: None  # 不启动后台线程，提交留在日志中
+    submission_id = stopped.enqueue(_records("赵六", rows=3))
+
+    insert = RecordingInsert()
+    restarted = WriteQueue(path, insert, flush_interval=0.01)
+    try:
+        restarted.start()
+        _wait_done(restarted, [submission_id])
+        assert len(insert.rows) == 3
+    finally:
+        restarted.stop()
+
+TESTS = (test_two_consumers_commit_once, test_expired_lease_is_requeued, test_retry_then_fail,
+         test_ambiguous_error_is_not_retried, test_ambiguous_group_error_is_not_split,
+         test_on_commit_error_does_not_rewrite, test_slow_commit_keeps_lease, test_resume_after_restart)
+
+def main():
+    """运行所有测试"""
+    print("🚀 开始写入队列测试")
+    failed = False
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
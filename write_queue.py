@@ -0,0 +1,317 @@
+"""
+提交数据的后台写入队列模块
+"""
+import contextlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TABLES = ('volunteer_points', 'volunteer_usage')
+
+class WriteQueue:
+    """先写入本地SQLite日志再由后台线程批量提交到数据库的写入队列
+
+    enqueue() 把已校验的记录写入日志文件后立即返回提交编号；后台线程把排队中的多个
+    提交合并为每张表一条多行 INSERT（组提交），成功后标记为 done。合并提交失败时
+    改为逐个提交以找出出错的提交，出错的提交按指数退避加抖动重试，超过
+    max_attempts 次后标记为 failed。每张表的写入进度单独记录，重试不会重复写入已
+    成功的表。进程重启后日志中未完成的提交会继续写入。
+
+    只有 rejected(error) 为True（数据库明确拒绝、没有写入任何行）的错误才会逐个
+    提交或重试；超时、连接中断等结果未知的错误可能发生在写入之后，相关提交直接
+    标记为 failed 并注明需要核对，不再重新写入。未提供 rejected 时所有错误都按
+    结果未知处理。
+
+    多个进程（例如多个 gunicorn worker）可以共用同一个日志文件：后台线程先把提交
+    原子地标记为 inflight 并记录自己的 owner 与租约到期时间，只写入自己认领的提交；
+    进程退出时未完成的提交在租约（lease_seconds）到期后重新排队。写入期间每隔
+    lease_seconds / 3 秒续租，耗时较长的写入不会被其它进程重新认领。
+
+    insert(table, records) 为实际写入数据库的函数；on_commit(records) 在每次写入
+    成功后调用，用于刷新缓存，其中的错误只记录日志。
+    """
+
+    def __init__(self, path, insert, on_commit=None, batch_rows=500, flush_interval=0.2,
+                 max_attempts=5, backoff=1.0, retention=86400, lease_seconds=300, rejected=None):
+        self.path = path
+        self.insert = insert
+        self.rejected = rejected
+        self.on_commit = on_commit
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retention = retention
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._stopping = False
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS submissions (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                points_done INTEGER NOT NULL DEFAULT 0,
+                usage_done INTEGER NOT NULL DEFAULT 0,
+                activity_count INTEGER NOT NULL DEFAULT 0,
+                usage_count INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                committed_at REAL,
+                owner TEXT,
+                lease_until REAL
+            )
+        ''')
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(submissions)")}
+        for column, column_type in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE submissions ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    # 另一个进程同时升级了日志文件
+                    pass
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions(status, created_at)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def start(self):
+        """启动后台写入线程（enqueue() 时自动启动）"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name='write-queue', daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def enqueue(self, records):
+        """写入日志并返回提交编号，records 为 {表名: [记录]}"""
+        submission_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO submissions (id, status, payload, points_done, usage_done, "
+            "activity_count, usage_count, created_at) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (submission_id, json.dumps(records, ensure_ascii=False),
+             int(not records.get('volunteer_points')), int(not records.get('volunteer_usage')),
+             len(records.get('volunteer_points', [])), len(records.get('volunteer_usage', [])),
+             time.time())
+        )
+        self.start()
+        self._wakeup.set()
+        return submission_id
+
+    def status(self, submission_id):
+        """提交的处理状态：queued / done / failed，不存在时返回None"""
+        rows = self._execute(
+            "SELECT id, status, activity_count, usage_count, attempts, error, created_at, committed_at "
+            "FROM submissions WHERE id = ?", (submission_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "id": row[0],
+            # 正在写入的提交对外仍显示为 queued
+            "status": 'queued' if row[1] == 'inflight' else row[1],
+            "activity_count": row[2],
+            "usage_count": row[3],
+            "attempts": row[4],
+            "error": row[5],
+            "created_at": row[6],
+            "committed_at": row[7]
+        }
+
+    def stats(self):
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM submissions GROUP BY status"))
+        oldest = self._execute(
+            "SELECT MIN(created_at) FROM submissions WHERE status IN ('queued', 'inflight')")[0][0]
+        return {
+            "queued": counts.get('queued', 0) + counts.get('inflight', 0),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "oldest_queued_age": round(time.time() - oldest, 3) if oldest else 0
+        }
+
+    def _run(self):
+        last_cleanup = 0
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while self._flush():
+                    pass
+                if time.time() - last_cleanup > 3600:
+                    last_cleanup = time.time()
+                    self._execute("DELETE FROM submissions WHERE status = 'done' AND committed_at < ?",
+                                  (time.time() - self.retention,))
+            except Exception as e:
+                logger.error(f"写入队列处理失败: {str(e)}")
+
+    def _due(self):
+        """认领到期的提交，合计行数不超过 batch_rows（单个提交超过时单独一组）
+
+        先把租约已过期的 inflight 提交重新排队，再按提交顺序选出一组，用一条
+        UPDATE ... WHERE status = 'queued' 认领；其它进程已认领的提交不会被选中。
+        """
+        now = time.time()
+        self._execute(
+            "UPDATE submissions SET status = 'queued', owner = NULL, lease_until = NULL "
+            "WHERE status = 'inflight' AND lease_until < ?", (now,))
+        rows = self._execute(
+            "SELECT id, activity_count + usage_count FROM submissions "
+            "WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY created_at LIMIT 1000",
+            (now,))
+        candidates = []
+        total = 0
+        for submission_id, size in rows:
+            if candidates and total + size > self.batch_rows:
+                break
+            candidates.append(submission_id)
+            total += size
+        if not candidates:
+            return []
+
+        placeholders = ', '.join('?' * len(candidates))
+        self._execute(
+            f"UPDATE submissions SET status = 'inflight', owner = ?, lease_until = ? "
+            f"WHERE id IN ({placeholders}) AND status = 'queued'",
+            [self.owner, now + self.lease_seconds] + candidates)
+        rows = self._execute(
+            f"SELECT id, payload, points_done, usage_done FROM submissions "
+            f"WHERE id IN ({placeholders}) AND status = 'inflight' AND owner = ? ORDER BY created_at",
+            candidates + [self.owner])
+        return [{
+            "id": submission_id,
+            "records": json.loads(payload),
+            "done": {'volunteer_points': bool(points_done), 'volunteer_usage': bool(usage_done)}
+        } for submission_id, payload, points_done, usage_done in rows]
+
+    def _flush(self):
+        """提交一组到期的提交，返回是否还可能有待处理的提交"""
+        group = self._due()
+        if not group:
+            # 选中的提交都已被其它进程认领时继续查看后面的提交
+            return bool(self._execute(
+                "SELECT 1 FROM submissions WHERE status = 'queued' AND next_attempt_at <= ? LIMIT 1",
+                (time.time(),)))
+        with self._holding_lease(group):
+            try:
+                self._commit(group)
+            except Exception as e:
+                if not self._is_rejected(e):
+                    for submission in group:
+                        self._needs_review(submission, e)
+                elif len(group) == 1:
+                    self._retry_later(group[0], e)
+                else:
+                    logger.warning(f"合并提交 {len(group)} 个提交被拒绝，改为逐个提交: {str(e)}")
+                    for submission in group:
+                        try:
+                            self._commit([submission])
+                        except Exception as error:
+                            if self._is_rejected(error):
+                                self._retry_later(submission, error)
+                            else:
+                                self._needs_review(submission, error)
+        return True
+
+    def _is_rejected(self, error):
+        """数据库是否明确拒绝了写入（没有写入任何行），只有这类错误可以重新写入"""
+        if self.rejected is None:
+            return False
+        try:
+            return bool(self.rejected(error))
+        except Exception:
+            return False
+
+    @contextlib.contextmanager
+    def _holding_lease(self, group):
+        """写入期间在后台定期续租，避免租约到期后其它进程重复写入"""
+        ids = [submission['id'] for submission in group]
+        placeholders = ', '.join('?' * len(ids))
+        finished = threading.Event()
+
+        def renew():
+            while not finished.wait(self.lease_seconds / 3):
+                try:
+                    self._execute(
+                        f"UPDATE submissions SET lease_until = ? WHERE id IN ({placeholders}) "
+                        f"AND status = 'inflight' AND owner = ?",
+                        [time.time() + self.lease_seconds] + ids + [self.owner])
+                except Exception as e:
+                    logger.warning(f"写入队列续租失败: {str(e)}")
+
+        renewer = threading.Thread(target=renew, name='write-queue-lease', daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            finished.set()
+            renewer.join()
+
+    def _commit(self, group):
+        """每张表一条多行 INSERT；每张表写入成功后立即记录进度"""
+        for table, done_column in zip(TABLES, ('points_done', 'usage_done')):
+            pending = [submission for submission in group if not submission['done'][table]]
+            records = [record for submission in pending for record in submission['records'].get(table, [])]
+            if records:
+                # 多行插入是原子的，没有抛出异常即已整体写入；返回的行数可能因行级安全
+                # 策略而偏少，据此重试会重复写入
+                self.insert(table, records)
+            ids = [submission['id'] for submission in pending]
+            if ids:
+                self._execute(
+                    f"UPDATE submissions SET {done_column} = 1 WHERE id IN ({', '.join('?' * len(ids))})", ids)
+                for submission in pending:
+                    submission['done'][table] = True
+            if records and self.on_commit:
+                # 数据已经写入，刷新缓存失败不能进入重试
+                try:
+                    self.on_commit(records)
+                except Exception as e:
+                    logger.error(f"写入队列提交后处理失败: {str(e)}")
+
+        ids = [submission['id'] for submission in group]
+        self._execute(
+            f"UPDATE submissions SET status = 'done', error = NULL, committed_at = ?, owner = NULL, "
+            f"lease_until = NULL WHERE id IN ({', '.join('?' * len(ids))})", [time.time()] + ids)
+        logger.info(f"写入队列已提交 {len(ids)} 个提交")
+
+    def _needs_review(self, submission, error):
+        """结果未知的错误：数据可能已经写入，标记为 failed 等待人工核对，不再重试"""
+        message = f"写入结果未知，数据可能已经写入，请核对后再提交: {str(error)}"
+        logger.error(f"提交 {submission['id']} {message}")
+        self._execute("UPDATE submissions SET status = 'failed', attempts = attempts + 1, error = ?, "
+                      "owner = NULL, lease_until = NULL WHERE id = ?", (message, submission['id']))
+
+    def _retry_later(self, submission, error):
+        rows = self._execute("SELECT attempts FROM submissions WHERE id = ?", (submission['id'],))
+        attempts = rows[0][0] + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"提交 {submission['id']} 写入失败 {attempts} 次，不再重试: {str(error)}")
+            self._execute("UPDATE submissions SET status = 'failed', attempts = ?, error = ?, owner = NULL, "
+                          "lease_until = NULL WHERE id = ?", (attempts, str(error), submission['id']))
+            return
+        delay = random.uniform(0, self.backoff * (2 ** attempts))
+        logger.warning(f"提交 {submission['id']} 写入失败，{delay:.1f} 秒后重试: {str(error)}")
+        self._execute("UPDATE submissions SET status = 'queued', owner = NULL, lease_until = NULL, "
+                      "attempts = ?, error = ?, next_attempt_at = ? WHERE id = ?",
+                      (attempts, str(error), time.time() + delay, submission['id']))